@@ -1,71 +1,77 @@
-from models import SessionLocal, Draw
+import numpy as np
 import matrix_engine
-from engine import calculate_prediction
-import json
+import letter_model
+from history import DrawHistory, LETTERS
+from firestore_service import get_predictions_for_draws, save_prediction
+
+# Prefix models are built and scored CHUNK draws at a time (matrix stacks, see
+# matrix_engine.prefix_model_stacks): ~10 KB per draw in the chunk.
+CHUNK = 500
 
 def backfill_history():
-    db = SessionLocal()
     try:
-        # Get all draws sorted by date
-        all_draws = db.query(Draw).order_by(Draw.date.asc(), Draw.time.asc()).all()
+        # Get all draws sorted by date (pending excluded)
+        history = DrawHistory.load(use_shared=False)
         
-        print(f"Found {len(all_draws)} draws to process.")
+        print(f"Found {len(history)} draws to process.")
         
         # We need to simulate the state of the matrix for EACH draw.
         # So for Draw N, we use draws 0..N-1 to build the matrix, 
         # then calculate prediction, then save it to Draw N.
+        # All prefix models of a chunk are scored in one batch; the live matrix
+        # cache served by the API is never touched.
         
+        existing = get_predictions_for_draws(history.draw_ids)
         updated_count = 0
+        x = history.incidence
+        # Letter of the algorithmic prediction before each draw (Markov letter layer)
+        letters = letter_model.markov_letter_batch(
+            history.letter_incidence, history.letter_counts, np.arange(len(history)))
         
-        for i, current_draw in enumerate(all_draws):
-            # History is everything BEFORE this draw
-            history = all_draws[:i]
-            
-            # Rebuild Matrix State from history
-            # We must force the engine to use this specific subset
-            matrix_engine.build_matrices(history)
-            
-            # Calculate prediction "as if" we were there
-            algo_pred = matrix_engine.calculate_matrix_prediction()
-           
-            # Update the JSON
-            # Current JSON might be None, or old Flat format, or new Unified format (if we ran this partial)
-            current_json = current_draw.prediction_json or {}
+        for start in range(0, len(history), CHUNK):
+            stop = min(start + CHUNK, len(history))
+            mat_a, mat_b, rows = matrix_engine.prefix_model_stacks(x, start, stop)
+            batch = matrix_engine.score_batch(mat_a, mat_b, rows)
             
-            # Check structure
-            new_json = {}
-            
-            if "statistical" in current_json:
-                # Already unified? Or partially?
-                new_json = current_json
-                # Just update algorithmic part
-                new_json["algorithmic"] = algo_pred
-            else:
-                # It's likely the old Flat format (Statistical only)
-                # We move it to 'statistical'
-                # But wait, if it's empty, we might want to regen statistical too?
-                # Let's assume existing json is the statistical one.
-                new_json["statistical"] = current_json
-                new_json["algorithmic"] = algo_pred
+            for i in range(start, stop):
+                draw_id = history.draw_ids[i]
                 
-            # Update DB
-            current_draw.prediction_json = new_json
-            updated_count += 1
-            
-            if i % 10 == 0:
-                print(f"Processed {i}/{len(all_draws)}...")
+                # Prediction "as if" we were there (nothing to condition on before the first draw)
+                if i == 0:
+                    algo_pred = {"numbers": [], "details": []}
+                else:
+                    algo_pred = matrix_engine.prediction_from_batch(batch, i - start)
+                    algo_pred["variant"] = matrix_engine.DEFAULT_VARIANT
+                    algo_pred["letter"] = LETTERS[letters[i]] if letters[i] >= 0 else ""
+               
+                # Update the JSON
+                # Current JSON might be None, or old Flat format, or new Unified format (if we ran this partial)
+                current_json = existing.get(draw_id) or {}
+                
+                # Check structure
+                new_json = {}
+                
+                if "statistical" in current_json:
+                    # Already unified? Or partially?
+                    new_json = current_json
+                    # Just update algorithmic part
+                    new_json["algorithmic"] = algo_pred
+                else:
+                    # It's likely the old Flat format (Statistical only)
+                    # We move it to 'statistical'
+                    new_json["statistical"] = current_json
+                    new_json["algorithmic"] = algo_pred
+                    
+                # Update DB
+                save_prediction(draw_id, new_json)
+                updated_count += 1
+                
+            print(f"Processed {stop}/{len(history)}...")
                 
-        db.commit()
         print(f"Backfill Complete. Updated {updated_count} draws.")
         
-        # Restore Matrix state to full
-        matrix_engine.build_matrices()
-        
     except Exception as e:
         print(f"Error: {e}")
-        db.rollback()
-    finally:
-        db.close()
 
 if __name__ == "__main__":
     backfill_history()
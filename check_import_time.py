@@ -0,0 +1,61 @@
+# Cold-start import budget for the API module.
+#
+# Runs `python -X importtime -c "import main"` in a fresh interpreter and fails when
+#   - the cumulative import time of `main` exceeds the budget, or
+#   - a heavy module that must stay off the import path (loaded lazily by the code
+#     paths that need it) was imported.
+#
+# Usage: python check_import_time.py [budget_ms]   (default: $IMPORT_BUDGET_MS or 1000)
+# Exit code 0 = within budget, 1 = over budget / forbidden import.
+import os
+import subprocess
+import sys
+
+HEAVY_MODULES = [
+    "pandas",
+    "numpy",
+    "firebase_admin",
+    "google.cloud.firestore",
+    "bs4",
+    "requests",
+    "apscheduler",
+    "sqlalchemy",
+]
+
+def measure(module: str = "main"):
+    """Returns ({imported module: cumulative us}, cumulative us of `module`)."""
+    here = os.path.dirname(os.path.abspath(__file__))
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=here, capture_output=True, text=True
+    )
+    if proc.returncode != 0:
+        raise RuntimeError(f"import {module} failed:\n{proc.stderr[-2000:]}")
+    timings = {}
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = [p.strip() for p in line[len("import time:"):].split("|")]
+        timings[name] = int(cumulative)
+    return timings, timings.get(module, 0)
+
+def check(budget_ms: float) -> bool:
+    timings, total_us = measure("main")
+    ok = True
+
+    heavy = [m for m in timings if any(m == h or m.startswith(h + ".") for h in HEAVY_MODULES)]
+    if heavy:
+        ok = False
+        print(f"FAIL: heavy modules imported by `import main`: {sorted(set(m.split('.')[0] for m in heavy))}")
+
+    print(f"`import main`: {total_us / 1000:.1f} ms (budget {budget_ms:.0f} ms)")
+    if total_us / 1000 > budget_ms:
+        ok = False
+        print("FAIL: import time over budget. Slowest imports:")
+        for name, us in sorted(timings.items(), key=lambda x: x[1], reverse=True)[:10]:
+            print(f"  {us / 1000:8.1f} ms  {name}")
+    return ok
+
+if __name__ == "__main__":
+    budget = float(sys.argv[1]) if len(sys.argv) > 1 else float(os.environ.get("IMPORT_BUDGET_MS", "1000"))
+    sys.exit(0 if check(budget) else 1)
@@ -0,0 +1,150 @@
+import itertools
+import math
+import threading
+import numpy as np
+from typing import Dict, Any, List, Optional, Sequence
+
+# Combination frequency index over the draw history.
+#
+# Every draw is a 25-bit mask (DrawHistory.masks, extended on append), so
+#   count of draws containing a set S = count of masks m with (m & S) == S
+# is one vectorized AND + compare over the mask array (~1-2 ms per million draws).
+#
+# Frequent-itemset mining (k <= 5) counts ALL k-subsets of a window at once: each draw's
+# C(10, k) subsets are enumerated as colex ranks (sum of C(position_j, j + 1)) and counted
+# with one bincount over the C(25, k) possible sets. Level-wise Apriori pruning applies
+# when a minimum support is given: balls below it are dropped from the draws before
+# enumerating (a set is never more frequent than its rarest ball), and mining stops at
+# the first level without any frequent set.
+
+MAX_K = 5
+ROW_CHUNK = 20_000  # Draws enumerated per batch (bounds memory: chunk x C(10, k) ranks)
+
+_COMBOS: Dict[int, np.ndarray] = {}
+_POSITIONS: Dict[int, np.ndarray] = {}
+_LOCK = threading.Lock()
+
+
+def subset_mask(numbers: Sequence[int]) -> int:
+    """Bitset of a set of balls (1-25)."""
+    mask = 0
+    for n in numbers:
+        if not 1 <= int(n) <= 25:
+            raise ValueError(f"Ball numbers must be in 1..25 (got {n})")
+        mask |= 1 << (int(n) - 1)
+    return mask
+
+def _combos(k: int) -> np.ndarray:
+    """C(25, k) x k table: row r = the k-subset (0-based balls, ascending) of colex rank r."""
+    table = _COMBOS.get(k)
+    if table is None:
+        with _LOCK:
+            table = _COMBOS.get(k)
+            if table is None:
+                combos = np.array(list(itertools.combinations(range(25), k)), dtype=np.int64).reshape(-1, k)
+                table = np.empty_like(combos)
+                table[_colex_rank(combos)] = combos
+                _COMBOS[k] = table
+    return table
+
+def _positions(width: int, k: int) -> np.ndarray:
+    """C(width, k) x k: all k-subsets of the positions 0..width-1 of a draw."""
+    key = (width, k)
+    table = _POSITIONS.get(key)
+    if table is None:
+        table = np.array(list(itertools.combinations(range(width), k)), dtype=np.int64).reshape(-1, k)
+        _POSITIONS[key] = table
+    return table
+
+_BINOM = np.array([[math.comb(n, r) for r in range(MAX_K + 2)] for n in range(27)], dtype=np.int32)
+
+def _colex_rank(subsets: np.ndarray) -> np.ndarray:
+    """Colex rank of ascending k-subsets (last axis), in [0, C(25, k))."""
+    k = subsets.shape[-1]
+    return sum(_BINOM[subsets[..., j], j + 1] for j in range(k))
+
+
+class CombinationIndex:
+    """Queries over a DrawHistory's masks; windows are draw positions [start, stop) (slice semantics)."""
+
+    def __init__(self, history):
+        self.history = history
+        self.masks = history.masks
+
+    def _slice(self, start: Optional[int], stop: Optional[int]):
+        start, stop = self.history.window_bounds(start, stop)
+        return self.masks[start:stop]
+
+    def count(self, numbers: Sequence[int], start: Optional[int] = None, stop: Optional[int] = None) -> int:
+        """Number of draws in the window containing all of `numbers`."""
+        query = np.uint32(subset_mask(numbers))
+        return int(np.count_nonzero((self._slice(start, stop) & query) == query))
+
+    def positions(self, numbers: Sequence[int], start: Optional[int] = None, stop: Optional[int] = None) -> np.ndarray:
+        """Positions (in the history) of the draws of the window containing all of `numbers`."""
+        first, _ = self.history.window_bounds(start, stop)
+        query = np.uint32(subset_mask(numbers))
+        return np.flatnonzero((self._slice(start, stop) & query) == query) + first
+
+    def k_subset_counts(self, k: int, start: Optional[int] = None, stop: Optional[int] = None,
+                        allowed_mask: int = (1 << 25) - 1) -> np.ndarray:
+        """
+        Support of every k-subset (indexed by colex rank, see itemset()) in the window,
+        counting only the balls of `allowed_mask`.
+        """
+        masks = self._slice(start, stop) & np.uint32(allowed_mask)
+        counts = np.zeros(math.comb(25, k), dtype=np.int64)
+        bits = np.arange(25, dtype=np.uint32)
+        for lo in range(0, len(masks), ROW_CHUNK):
+            chunk = masks[lo:lo + ROW_CHUNK]
+            member = ((chunk[:, None] >> bits) & 1).astype(bool)
+            sizes = member.sum(axis=1)
+            for width in np.unique(sizes):
+                if width < k:
+                    continue
+                rows = member[sizes == width]
+                # Ascending ball positions of each draw (width balls per row)
+                balls = np.nonzero(rows)[1].astype(np.int8).reshape(len(rows), width)
+                subsets = balls[:, _positions(int(width), k)]  # rows x C(width, k) x k
+                counts += np.bincount(_colex_rank(subsets).ravel(), minlength=len(counts))
+        return counts
+
+    def itemset(self, k: int, rank: int) -> List[int]:
+        """Ball numbers of the k-subset of colex rank `rank`."""
+        return [int(b) + 1 for b in _combos(k)[rank]]
+
+    def frequent(self, max_k: int = 3, start: Optional[int] = None, stop: Optional[int] = None,
+                 min_support: int = None, top: int = 20, min_k: int = 1) -> Dict[str, Any]:
+        """
+        Most frequent k-subsets for k = min_k..max_k (<= 5) in the window: the `top` sets
+        of each size, restricted to sets seen in at least `min_support` draws if given.
+        """
+        if not 1 <= min_k <= max_k <= MAX_K:
+            raise ValueError(f"k must be in 1..{MAX_K}")
+        first, last = self.history.window_bounds(start, stop)
+        allowed = (1 << 25) - 1
+        levels = {}
+        for k in range(1, max_k + 1):
+            if k < min_k and not min_support:
+                continue
+            counts = self.k_subset_counts(k, first, last, allowed)
+            if min_support:
+                frequent = np.flatnonzero(counts >= min_support)
+                if k == 1:
+                    # Apriori: a set is never more frequent than its rarest ball
+                    allowed = subset_mask([int(r) + 1 for r in frequent])
+            else:
+                frequent = np.flatnonzero(counts > 0)
+            if k >= min_k:
+                order = frequent[np.argsort(-counts[frequent], kind="stable")][:top]
+                levels[str(k)] = [{"numbers": self.itemset(k, r), "count": int(counts[r])} for r in order]
+            if min_support and len(frequent) == 0:
+                break # No frequent k-set: no frequent (k+1)-set either
+        return {
+            "start": first,
+            "end": last,
+            "draws": last - first,
+            "min_support": min_support,
+            "itemsets": levels
+        }
+
@@ -0,0 +1,121 @@
+import threading
+import numpy as np
+from typing import Dict, Any, Optional, Sequence
+
+from history import LETTERS
+
+# In-memory indexes for ad-hoc draw queries ("draws between two dates at 19h containing
+# 7 and 12 with letter D").
+#
+#   numbers: 25 posting bitmaps over draw positions (bit t = draw t contains the ball),
+#   hours / letters: one posting bitmap per draw hour (13-19) and per letter,
+#   dates: the draw_id array (YYYYMMDDHH, chronological so sorted), bisected into a
+#          position range.
+# Bitmaps are packed (np.packbits, 1 bit per draw: 125 KB per list per million draws);
+# a query ANDs the lists of its predicates over the bytes of its date range and builds
+# draw records for the requested page only. Indexes are built once per data version
+# (vectorized, O(N)).
+
+DEFAULT_LIMIT = 50
+MAX_LIMIT = 500
+
+_INDEX = None
+_INDEX_LOCK = threading.Lock()
+
+
+def _bitmaps(columns: np.ndarray) -> np.ndarray:
+    """K x ceil(N/8) packed bitmaps from an N x K 0/1 matrix (one per column)."""
+    return np.packbits(np.asarray(columns, dtype=np.uint8).T, axis=1)
+
+
+class DrawIndex:
+    """Posting bitmaps over one DrawHistory (see module comment)."""
+
+    def __init__(self, history):
+        self.history = history
+        self.data_version = history.data_version
+        self.n = len(history)
+        self.draw_ids = np.asarray(history.draw_ids, dtype=np.int64)
+        self.numbers = _bitmaps(history.incidence)
+        self.letters = _bitmaps(history.letter_incidence)
+        hours = self.draw_ids % 100
+        self.hours = {int(h): np.packbits(hours == h) for h in np.unique(hours)}
+
+    def position_range(self, start_date: Optional[int] = None, end_date: Optional[int] = None):
+        """Positions [lo, hi) of the draws dated start_date..end_date (YYYYMMDD, inclusive)."""
+        lo = 0 if start_date is None else int(np.searchsorted(self.draw_ids, start_date * 100, side="left"))
+        hi = self.n if end_date is None else int(np.searchsorted(self.draw_ids, end_date * 100 + 99, side="right"))
+        return lo, max(lo, hi)
+
+    def match(self, numbers: Sequence[int] = (), letters: Sequence[str] = (), hours: Sequence[int] = (),
+              start_date: Optional[int] = None, end_date: Optional[int] = None) -> np.ndarray:
+        """
+        Positions (ascending) of the draws matching every predicate:
+        all of `numbers`, any of `letters`, any of `hours`, dated within the range.
+        """
+        lo, hi = self.position_range(start_date, end_date)
+        # Work on the bytes covering [lo, hi) only
+        first, last = lo // 8, (hi + 7) // 8
+        bits = np.full(last - first, 0xFF, dtype=np.uint8)
+        for n in numbers:
+            if not 1 <= int(n) <= 25:
+                raise ValueError(f"Ball numbers must be in 1..25 (got {n})")
+            bits &= self.numbers[int(n) - 1, first:last]
+        if letters:
+            any_letter = np.zeros_like(bits)
+            for l in letters:
+                if l not in LETTERS:
+                    raise ValueError(f"Letters must be in {LETTERS} (got {l})")
+                any_letter |= self.letters[LETTERS.index(l), first:last]
+            bits &= any_letter
+        if hours:
+            any_hour = np.zeros_like(bits)
+            for h in hours:
+                if int(h) in self.hours:
+                    any_hour |= self.hours[int(h)][first:last]
+            bits &= any_hour
+        positions = np.flatnonzero(np.unpackbits(bits)) + first * 8
+        return positions[(positions >= lo) & (positions < hi)]
+
+    def query(self, numbers: Sequence[int] = (), letters: Sequence[str] = (), hours: Sequence[int] = (),
+              start_date: Optional[int] = None, end_date: Optional[int] = None,
+              offset: int = 0, limit: int = DEFAULT_LIMIT, newest_first: bool = True) -> Dict[str, Any]:
+        """One page of the matching draws, with the total match count."""
+        positions = self.match(numbers, letters, hours, start_date, end_date)
+        if newest_first:
+            positions = positions[::-1]
+        page = positions[offset:offset + limit]
+        h = self.history
+        return {
+            "total": int(len(positions)),
+            "offset": offset,
+            "limit": limit,
+            "draws": [{
+                "draw_id": h.draw_ids[t],
+                "date": h.dates[t],
+                "time": h.times[t],
+                "balls_list": h.balls[t],
+                "bonus_letter": h.letters[t]
+            } for t in page.tolist()]
+        }
+
+
+def get_index(history=None) -> DrawIndex:
+    """DrawIndex of the current history, rebuilt only when the data version changes."""
+    global _INDEX
+    if history is None:
+        from history import DrawHistory  # Lazy import
+        history = DrawHistory.load()
+    with _INDEX_LOCK:
+        if _INDEX is None or _INDEX.data_version != history.data_version:
+            _INDEX = DrawIndex(history)
+        return _INDEX
+
+def parse_date(value: Optional[str]) -> Optional[int]:
+    """'YYYY-MM-DD' or 'YYYYMMDD' -> YYYYMMDD (None passes through)."""
+    if value is None:
+        return None
+    digits = value.replace("-", "")
+    if len(digits) != 8 or not digits.isdigit():
+        raise ValueError(f"Dates must be YYYY-MM-DD (got {value})")
+    return int(digits)
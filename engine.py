@@ -1,84 +1,102 @@
 import math
-import pandas as pd
 from typing import List, Dict, Any
 
 # Lazy imports - moved inside functions to avoid initialization issues
-# from firestore_service import get_all_draws_sorted, get_active_config
-
-def get_all_draws_as_dataframe(db=None): # db arg kept for compatibility but unused
-    """Fetches all draws from Firestore and returns as a Pandas DataFrame."""
-    from firestore_service import get_all_draws_sorted  # Lazy import
-    draws = get_all_draws_sorted()
-    print(f"[ENGINE DEBUG] get_all_draws_sorted returned {len(draws)} draws")
-    if not draws:
-        return pd.DataFrame()
-    
-    data = []
-    for d in draws:
-        data.append({
-            "draw_id": d.draw_id,
-            "date": d.date,
-            "time": d.time,
-            "balls": d.balls_list,
-            "bonus": d.bonus_letter
-        })
-    return pd.DataFrame(data)
-
-def calculate_stats(df: pd.DataFrame, all_numbers=range(1, 26)):
+# from firestore_service import get_active_config
+# pandas is only imported by get_all_draws_as_dataframe (offline/expert paths).
+
+def _load_history():
+    from history import DrawHistory  # Lazy import
+    return DrawHistory.load()
+
+def get_all_draws_as_dataframe(db=None, history=None): # db arg kept for compatibility but unused
     """
-    Calculate Frequency (Last 20 draws) and Gap for each number.
+    Returns the draw history as a Pandas DataFrame.
+    Pass a DrawHistory to reuse an already loaded history instead of querying Firestore.
+    """
+    if history is None:
+        history = _load_history()
+    return history.to_dataframe()
+
+def _as_columns(data):
     """
+    Returns (balls, letters) lists from a DrawHistory or a DataFrame ('balls'/'bonus' columns).
+    The engine works on these plain lists, so pandas is never needed on the request path.
+    """
+    if data is None:
+        return [], []
+    if hasattr(data, "iloc"):  # DataFrame (e.g. backtest slices)
+        if len(data) == 0:
+            return [], []
+        return data['balls'].tolist(), data['bonus'].tolist()
+    return data.balls, data.letters
+
+def _gaps(sequence, targets, contains):
+    """Draws since the last appearance of each target (len(sequence) if never seen)."""
+    total_draws = len(sequence)
+    gaps = {t: total_draws for t in targets}
+    missing = set(targets)
+    # Walk back from the latest draw, stop as soon as every target was seen
+    for gap, item in enumerate(reversed(sequence)):
+        for t in [t for t in missing if contains(item, t)]:
+            gaps[t] = gap
+            missing.discard(t)
+        if not missing:
+            break
+    return gaps
+
+def calculate_stats(df, all_numbers=range(1, 26), freq_window: int = 20):
+    """
+    Calculate Frequency (Last `freq_window` draws, 20 by default) and Gap for each number.
+    `df` may be a DrawHistory or a DataFrame.
+    The frequency keeps its historical "freq_20" key whatever the window.
+    """
+    balls, _ = _as_columns(df)
     stats = {n: {"freq_20": 0, "gap": 0} for n in all_numbers}
     
-    # Last 20 draws for frequency
-    last_20 = df.tail(20)
-    for _, row in last_20.iterrows():
-        for ball in row['balls']:
-             if ball in stats:
-                stats[ball]["freq_20"] += 1
+    # Last `freq_window` draws for frequency
+    if hasattr(df, "recent_counts"):
+        # DrawHistory: two lookups in the cumulative count table
+        counts = df.recent_counts(freq_window)
+        for n in stats:
+            if 1 <= n <= 25:
+                stats[n]["freq_20"] = int(counts[n - 1])
+    else:
+        for draw in balls[-freq_window:]:
+            for ball in draw:
+                 if ball in stats:
+                    stats[ball]["freq_20"] += 1
                 
     # Gap calculation (Draws since last appearance)
-    total_draws = len(df)
+    gaps = _gaps(balls, list(all_numbers), lambda draw, n: n in draw)
     for n in all_numbers:
-        gap = 0
-        found = False
-        for idx in range(total_draws - 1, -1, -1):
-            balls = df.iloc[idx]['balls']
-            if n in balls:
-                found = True
-                break
-            gap += 1
-        
-        if found:
-            stats[n]["gap"] = gap
-        else:
-            stats[n]["gap"] = total_draws
+        stats[n]["gap"] = gaps[n]
             
     return stats
 
-def calculate_letter_stats(df: pd.DataFrame, letters=['A', 'B', 'C', 'D', 'E']):
+def calculate_letter_stats(df, letters=['A', 'B', 'C', 'D', 'E'], letter_window: int = 50):
     """
     Simple frequency/gap for letters just to pick one.
+    `df` may be a DrawHistory or a DataFrame.
     """
+    _, bonus = _as_columns(df)
     stats = {l: {"count": 0, "gap": 0} for l in letters}
-    total_draws = len(df)
     
-    last_50 = df.tail(50)
-    for _, row in last_50.iterrows():
-        l = row['bonus']
-        if l in stats:
-            stats[l]["count"] += 1
+    if hasattr(df, "recent_letter_counts"):
+        from history import LETTERS  # Lazy import
+        counts = df.recent_letter_counts(letter_window)
+        for l in stats:
+            if l in LETTERS:
+                stats[l]["count"] = int(counts[LETTERS.index(l)])
+    else:
+        for l in bonus[-letter_window:]:
+            if l in stats:
+                stats[l]["count"] += 1
             
     # Gap
+    gaps = _gaps(bonus, list(letters), lambda drawn, l: drawn == l)
     for l in letters:
-        gap = 0
-        found = False
-        for idx in range(total_draws - 1, -1, -1):
-            if df.iloc[idx]['bonus'] == l:
-                found = True
-                break
-            gap += 1
-        stats[l]["gap"] = gap if found else total_draws
+        stats[l]["gap"] = gaps[l]
         
     return stats
 
@@ -88,41 +106,43 @@ def calculate_score_for_number(number, stats, freq_w=0.4, gap_w=0.5, decay=0.15)
     total_score = freq_term + gap_term
     return {"number": number, "score": total_score, "gap": stats["gap"], "freq": stats["freq_20"]}
 
-def calculate_prediction(df_override: pd.DataFrame = None, config_override: Dict[str, float] = None) -> Dict[str, Any]:
+def calculate_prediction(df_override=None, config_override: Dict[str, float] = None, history=None) -> Dict[str, Any]:
     """
     Calculate prediction based on statistical analysis.
     Uses Firestore for data and configuration.
+    `history` (DrawHistory) lets the caller share one history load across engines.
     """
     # Load Config from Firestore or use defaults
     freq_w = 0.4
     gap_w = 0.5
     decay = 0.15
+    freq_window = 20
+    letter_window = 50
+    top_k = 10
     
     if config_override:
-        freq_w = config_override.get('freq_weight', freq_w)
-        gap_w = config_override.get('gap_weight', gap_w)
-        decay = config_override.get('decay_rate', decay)
+        config = config_override
     else:
         # Try to load from Firestore
         from firestore_service import get_active_config  # Lazy import
         config = get_active_config()
-        freq_w = config.get('freq_weight', freq_w)
-        gap_w = config.get('gap_weight', gap_w)
-        decay = config.get('decay_rate', decay)
+    freq_w = config.get('freq_weight', freq_w)
+    gap_w = config.get('gap_weight', gap_w)
+    decay = config.get('decay_rate', decay)
+    freq_window = int(config.get('freq_window', freq_window))
+    letter_window = int(config.get('letter_window', letter_window))
+    top_k = int(config.get('top_k', top_k))
     
     if df_override is not None:
-         df = df_override
+         data = df_override
     else:
-        df = get_all_draws_as_dataframe()
+        data = history if history is not None else _load_history()
     
-    print(f"[ENGINE DEBUG] df.empty = {df.empty}, df.shape = {df.shape if not df.empty else 'N/A'}")
-    if not df.empty:
-        print(f"[ENGINE DEBUG] df.columns = {list(df.columns)}")
-    if df.empty:
+    if len(data) == 0:
         return {"numbers": [], "confidence": 0}
 
     # 1. Number Stats
-    numbers_stats = calculate_stats(df)
+    numbers_stats = calculate_stats(data, freq_window=freq_window)
     
     # 2. Calculate Scores
     scores = []
@@ -133,33 +153,44 @@ def calculate_prediction(df_override: pd.DataFrame = None, config_override: Dict
     # Sort by score descending
     scores.sort(key=lambda x: x["score"], reverse=True)
     
-    # Top 10 numbers
-    top_10 = scores[:10]
+    # Top 10 numbers (top_k)
+    top_10 = scores[:top_k]
     top_numbers = [x["number"] for x in top_10]
-    avg_score = sum([x["score"] for x in top_10]) / 10
+    avg_score = sum([x["score"] for x in top_10]) / max(len(top_10), 1)
+
+    # 3. Bonus letter (frequency + gap, same weights)
+    from letter_model import statistical_letter  # Lazy import
+    letter = statistical_letter(calculate_letter_stats(data, letter_window=letter_window),
+                                letter_window, freq_w, gap_w, decay)
 
     return {
         "numbers": top_numbers,
         "confidence": min(avg_score * 10, 100),
-        "details": top_10
+        "details": top_10,
+        **letter
     }
 
-def get_comprehensive_stats(df_override: pd.DataFrame = None):
+def get_comprehensive_stats(df_override=None, history=None):
     """Get comprehensive stats for the statistics panel."""
     if df_override is not None:
-         df = df_override
+         data = df_override
     else:
-        df = get_all_draws_as_dataframe()
+        data = history if history is not None else _load_history()
     
-    if df.empty:
+    balls, _ = _as_columns(data)
+    if not balls:
         return {}
 
     # 1. Number Frequencies - Top 5 Hot (Last 50 draws)
-    last_50 = df.tail(50)
     number_counts_50 = {}
-    for _, row in last_50.iterrows():
-        for ball in row['balls']:
-            number_counts_50[ball] = number_counts_50.get(ball, 0) + 1
+    if hasattr(data, "recent_counts"):
+        # DrawHistory: cumulative count tables (ties ordered by number)
+        counts = data.recent_counts(50)
+        number_counts_50 = {n + 1: int(c) for n, c in enumerate(counts) if c}
+    else:
+        for draw in balls[-50:]:
+            for ball in draw:
+                number_counts_50[ball] = number_counts_50.get(ball, 0) + 1
     
     hot_numbers = sorted(number_counts_50.items(), key=lambda x: x[1], reverse=True)[:5]
     
@@ -172,43 +203,34 @@ def get_comprehensive_stats(df_override: pd.DataFrame = None):
     cold_numbers = sorted(number_counts_50.items(), key=lambda x: x[1])[:5]
 
     # 2. Gaps (Overdue)
-    stats = calculate_stats(df)
+    stats = calculate_stats(data)
     overdue_numbers = sorted(stats.items(), key=lambda x: x[1]["gap"], reverse=True)[:5]
 
-    # 4. Global Frequencies (All time)
+    # 4. Global Frequencies (All time), 5. Parity (Even/Odd), 6. Decades - one pass
     global_counts = {n: 0 for n in all_numbers}
-    for _, row in df.iterrows():
-        for ball in row['balls']:
-            if ball in global_counts:
-                global_counts[ball] += 1
+    if hasattr(data, "window_counts"):
+        # DrawHistory: last row of the cumulative count table (balls are always 1-25)
+        for n, c in enumerate(data.window_counts()):
+            global_counts[n + 1] = int(c)
+    else:
+        for draw in balls:
+            for ball in draw:
+                if ball in global_counts:
+                    global_counts[ball] += 1
+    even_count = sum(c for n, c in global_counts.items() if n % 2 == 0)
+    odd_count = sum(c for n, c in global_counts.items() if n % 2 == 1)
+    decades = {
+        "1-9": sum(global_counts[n] for n in range(1, 10)),
+        "10-19": sum(global_counts[n] for n in range(10, 20)),
+        "20-25": sum(global_counts[n] for n in range(20, 26)),
+    }
     
     frequency_all = [{"number": n, "count": global_counts[n]} for n in sorted(global_counts.keys())]
-
-    # 5. Parity (Even/Odd)
-    even_count = 0
-    odd_count = 0
-    for _, row in df.iterrows():
-        for ball in row['balls']:
-            if ball % 2 == 0:
-                even_count += 1
-            else:
-                odd_count += 1
     
     parity_stats = [
         {"name": "Pairs", "value": even_count},
         {"name": "Impairs", "value": odd_count}
     ]
-
-    # 6. Decades (1-9, 10-19, 20-25)
-    decades = {"1-9": 0, "10-19": 0, "20-25": 0}
-    for _, row in df.iterrows():
-        for ball in row['balls']:
-            if 1 <= ball <= 9:
-                decades["1-9"] += 1
-            elif 10 <= ball <= 19:
-                decades["10-19"] += 1
-            elif 20 <= ball <= 25:
-                decades["20-25"] += 1
     
     decade_stats = [
         {"name": "1-9", "value": decades["1-9"]},
@@ -223,7 +245,7 @@ def get_comprehensive_stats(df_override: pd.DataFrame = None):
         "frequency_all": frequency_all,
         "parity_stats": parity_stats,
         "decade_stats": decade_stats,
-        "total_draws": len(df)
+        "total_draws": len(balls)
     }
 
 if __name__ == "__main__":
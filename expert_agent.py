@@ -1,10 +1,18 @@
-import pandas as pd
-import math
-from typing import Dict, Any, List
+from typing import Dict, Any
 # from sqlalchemy.orm import Session -- REMOVED
 # from models import SessionLocal, AlgorithmConfiguration... -- REMOVED
 from firestore_service import get_active_config, set_active_config
-from engine import get_all_draws_as_dataframe, calculate_prediction
+
+HALTON_BASES = (2, 3, 5, 7, 11, 13)
+
+def halton(i: int, base: int) -> float:
+    """i-th element (i >= 1) of the van der Corput sequence in `base`."""
+    result, f = 0.0, 1.0
+    while i > 0:
+        f /= base
+        result += f * (i % base)
+        i //= base
+    return result
 
 class ExpertMathAgent:
     def __init__(self):
@@ -14,89 +22,84 @@ class ExpertMathAgent:
     def get_current_config(self) -> Dict[str, float]:
         return get_active_config()
 
-    def backtest(self, params: Dict[str, float], history: pd.DataFrame, window_size: int = 20) -> float:
-        """
-        Run a simulation: For the last N draws in `history`, 
-        predict using `params` based on data AVAILABLE AT THAT TIME.
-        Return accuracy score.
-        """
-        draws_to_test = history.tail(window_size)
-        hits = 0
-        total_predictions = 0
-
-        # Iterate through the test window
-        # We need at least 20 draws prior to the test draw to calculate stats effectively
-        min_required_history = 20
-        
-        # We need indices to slice the dataframe
-        test_indices = list(range(len(history) - window_size, len(history)))
-        
-        for idx in test_indices:
-            if idx < min_required_history:
-                continue
-                
-            # Data available before this draw
-            past_data = history.iloc[:idx]
-            actual_draw = history.iloc[idx]
-            
-            # Predict
-            prediction = calculate_prediction(df_override=past_data, config_override=params)
-            predicted_numbers = set(prediction['numbers'][:5]) # Verify Top 5
-            actual_numbers = set(actual_draw['balls'])
-            
-            # Count common numbers (simple hit rate)
-            # Or use full gain logic? Let's stick to "numbers found" for optimization
-            common = predicted_numbers.intersection(actual_numbers)
-            hits += len(common)
-            total_predictions += 5 # We predict 5 numbers
-            
-        if total_predictions == 0:
-            return 0.0
-            
-        return hits / total_predictions
-
-    def analyze_current_performance(self) -> Dict[str, Any]:
+    def analyze_current_performance(self, history=None, hour: int = None) -> Dict[str, Any]:
         """
         Analyze how the current active formula is performing.
+        `history` (DrawHistory) avoids reloading the draws when the caller already has them.
+        `hour` evaluates the formula on that slot's draws only (same-slot history).
         """
-        # Pass None as db, engine handles firestore fetch internally
-        df = get_all_draws_as_dataframe(db=None) 
-        if df.empty:
+        if history is None:
+            from history import DrawHistory
+            history = DrawHistory.load()
+        if hour is not None:
+            history = history.slot(hour)
+        if history.empty:
             return {"status": "No data"}
             
         current_params = self.get_current_config()
-        score = self.backtest(current_params, df, window_size=50) # Analyze last 50 draws
+        features = self._features(history)
+        hits = features.hits(current_params, 50) # Analyze last 50 draws
+        score = float(hits.mean()) / 5 if len(hits) else 0.0
+        letter_score = features.letter_hit_rate(current_params, 50)
         
+        from simulation import significance
         return {
             "current_params": current_params,
             "accuracy_last_50": score,
-            "message": f"Accuracy on last 50 draws: {score:.2%}"
+            "letter_accuracy_last_50": letter_score,
+            # Top-5 hits vs random 5-number tickets (bootstrap CI + Monte Carlo p-value)
+            "significance": significance(hits, ticket_size=5),
+            "message": f"Accuracy on last 50 draws: {score:.2%} (letter: {letter_score:.0%})"
         }
 
-    def evolve_formula(self) -> Dict[str, Any]:
+    def analyze_matrix_performance(self, history=None, window: int = None, since_draw_id: int = None,
+                                   hour: int = None) -> Dict[str, Any]:
+        """
+        Walk-forward backtest of the algorithmic (matrix) model over the last `window`
+        draws and/or from `since_draw_id` on (default: the whole history).
+        `hour` backtests the per-slot model on that slot's draws.
+        """
+        from matrix_backtest import backtest_matrix_model
+        return backtest_matrix_model(history=history, window=window, since_draw_id=since_draw_id, hour=hour)
+
+    SEARCH_SPACE = {
+        "freq_weight": [0.2, 0.4, 0.6, 0.8],
+        "gap_weight": [0.2, 0.5, 0.8],
+        "decay_rate": [0.1, 0.15, 0.2],
+    }
+
+    def evolve_formula(self, history=None, progress=None) -> Dict[str, Any]:
         """
         Search for parameters that improve the score.
+        `progress(done, total, partial)` is called after each backtest with the best
+        parameters so far (used by the background job runner; it may raise to cancel).
         """
-        df = get_all_draws_as_dataframe(db=None)
-        if len(df) < 50:
+        if history is None:
+            from history import DrawHistory
+            history = DrawHistory.load()
+        if len(history) < 50:
             return {"status": "Not enough data to evolve"}
 
-        current_accuracy = self.analyze_current_performance()["accuracy_last_50"]
+        features = self._features(history)
+        current_params = self.get_current_config()
+        current_accuracy = features.hit_rate(current_params, 50)
         best_accuracy = current_accuracy
-        best_params = self.get_current_config()
+        best_params = current_params
         
         # Simplified Search Space for speed
-        freq_grid = [0.2, 0.4, 0.6, 0.8]
-        gap_grid = [0.2, 0.5, 0.8]
-        decay_grid = [0.1, 0.15, 0.2]
+        freq_grid = self.SEARCH_SPACE["freq_weight"]
+        gap_grid = self.SEARCH_SPACE["gap_weight"]
+        decay_grid = self.SEARCH_SPACE["decay_rate"]
         
         proposals = []
+        total = len(freq_grid) * len(gap_grid) * len(decay_grid)
+        done = 0
         
         for f in freq_grid:
             for g in gap_grid:
                 for d in decay_grid:
-                    params = {"freq_weight": f, "gap_weight": g, "decay_rate": d}
-                    score = self.backtest(params, df, window_size=50)
+                    params = {**current_params, "freq_weight": f, "gap_weight": g, "decay_rate": d}
+                    score = features.hit_rate(params, 50)
                     
                     if score > best_accuracy:
                         # Avoid floating point jitter
@@ -107,6 +110,14 @@ class ExpertMathAgent:
                                 "params": params,
                                 "accuracy": score
                             })
+                    
+                    done += 1
+                    if progress:
+                        progress(done, total, {
+                            "current_accuracy": current_accuracy,
+                            "best_accuracy": best_accuracy,
+                            "best_params": best_params
+                        })
         
         if best_accuracy > current_accuracy:
              improvement = (best_accuracy - current_accuracy) / current_accuracy if current_accuracy > 0 else 0
@@ -124,6 +135,131 @@ class ExpertMathAgent:
                  "message": "Current parameters are optimal within the search space."
              }
 
+    # Adaptive search: continuous ranges (low, high); integer ranges are inclusive
+    ADAPTIVE_SPACE = {
+        "freq_weight": (0.0, 1.0),
+        "gap_weight": (0.0, 1.0),
+        "decay_rate": (0.01, 0.5),
+        "freq_window": (5, 60),
+    }
+    ADAPTIVE_INT_KEYS = ("freq_window",)
+    LETTER_WINDOWS = (10, 20, 30, 50, 75, 100, 150, 200)
+
+    def evolve_formula_adaptive(self, history=None, progress=None, n_candidates: int = 81,
+                                rungs=(50, 100, 200, 400), eta: int = 3) -> Dict[str, Any]:
+        """
+        Successive halving over ADAPTIVE_SPACE: `n_candidates` quasi-random (Halton)
+        configurations are backtested on the last rungs[0] draws, the best 1/eta go on
+        to the next (longer) window, and so on. The winner is compared to the current
+        configuration on the longest window. Uses the vectorized backtest.
+        `progress(done, total, partial)` as in evolve_formula.
+        """
+        import time
+        from stat_backtest import MIN_HISTORY
+        if history is None:
+            from history import DrawHistory
+            history = DrawHistory.load()
+        if len(history) < 50:
+            return {"status": "Not enough data to evolve"}
+        started = time.time()
+
+        features = self._features(history)
+        usable = len(history) - MIN_HISTORY
+        rungs = sorted(set(min(w, usable) for w in rungs))
+        current_params = self.get_current_config()
+        candidates = [current_params] + [
+            {**current_params, **self._sample(i)} for i in range(1, n_candidates)
+        ]
+
+        total = 0
+        survivors = len(candidates)
+        for _ in rungs:
+            total += survivors
+            survivors = max(1, survivors // eta)
+        done = 0
+        draw_evaluations = 0
+        rung_report = []
+        best_accuracy, best_params = None, current_params
+        
+        for r, window in enumerate(rungs):
+            scored = []
+            for params in candidates:
+                scored.append((features.hit_rate(params, window), params))
+                done += 1
+                draw_evaluations += min(window, usable)
+                if progress and done % 10 == 0:
+                    leader = max(scored, key=lambda x: x[0])
+                    progress(done, total, {"rung": r, "window": window, "best_accuracy": leader[0], "best_params": leader[1]})
+            # Stable sort: on ties the current config (first) and earlier samples win
+            scored.sort(key=lambda x: x[0], reverse=True)
+            rung_report.append({"window": window, "candidates": len(candidates), "best_accuracy": scored[0][0]})
+            best_accuracy, best_params = scored[0]
+            candidates = [p for _, p in scored[:max(1, len(scored) // eta)]]
+        
+        # Reference: the current configuration on the longest window (even if eliminated earlier)
+        current_accuracy = features.hit_rate(current_params, rungs[-1])
+        
+        if best_accuracy <= current_accuracy + 0.001: # Avoid floating point jitter
+            best_accuracy, best_params = current_accuracy, current_params
+        
+        # Letter window: 1-D sweep on the longest window with the retained weights
+        # (the ball hit rate does not depend on it)
+        current_letter = features.letter_hit_rate(current_params, rungs[-1])
+        best_letter = features.letter_hit_rate(best_params, rungs[-1])
+        for letter_window in self.LETTER_WINDOWS:
+            params = {**best_params, "letter_window": letter_window}
+            letter_accuracy = features.letter_hit_rate(params, rungs[-1])
+            done += 1
+            draw_evaluations += rungs[-1]
+            if letter_accuracy > best_letter + 0.001:
+                best_letter, best_params = letter_accuracy, params
+        budget = {
+            "evaluations": done,
+            "draw_evaluations": draw_evaluations,
+            "seconds": round(time.time() - started, 3),
+            "rungs": rung_report
+        }
+        if progress:
+            progress(done, done, {"best_accuracy": best_accuracy, "best_params": best_params})
+
+        if best_params is not current_params:
+             improvement = (best_accuracy - current_accuracy) / current_accuracy if current_accuracy > 0 else 0
+             return {
+                 "found_better": True,
+                 "current_accuracy": current_accuracy,
+                 "best_accuracy": best_accuracy,
+                 "improvement": f"{improvement:.1%}",
+                 "proposed_params": best_params,
+                 "current_letter_accuracy": current_letter,
+                 "letter_accuracy": best_letter,
+                 "window": rungs[-1],
+                 "budget": budget,
+                 "message": f"Found improved parameters! Accuracy on the last {rungs[-1]} draws: {current_accuracy:.2%} -> {best_accuracy:.2%} "
+                            f"(letter: {current_letter:.0%} -> {best_letter:.0%})."
+             }
+        return {
+            "found_better": False,
+            "current_accuracy": current_accuracy,
+            "window": rungs[-1],
+            "budget": budget,
+            "message": "Current parameters are optimal within the search space."
+        }
+
+    def _sample(self, i: int) -> Dict[str, float]:
+        """i-th point of the Halton sequence mapped onto ADAPTIVE_SPACE."""
+        params = {}
+        for base, (key, (low, high)) in zip(HALTON_BASES, self.ADAPTIVE_SPACE.items()):
+            u = halton(i, base)
+            if key in self.ADAPTIVE_INT_KEYS:
+                params[key] = int(low + min(int(u * (high - low + 1)), high - low))
+            else:
+                params[key] = round(low + u * (high - low), 4)
+        return params
+
+    def _features(self, history):
+        from stat_backtest import StatFeatures
+        return StatFeatures.from_history(history)
+
     def apply_new_parameters(self, params: Dict[str, float], notes="Applied by Expert Agent"):
         set_active_config(params, notes)
         return {"status": "updated", "config": params}
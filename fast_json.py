@@ -0,0 +1,132 @@
+import datetime
+import gzip
+import json
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Hashable
+
+from starlette.responses import Response
+
+# Response layer for the large, trusted payloads (/history, /matrix, /stats):
+#   - encoded with orjson when installed (numpy arrays and scalars natively), else json,
+#   - returned as a ready Response, so FastAPI does not re-validate it through the
+#     endpoint's response_model (the data comes from our own engines / Firestore records),
+#   - encoded once per data version: the key passed to cached_response() includes the
+#     data version, and the bytes (plus their gzip/brotli forms) are reused until it changes.
+# Bodies built per request are compressed by the GZip middleware installed in main.py;
+# cached bodies are compressed once and served with their Content-Encoding already set.
+
+try:
+    import orjson
+except ImportError:  # Optional dependency
+    orjson = None
+try:
+    import brotli
+except ImportError:  # Optional dependency
+    brotli = None
+
+MIN_COMPRESS_SIZE = 1024  # Bytes; smaller bodies are sent as is
+CACHE_SIZE = 64
+
+_CACHE: "OrderedDict[Hashable, dict]" = OrderedDict()
+_CACHE_LOCK = threading.Lock()
+
+
+def _default(obj):
+    """json fallback for what orjson handles natively."""
+    if hasattr(obj, "tolist"):  # numpy arrays and scalars
+        return obj.tolist()
+    if isinstance(obj, (datetime.date, datetime.time)):
+        return obj.isoformat()
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+def dumps(content: Any) -> bytes:
+    """JSON bytes of `content`."""
+    if orjson is not None:
+        return orjson.dumps(content, default=_default,
+                            option=orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS)
+    return json.dumps(content, default=_default, separators=(",", ":")).encode("utf-8")
+
+
+def _encodings(body: bytes) -> dict:
+    """The body in each supported Content-Encoding ("" = identity)."""
+    encoded = {"": body}
+    if len(body) >= MIN_COMPRESS_SIZE:
+        encoded["gzip"] = gzip.compress(body, compresslevel=6)
+        if brotli is not None:
+            encoded["br"] = brotli.compress(body, quality=5)
+    return encoded
+
+def cached_response(request, key: Hashable, build: Callable[[], Any],
+                    keep: Callable[[Any], bool] = None) -> Response:
+    """
+    Response for `key` (which must include the data version), encoding build() only
+    on the first request for that key; picks br / gzip / identity from Accept-Encoding.
+    `keep(content)` False = serve but do not cache this build (e.g. incomplete data).
+    """
+    with _CACHE_LOCK:
+        encoded = _CACHE.get(key)
+        if encoded is not None:
+            _CACHE.move_to_end(key)
+    if encoded is None:
+        content = build()
+        encoded = _encodings(dumps(content))
+        if keep is not None and not keep(content):
+            return _respond(request, encoded)
+        with _CACHE_LOCK:
+            _CACHE[key] = encoded
+            while len(_CACHE) > CACHE_SIZE:
+                _CACHE.popitem(last=False)
+    return _respond(request, encoded)
+
+def warm(key: Hashable, build: Callable[[], Any]):
+    """Encodes build() under `key` ahead of the first request (ingest pipeline)."""
+    cached_response(None, key, build)
+
+def invalidate() -> int:
+    """Drops every cached body (a new data version arrived); returns how many."""
+    with _CACHE_LOCK:
+        dropped = len(_CACHE)
+        _CACHE.clear()
+    return dropped
+
+def _accepted_encodings(header: str) -> dict:
+    """Accept-Encoding -> {coding: q} (lower-cased; a missing q counts as 1)."""
+    accepted = {}
+    for part in header.split(","):
+        coding, *params = [p.strip() for p in part.split(";")]
+        if not coding:
+            continue
+        q = 1.0
+        for param in params:
+            name, _, value = param.partition("=")
+            if name.strip().lower() == "q":
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        accepted[coding.lower()] = q
+    return accepted
+
+def _pick_encoding(header: str, available) -> str:
+    """
+    Highest-q coding of `available` the client accepts (ties: br, then gzip), or ""
+    (identity) if it refused both, or explicitly rates identity higher.
+    """
+    accepted = _accepted_encodings(header)
+    best, best_q = "", 0.0
+    for encoding in ("br", "gzip"):
+        q = accepted.get(encoding, accepted.get("*", 0.0))
+        if encoding in available and q > best_q:
+            best, best_q = encoding, q
+    if best and best_q >= accepted.get("identity", 0.0):
+        return best
+    return ""
+
+def _respond(request, encoded: dict) -> Response:
+    accepted = request.headers.get("accept-encoding", "") if request is not None else ""
+    headers = {"Vary": "Accept-Encoding"}
+    encoding = _pick_encoding(accepted, encoded)
+    if encoding:
+        headers["Content-Encoding"] = encoding
+    return Response(encoded[encoding], media_type="application/json", headers=headers)
@@ -1,29 +1,71 @@
+import json
 import os
-import firebase_admin
-from firebase_admin import credentials, firestore
+import threading
+import time
 from datetime import datetime
-from models import Draw
+from models import Draw, DrawRecord
 from typing import List, Optional
 
-# Initialize Firestore
-try:
-    if not firebase_admin._apps:
-        app = firebase_admin.initialize_app()
-    db = firestore.client()
-    print("Firestore initialized successfully.")
-except Exception as e:
-    print(f"Warning: Firestore init failed: {e}")
-    db = None
+# Firestore client is created lazily on first use (not at import time), so importing
+# this module is cheap and app startup does not wait on credentials/network.
+# firebase_admin itself (grpc, google-cloud) is only imported at that point too.
+_db = None
+_db_initialized = False
+_db_lock = threading.Lock()
 
 COLLECTION_DRAWS = "draws"
 COLLECTION_CONFIG = "config"
+COLLECTION_PREDICTIONS = "predictions"
+COLLECTION_META = "meta"
+COLLECTION_LEASES = "leases"
+COLLECTION_JOBS = "jobs"
+
+# Predictions live in their own collection, one document per (draw_id, model version):
+#   predictions/{draw_id}_{model_version} = {draw_id, model_version, prediction, created_at}
+# Bump the version when the engines change so older predictions are kept side by side.
+PREDICTION_MODEL_VERSION = "unified-v1"
+
+# Fields needed by the analytic engines (order matches models.DrawRecord)
+HISTORY_FIELDS = ["draw_id", "date", "time", "balls_list", "bonus_letter", "source"]
+
+def _firestore():
+    from firebase_admin import firestore  # Lazy import (heavy)
+    return firestore
 
 def get_db():
-    return db
+    global _db, _db_initialized
+    if _db_initialized:
+        return _db
+    with _db_lock:
+        if not _db_initialized:
+            try:
+                import firebase_admin  # Lazy import (heavy)
+                firestore = _firestore()
+                if not firebase_admin._apps:
+                    firebase_admin.initialize_app()
+                _db = firestore.client()
+                print("Firestore initialized successfully.")
+            except Exception as e:
+                print(f"Warning: Firestore init failed: {e}")
+                _db = None
+            _db_initialized = True
+    return _db
+
+# Defaults of the statistical engine (see engine.calculate_prediction)
+DEFAULT_CONFIG = {
+    "freq_weight": 0.4,
+    "gap_weight": 0.5,
+    "decay_rate": 0.15,
+    "freq_window": 20,   # Draws counted by the frequency term
+    "letter_window": 50, # Draws counted by the letter frequency
+    "top_k": 10,         # Numbers per prediction
+}
+_INT_CONFIG_KEYS = ("freq_window", "letter_window", "top_k")
 
 def get_active_config():
     """Returns the active algorithm configuration dict or default."""
-    if not db: return {"freq_weight": 0.4, "gap_weight": 0.5, "decay_rate": 0.15}
+    db = get_db()
+    if not db: return dict(DEFAULT_CONFIG)
     try:
         # Assuming single config document 'current' or filtering by active
         doc_ref = db.collection(COLLECTION_CONFIG).document('current')
@@ -31,17 +73,17 @@ def get_active_config():
         if doc.exists:
              d = doc.to_dict()
              return {
-                 "freq_weight": float(d.get("freq_weight", 0.4)),
-                 "gap_weight": float(d.get("gap_weight", 0.5)),
-                 "decay_rate": float(d.get("decay_rate", 0.15))
+                 k: (int(d.get(k, v)) if k in _INT_CONFIG_KEYS else float(d.get(k, v)))
+                 for k, v in DEFAULT_CONFIG.items()
              }
-        return {"freq_weight": 0.4, "gap_weight": 0.5, "decay_rate": 0.15}
+        return dict(DEFAULT_CONFIG)
     except Exception as e:
         print(f"Error fetching config: {e}")
-        return {"freq_weight": 0.4, "gap_weight": 0.5, "decay_rate": 0.15}
+        return dict(DEFAULT_CONFIG)
 
 def set_active_config(params: dict, notes: str = None):
     """Updates the active configuration."""
+    db = get_db()
     if not db: return
     try:
         data = params.copy()
@@ -54,6 +96,7 @@ def set_active_config(params: dict, notes: str = None):
 
 def get_all_draws_sorted() -> List[Draw]:
     """Returns all draws sorted by date and time ascending."""
+    db = get_db()
     if not db: return []
     try:
         docs = db.collection(COLLECTION_DRAWS).order_by("date").order_by("time").stream()
@@ -67,11 +110,130 @@ def get_all_draws_sorted() -> List[Draw]:
         print(f"Error fetching draws: {e}")
         return []
 
+def get_draw_records() -> List[DrawRecord]:
+    """
+    Analytics read path: all draws sorted by date and time ascending, projected on
+    HISTORY_FIELDS (prediction_json is never transferred) and decoded straight into
+    DrawRecord tuples without pydantic validation.
+    """
+    db = get_db()
+    if not db: return []
+    try:
+        docs = db.collection(COLLECTION_DRAWS).select(HISTORY_FIELDS).order_by("date").order_by("time").stream()
+        records = []
+        for doc in docs:
+            d = doc.to_dict()
+            records.append(DrawRecord(
+                d.get("draw_id"),
+                d.get("date"),
+                d.get("time"),
+                d.get("balls_list") or [],
+                d.get("bonus_letter"),
+                d.get("source")
+            ))
+        return records
+    except Exception as e:
+        print(f"Error fetching draw records: {e}")
+        return []
+
+def get_recent_draw_records(limit: int = 50) -> List[DrawRecord]:
+    """
+    Returns the `limit` latest non-pending draws, newest first (projected on HISTORY_FIELDS).
+    Documents are streamed newest first and the stream stops once the page is full.
+    """
+    db = get_db()
+    if not db or limit <= 0: return []
+    try:
+        docs = db.collection(COLLECTION_DRAWS).select(HISTORY_FIELDS) \
+            .order_by("date", direction=_firestore().Query.DESCENDING) \
+            .order_by("time", direction=_firestore().Query.DESCENDING).stream()
+        records = []
+        for doc in docs:
+            d = doc.to_dict()
+            if d.get("source") == 'ai_pending':
+                continue
+            records.append(DrawRecord(
+                d.get("draw_id"),
+                d.get("date"),
+                d.get("time"),
+                d.get("balls_list") or [],
+                d.get("bonus_letter"),
+                d.get("source")
+            ))
+            if len(records) >= limit:
+                break
+        return records
+    except Exception as e:
+        print(f"Error fetching recent draws: {e}")
+        return []
+
+def _prediction_doc_id(draw_id, model_version: str) -> str:
+    return f"{draw_id}_{model_version}"
+
+def save_prediction(draw_id, prediction: dict, model_version: str = PREDICTION_MODEL_VERSION):
+    """Stores (or replaces) the prediction of `model_version` for `draw_id`."""
+    db = get_db()
+    if not db: return
+    try:
+        db.collection(COLLECTION_PREDICTIONS).document(_prediction_doc_id(draw_id, model_version)).set({
+            "draw_id": int(draw_id),
+            "model_version": model_version,
+            "prediction": prediction,
+            "created_at": datetime.now().isoformat()
+        })
+    except Exception as e:
+        print(f"Error saving prediction for draw {draw_id}: {e}")
+
+def save_prediction_evaluation(draw_id, evaluation: dict, model_version: str = PREDICTION_MODEL_VERSION):
+    """Attaches the evaluation (matches, gain per engine) to the stored prediction of `draw_id`."""
+    db = get_db()
+    if not db: return
+    try:
+        db.collection(COLLECTION_PREDICTIONS).document(_prediction_doc_id(draw_id, model_version)).set({
+            "evaluation": evaluation,
+            "evaluated_at": datetime.now().isoformat()
+        }, merge=True)
+    except Exception as e:
+        print(f"Error saving evaluation for draw {draw_id}: {e}")
+
+def get_prediction(draw_id, model_version: str = PREDICTION_MODEL_VERSION) -> Optional[dict]:
+    """Returns the stored prediction dict for `draw_id`, or None."""
+    db = get_db()
+    if not db: return None
+    try:
+        doc = db.collection(COLLECTION_PREDICTIONS).document(_prediction_doc_id(draw_id, model_version)).get()
+        if doc.exists:
+            return doc.to_dict().get("prediction")
+        return None
+    except Exception as e:
+        print(f"Error fetching prediction for draw {draw_id}: {e}")
+        return None
+
+def get_predictions_for_draws(draw_ids: List[int], model_version: str = PREDICTION_MODEL_VERSION) -> dict:
+    """
+    Batch lookup (one round trip) of the predictions for `draw_ids`.
+    Returns {draw_id: prediction}; draws without a prediction are absent.
+    """
+    db = get_db()
+    if not db or not draw_ids: return {}
+    try:
+        refs = [db.collection(COLLECTION_PREDICTIONS).document(_prediction_doc_id(i, model_version)) for i in draw_ids]
+        result = {}
+        for doc in db.get_all(refs):
+            if doc.exists:
+                d = doc.to_dict()
+                result[d.get("draw_id")] = d.get("prediction")
+        return result
+    except Exception as e:
+        print(f"Error fetching predictions: {e}")
+        return {}
+
 def get_latest_draw() -> Optional[Draw]:
     """Returns the single latest draw as an Object."""
+    db = get_db()
     if not db: return None
     try:
-        query = db.collection(COLLECTION_DRAWS).order_by("date", direction=firestore.Query.DESCENDING).order_by("time", direction=firestore.Query.DESCENDING).limit(1)
+        query = db.collection(COLLECTION_DRAWS).order_by("date", direction=_firestore().Query.DESCENDING).order_by("time", direction=_firestore().Query.DESCENDING).limit(1)
         docs = list(query.stream())
         if docs:
             d = docs[0].to_dict()
@@ -84,6 +246,7 @@ def get_latest_draw() -> Optional[Draw]:
 
 def get_draw_by_date_time(draw_date, draw_time) -> Optional[Draw]:
     """Returns a Draw object if found, else None."""
+    db = get_db()
     if not db: return None
     try:
         query = db.collection(COLLECTION_DRAWS).where("date", "==", draw_date).where("time", "==", draw_time).limit(1)
@@ -99,6 +262,7 @@ def get_draw_by_date_time(draw_date, draw_time) -> Optional[Draw]:
 
 def add_draw(draw_data: dict):
     """Adds a new draw. Returns the DocumentReference."""
+    db = get_db()
     if not db: return None
     try:
         doc_id = str(draw_data.get('draw_id')) if draw_data.get('draw_id') else None
@@ -114,6 +278,7 @@ def add_draw(draw_data: dict):
         return None
 
 def update_draw(draw_id, update_data: dict):
+    db = get_db()
     if not db: return
     try:
         db.collection(COLLECTION_DRAWS).document(str(draw_id)).update(update_data)
@@ -121,8 +286,128 @@ def update_draw(draw_id, update_data: dict):
         print(f"Error updating draw {draw_id}: {e}")
 
 def get_draw_count():
+    db = get_db()
     if not db: return 0
     try:
-        return len(list(db.collection(COLLECTION_DRAWS).stream()))
-    except:
-        return 0
+        # Server-side aggregation: no document is transferred
+        result = db.collection(COLLECTION_DRAWS).count().get()
+        return int(result[0][0].value)
+    except Exception:
+        try:
+            # Older clients: project on no field so only document keys come back
+            return sum(1 for _ in db.collection(COLLECTION_DRAWS).select([]).stream())
+        except:
+            return 0
+
+def get_data_version() -> Optional[tuple]:
+    """
+    Returns the (draw count, latest draw_id) published by the ingesting process, or None.
+    A single document read: lets non-leader processes detect new data cheaply.
+    """
+    db = get_db()
+    if not db: return None
+    try:
+        doc = db.collection(COLLECTION_META).document('data_version').get()
+        if doc.exists:
+            d = doc.to_dict()
+            return (d.get("draw_count"), d.get("last_draw_id"))
+        return None
+    except Exception as e:
+        print(f"Error fetching data version: {e}")
+        return None
+
+def set_data_version(data_version: tuple):
+    db = get_db()
+    if not db: return
+    try:
+        db.collection(COLLECTION_META).document('data_version').set({
+            "draw_count": data_version[0],
+            "last_draw_id": data_version[1],
+            "updated_at": datetime.now().isoformat()
+        })
+    except Exception as e:
+        print(f"Error setting data version: {e}")
+
+def try_acquire_lease(name: str, holder: str, ttl_seconds: float) -> bool:
+    """
+    Acquires or renews the lease `name` for `holder` (transactional).
+    Fails if another holder owns a lease that has not expired yet.
+    """
+    db = get_db()
+    if not db: return False
+    try:
+        ref = db.collection(COLLECTION_LEASES).document(name)
+
+        @_firestore().transactional
+        def _acquire(transaction):
+            snap = ref.get(transaction=transaction)
+            now = time.time()
+            if snap.exists:
+                d = snap.to_dict()
+                if d.get("holder") != holder and d.get("expires_at", 0) > now:
+                    return False
+            transaction.set(ref, {"holder": holder, "expires_at": now + ttl_seconds})
+            return True
+
+        return _acquire(db.transaction())
+    except Exception as e:
+        print(f"Error acquiring lease {name}: {e}")
+        return False
+
+def release_lease(name: str, holder: str):
+    db = get_db()
+    if not db: return
+    try:
+        ref = db.collection(COLLECTION_LEASES).document(name)
+        snap = ref.get()
+        if snap.exists and snap.to_dict().get("holder") == holder:
+            ref.delete()
+    except Exception as e:
+        print(f"Error releasing lease {name}: {e}")
+
+# Background job state (see jobs.py), readable by every worker / instance:
+#   jobs/{job_id} = {job (JSON of Job.to_dict()), status, revision, cancel_requested,
+#                    updated_at, heartbeat_at (epoch seconds of the owner's last write)}
+# The job is stored as a JSON string: results hold nested lists, which Firestore rejects.
+
+def save_job(job_id: str, job_json: str, status: str, revision: int):
+    db = get_db()
+    if not db: return
+    try:
+        db.collection(COLLECTION_JOBS).document(job_id).set({
+            "job": job_json,
+            "status": status,
+            "revision": revision,
+            "updated_at": datetime.now().isoformat(),
+            "heartbeat_at": time.time()
+        }, merge=True)
+    except Exception as e:
+        print(f"Error saving job {job_id}: {e}")
+
+def get_job(job_id: str) -> Optional[dict]:
+    """Returns {"job": dict, "revision", "cancel_requested", "heartbeat_at"} for `job_id`, or None."""
+    db = get_db()
+    if not db: return None
+    try:
+        doc = db.collection(COLLECTION_JOBS).document(job_id).get()
+        if not doc.exists:
+            return None
+        d = doc.to_dict()
+        return {
+            "job": json.loads(d["job"]),
+            "revision": d.get("revision", 0),
+            "cancel_requested": bool(d.get("cancel_requested")),
+            "heartbeat_at": d.get("heartbeat_at", 0)
+        }
+    except Exception as e:
+        print(f"Error fetching job {job_id}: {e}")
+        return None
+
+def request_job_cancel(job_id: str):
+    """Flags `job_id` for cancellation; the process running it polls the flag."""
+    db = get_db()
+    if not db: return
+    try:
+        db.collection(COLLECTION_JOBS).document(job_id).set({"cancel_requested": True}, merge=True)
+    except Exception as e:
+        print(f"Error requesting cancel of job {job_id}: {e}")
@@ -30,9 +30,27 @@ const ExpertAgentPanel = () => {
         setOptimizing(true);
         setOptimizationResult(null);
         try {
+            // The optimisation runs as a background job: poll it until it finishes
             const res = await fetch(`${API_BASE}/expert/optimize`, { method: 'POST' });
-            const data = await res.json();
-            setOptimizationResult(data);
+            let job = await res.json();
+            if (!res.ok) {
+                throw new Error(job.detail || `HTTP ${res.status}`);
+            }
+            while (job.status === 'queued' || job.status === 'running') {
+                await new Promise(resolve => setTimeout(resolve, 1000));
+                const poll = await fetch(`${API_BASE}/jobs/${job.job_id}`);
+                const body = await poll.json();
+                if (!poll.ok) {
+                    // e.g. 404 "Unknown job": keep the last known state instead of an undefined status
+                    throw new Error(body.detail || `HTTP ${poll.status}`);
+                }
+                job = body;
+            }
+            if (job.status === 'done') {
+                setOptimizationResult(job.result);
+            } else {
+                console.error("Optimization job ended", job.status, job.error);
+            }
         } catch (err) {
             console.error("Optimization failed", err);
         } finally {
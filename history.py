@@ -0,0 +1,322 @@
+from typing import List, Optional, Any
+
+# Lazy imports - moved inside functions to avoid initialization issues
+# from firestore_service import get_draw_records
+
+LETTERS = "ABCDE"
+SLOT_HOURS = tuple(range(13, 20))  # Hourly draws, 13h to 19h
+
+
+def draw_hour(draw_id: int) -> int:
+    """Hour slot of a draw (draw_id = YYYYMMDDHH)."""
+    return int(draw_id) % 100
+
+
+class _GrowableTable:
+    """
+    Row buffer with spare capacity, shared by a history and the histories appended to it.
+    Rows [0, n) are never modified once written, so every history keeps a valid view of
+    its own prefix; appending at the end writes one row (amortized O(1)).
+    """
+
+    def __init__(self, rows):
+        import numpy as np
+        self.n = len(rows)
+        self.buf = np.zeros((max(2 * self.n, 64),) + rows.shape[1:], dtype=rows.dtype)
+        self.buf[:self.n] = rows
+
+    def view(self, n: int):
+        v = self.buf[:n]
+        v.flags.writeable = False
+        return v
+
+    def push(self, row):
+        import numpy as np
+        if self.n == len(self.buf):
+            grown = np.zeros((2 * len(self.buf),) + self.buf.shape[1:], dtype=self.buf.dtype)
+            grown[:self.n] = self.buf[:self.n]
+            self.buf = grown
+        self.buf[self.n] = row
+        self.n += 1
+
+
+class DrawHistory:
+    """
+    Request-scoped view of the draw history (oldest first, pending draws excluded).
+
+    Load it ONCE per request or job and pass it to the engines:
+        history = DrawHistory.load()
+        calculate_prediction(history=history)
+        calculate_matrix_prediction(history=history)
+    Everything derived (DataFrame, latest draw, matrices) is computed from it,
+    so a single request never scans the draws collection twice.
+    """
+
+    def __init__(self, draws: Optional[List[Any]] = None):
+        draws = draws or []
+        # Accept DrawRecord tuples, Draw models (or anything exposing the same attributes)
+        draws = [d for d in draws if getattr(d, "source", None) != 'ai_pending']
+        self.draw_ids = [d.draw_id for d in draws]
+        self.dates = [d.date for d in draws]
+        self.times = [d.time for d in draws]
+        self.balls = [list(d.balls_list or []) for d in draws]
+        self.letters = [d.bonus_letter for d in draws]
+        self.sources = [d.source for d in draws]
+        self._df = None
+        self._incidence = None
+        self._tables = {}  # name -> _GrowableTable (incidence and cumulative counts)
+        self._slots = {}   # hour -> DrawHistory of that slot's draws (see slot())
+
+    @classmethod
+    def from_arrays(cls, draw_ids, dates, times, balls, letters, sources) -> "DrawHistory":
+        """Builds a history from parallel columns (e.g. attached from the shared cache)."""
+        new = cls()
+        new.draw_ids = list(draw_ids)
+        new.dates = list(dates)
+        new.times = list(times)
+        new.balls = [list(b) for b in balls]
+        new.letters = list(letters)
+        new.sources = list(sources)
+        return new
+
+    @classmethod
+    def load(cls, use_shared: bool = True) -> "DrawHistory":
+        """
+        Returns the current history.
+        With `use_shared`, a history recently published by another worker of this host
+        (see shared_cache) is reused; otherwise the draws are fetched from Firestore
+        (one projected collection scan) and published for the other workers.
+        Jobs that must see the database state right now pass use_shared=False.
+        """
+        import shared_cache  # Lazy import
+        if use_shared:
+            history = shared_cache.load_history()
+            if history is not None:
+                return history
+        from firestore_service import get_draw_records  # Lazy import
+        history = cls(get_draw_records())
+        print(f"[HISTORY] Loaded {len(history)} draws.")
+        shared_cache.publish_history(history)
+        return history
+
+    @classmethod
+    def current_version(cls, use_shared: bool = True):
+        """
+        data_version of the current history, read from the shared cache header when one
+        was published recently (no history built); otherwise that of load().
+        """
+        import shared_cache  # Lazy import
+        if use_shared:
+            version = shared_cache.history_version()
+            if version is not None:
+                return version
+        return cls.load(use_shared=use_shared).data_version
+
+    def __len__(self):
+        return len(self.balls)
+
+    @property
+    def empty(self) -> bool:
+        return len(self.balls) == 0
+
+    @property
+    def data_version(self):
+        """(draw count, latest draw_id): changes whenever a draw is added."""
+        return (len(self.balls), self.draw_ids[-1] if self.draw_ids else None)
+
+    def prefix(self, n: int) -> "DrawHistory":
+        """The first `n` draws, i.e. what was known before draw `n` (for backtests and backfills)."""
+        new = DrawHistory()
+        new.draw_ids = self.draw_ids[:n]
+        new.dates = self.dates[:n]
+        new.times = self.times[:n]
+        new.balls = self.balls[:n]
+        new.letters = self.letters[:n]
+        new.sources = self.sources[:n]
+        if self._incidence is not None:
+            new._incidence = self._incidence[:n]
+        return new
+
+    def _table(self, name: str, build):
+        """Cached read-only table view; `build()` creates the rows on first use."""
+        table = self._tables.get(name)
+        if table is None:
+            table = _GrowableTable(build())
+            self._tables[name] = table
+        rows = len(self) + 1 if name.endswith("_counts") else len(self)
+        return table.view(rows)
+
+    def latest_balls(self) -> List[int]:
+        return self.balls[-1] if self.balls else []
+
+    @property
+    def incidence(self):
+        """
+        N x 25 uint8 array, row t = draw t, column n-1 = 1 if ball n was drawn.
+        Built once (vectorized) and cached; read-only.
+        """
+        if self._incidence is None:
+            def build():
+                import numpy as np
+                x = np.zeros((len(self.balls), 25), dtype=np.uint8)
+                rows = [t for t, b in enumerate(self.balls) for n in b if 1 <= n <= 25]
+                cols = [n - 1 for b in self.balls for n in b if 1 <= n <= 25]
+                x[rows, cols] = 1
+                return x
+            self._incidence = self._table("incidence", build)
+        return self._incidence
+
+    @property
+    def letter_incidence(self):
+        """N x 5 uint8 array, row t = draw t, column = letter A-E."""
+        def build():
+            import numpy as np
+            x = np.zeros((len(self.letters), len(LETTERS)), dtype=np.uint8)
+            for t, l in enumerate(self.letters):
+                if l and l in LETTERS:
+                    x[t, LETTERS.index(l)] = 1
+            return x
+        return self._table("letter_incidence", build)
+
+    @property
+    def masks(self):
+        """N uint32 bitsets, bit n-1 set if ball n was drawn (see combination_index)."""
+        def build():
+            import numpy as np
+            weights = np.uint32(1) << np.arange(25, dtype=np.uint32)
+            return (self.incidence.astype(np.uint32) * weights).sum(axis=1, dtype=np.uint32)
+        return self._table("masks", build)
+
+    # --- Cumulative count tables ---
+    # number_counts[i, n-1] = occurrences of ball n in draws[:i] (N+1 rows), so the count
+    # over any window draws[i:j] is number_counts[j] - number_counts[i]. Same for letters.
+    # Built once, extended by appended() with one row per new draw.
+
+    @property
+    def number_counts(self):
+        def build():
+            import numpy as np
+            counts = np.zeros((len(self) + 1, 25), dtype=np.int32)
+            np.cumsum(self.incidence, axis=0, out=counts[1:])
+            return counts
+        return self._table("number_counts", build)
+
+    @property
+    def letter_counts(self):
+        def build():
+            import numpy as np
+            counts = np.zeros((len(self) + 1, len(LETTERS)), dtype=np.int32)
+            np.cumsum(self.letter_incidence, axis=0, out=counts[1:])
+            return counts
+        return self._table("letter_counts", build)
+
+    def window_bounds(self, start: Optional[int], stop: Optional[int]):
+        """(start, stop) positions of draws[start:stop], clamped (slice semantics)."""
+        start, stop, _ = slice(start, stop).indices(len(self))
+        return start, max(start, stop)
+
+    def window_counts(self, start: Optional[int] = None, stop: Optional[int] = None):
+        """Occurrences of balls 1-25 in draws[start:stop] (slice semantics), two row lookups."""
+        start, stop = self.window_bounds(start, stop)
+        counts = self.number_counts
+        return counts[stop] - counts[start]
+
+    def letter_window_counts(self, start: Optional[int] = None, stop: Optional[int] = None):
+        """Occurrences of letters A-E in draws[start:stop] (slice semantics)."""
+        start, stop = self.window_bounds(start, stop)
+        counts = self.letter_counts
+        return counts[stop] - counts[start]
+
+    def recent_counts(self, window: int, at: Optional[int] = None):
+        """Ball counts over the `window` draws before draw index `at` (default: the latest draws)."""
+        at = len(self) if at is None else at
+        return self.window_counts(max(at - window, 0), at)
+
+    def recent_letter_counts(self, window: int, at: Optional[int] = None):
+        at = len(self) if at is None else at
+        return self.letter_window_counts(max(at - window, 0), at)
+
+    # --- Hour slots ---
+    # slot(19) is the history of the 19h draws only, a DrawHistory like any other: the
+    # engines, snapshots and backtests run on it unchanged ("previous 19h draws" model).
+    # Built on first use; appended() extends the new draw's slot view incrementally and
+    # shares the other slots' views, so per-slot tables cost one row per draw.
+
+    def slot(self, hour: int) -> "DrawHistory":
+        """The draws of the `hour` slot (13-19), oldest first."""
+        hour = int(hour)
+        if hour not in SLOT_HOURS:
+            raise ValueError(f"Slot hour must be in {SLOT_HOURS[0]}..{SLOT_HOURS[-1]} (got {hour})")
+        view = self._slots.get(hour)
+        if view is None:
+            idx = [t for t, d in enumerate(self.draw_ids) if draw_hour(d) == hour]
+            view = DrawHistory.from_arrays(
+                [self.draw_ids[t] for t in idx], [self.dates[t] for t in idx], [self.times[t] for t in idx],
+                [self.balls[t] for t in idx], [self.letters[t] for t in idx], [self.sources[t] for t in idx])
+            self._slots[hour] = view
+        return view
+
+    def to_dataframe(self):
+        """Pandas view (draw_id, date, time, balls, bonus), built once and cached."""
+        if self._df is None:
+            import pandas as pd
+            if self.empty:
+                self._df = pd.DataFrame()
+            else:
+                self._df = pd.DataFrame({
+                    "draw_id": self.draw_ids,
+                    "date": self.dates,
+                    "time": self.times,
+                    "balls": self.balls,
+                    "bonus": self.letters
+                })
+        return self._df
+
+    def appended(self, draw) -> "DrawHistory":
+        """
+        Returns a new history including `draw`, inserted at its chronological position.
+        Used by jobs that add draws and keep working on the same history (no reload).
+        """
+        new = DrawHistory()
+        key = (draw.date, draw.time)
+        pos = len(self)
+        while pos > 0 and (self.dates[pos - 1], self.times[pos - 1]) > key:
+            pos -= 1
+        new.draw_ids = self.draw_ids[:pos] + [draw.draw_id] + self.draw_ids[pos:]
+        new.dates = self.dates[:pos] + [draw.date] + self.dates[pos:]
+        new.times = self.times[:pos] + [draw.time] + self.times[pos:]
+        new.balls = self.balls[:pos] + [list(draw.balls_list or [])] + self.balls[pos:]
+        new.letters = self.letters[:pos] + [draw.bonus_letter] + self.letters[pos:]
+        new.sources = self.sources[:pos] + [draw.source] + self.sources[pos:]
+        if pos == len(self):
+            new._extend_tables(self)
+            for hour, view in self._slots.items():
+                new._slots[hour] = view.appended(draw) if hour == draw_hour(draw.draw_id) else view
+        return new
+
+    def _extend_tables(self, parent: "DrawHistory"):
+        """Carries the parent's tables over to this history (= parent + one draw at the end)."""
+        import numpy as np
+        n = len(parent)
+        balls = np.zeros(25, dtype=np.uint8)
+        for b in self.balls[-1]:
+            if 1 <= b <= 25:
+                balls[b - 1] = 1
+        letter = np.zeros(len(LETTERS), dtype=np.uint8)
+        if self.letters[-1] and self.letters[-1] in LETTERS:
+            letter[LETTERS.index(self.letters[-1])] = 1
+        mask = np.uint32(sum(1 << (b - 1) for b in set(self.balls[-1]) if 1 <= b <= 25))
+        new_rows = {
+            "incidence": lambda t: balls,
+            "masks": lambda t: mask,
+            "letter_incidence": lambda t: letter,
+            "number_counts": lambda t: t.buf[n] + balls,
+            "letter_counts": lambda t: t.buf[n] + letter,
+        }
+        for name, table in parent._tables.items():
+            rows = n + 1 if name.endswith("_counts") else n
+            if table.n != rows:
+                # The parent's buffer was already extended by another append: copy
+                table = _GrowableTable(table.buf[:rows].copy())
+            table.push(new_rows[name](table))
+            self._tables[name] = table
@@ -0,0 +1,188 @@
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+# Ingest pipeline: what happens once when the scraper adds draws ("draw ingested" event).
+#
+# Registered stages run in order, each timed and retried (RETRIES attempts, doubling
+# delay); a failed `required` stage stops the pass, the others are logged and skipped:
+#   history     append the new draws to the current history (shared copy, no collection
+#               scan) and publish it to the other workers of the host
+#   matrices    incremental matrix update (base = live snapshot) + the draw's slot model
+#   stats       walk-forward backtest, slot views and query index caught up
+#   evaluate    matches / gain of the predictions stored for the new draws
+#   predict     prediction of the next calendar slot, computed, persisted and kept in
+#               memory (see next_prediction)
+#   caches      pre-encoded responses of the old data version dropped, new ones encoded
+#   publish     new data version announced to the followers (last: everything is ready)
+# Each new draw thus costs one incremental update, instead of lazy recomputations by
+# whichever requests arrive first.
+
+RETRIES = 3
+RETRY_DELAY = 0.5  # Seconds, doubled after each failed attempt
+
+_STAGES: List[Dict[str, Any]] = []
+_LAST_RUN: Optional[Dict[str, Any]] = None
+_RUN_LOCK = threading.Lock()
+
+
+class IngestEvent:
+    """One "draw ingested" event: the new draws and what the stages produce along the pass."""
+
+    def __init__(self, draws, history=None):
+        self.draws = list(draws)   # DrawRecord-like, oldest first
+        self.history = history     # Set by the history stage (includes the new draws)
+        self.results: Dict[str, Any] = {}
+
+
+def stage(name: str, required: bool = False, retries: int = RETRIES):
+    """Decorator registering fn(event) as the next stage of the pipeline."""
+    def register(fn: Callable[[IngestEvent], Any]):
+        _STAGES.append({"name": name, "fn": fn, "required": required, "retries": retries})
+        return fn
+    return register
+
+def run(draws, history=None) -> Dict[str, Any]:
+    """
+    Runs every stage for the ingested `draws`. `history`, if given, already includes them
+    (the history stage then only publishes it). Returns the per-stage report.
+    """
+    global _LAST_RUN
+    event = IngestEvent(draws, history)
+    report = {"draw_ids": [d.draw_id for d in event.draws], "stages": [], "ok": True}
+    started = time.time()
+    with _RUN_LOCK:  # One pass at a time: stages extend shared incremental state
+        for s in _STAGES:
+            entry = {"name": s["name"], "status": "done", "attempts": 0}
+            t0 = time.time()
+            delay = RETRY_DELAY
+            for attempt in range(1, s["retries"] + 1):
+                entry["attempts"] = attempt
+                try:
+                    result = s["fn"](event)
+                    if result is not None:
+                        event.results[s["name"]] = result
+                    entry.pop("error", None)
+                    break
+                except Exception as e:
+                    entry["error"] = str(e)
+                    print(f"[INGEST] Stage {s['name']} failed (attempt {attempt}/{s['retries']}): {e}")
+                    if attempt < s["retries"]:
+                        time.sleep(delay)
+                        delay *= 2
+            entry["seconds"] = round(time.time() - t0, 4)
+            if "error" in entry:
+                entry["status"] = "failed"
+                report["ok"] = False
+            report["stages"].append(entry)
+            if entry["status"] == "failed" and s["required"]:
+                print(f"[INGEST] Required stage {s['name']} failed: pass stopped.")
+                break
+        report["seconds"] = round(time.time() - started, 4)
+        report["data_version"] = list(event.history.data_version) if event.history is not None else None
+        report["results"] = event.results
+        _LAST_RUN = report
+    print(f"[INGEST] {len(event.draws)} draw(s) ingested in {report['seconds']}s: " +
+          ", ".join(f"{e['name']} {e['seconds']}s" + ("" if e["status"] == "done" else " FAILED")
+                    for e in report["stages"]))
+    return report
+
+def last_run() -> Optional[Dict[str, Any]]:
+    """Report of the latest pass (None before the first one)."""
+    return _LAST_RUN
+
+
+# --- Stages (registration order = execution order) ---
+
+@stage("history", required=True)
+def append_history(event: IngestEvent):
+    from history import DrawHistory  # Lazy import
+    import shared_cache  # Lazy import
+    history = event.history
+    if history is None:
+        # The published history is the state before these draws if it matches the data
+        # version announced by the last pass: append them in memory (no collection scan)
+        from firestore_service import get_data_version  # Lazy import
+        base = shared_cache.load_history()
+        version = get_data_version()
+        first = event.draws[0].draw_id if event.draws else None
+        if (base is not None and version is not None and tuple(base.data_version) == tuple(version)
+                and (base.empty or base.draw_ids[-1] < first)):
+            history = base
+            for d in event.draws:
+                history = history.appended(d)
+        else:
+            history = DrawHistory.load(use_shared=False)
+    event.history = history
+    shared_cache.publish_history(history)
+    return {"draws": len(history)}
+
+@stage("matrices", required=True)
+def update_matrices(event: IngestEvent):
+    import matrix_engine  # Lazy import
+    from history import draw_hour  # Lazy import
+    snapshot = matrix_engine.build_matrices(event.history)
+    for hour in sorted({draw_hour(d.draw_id) for d in event.draws}):
+        matrix_engine.get_slot_snapshot(event.history, hour)
+    return {"snapshot_version": snapshot.version}
+
+@stage("stats")
+def update_stats(event: IngestEvent):
+    import matrix_backtest  # Lazy import
+    import draw_index  # Lazy import
+    from history import draw_hour  # Lazy import
+    matrix_backtest.walk_forward(event.history)
+    for hour in sorted({draw_hour(d.draw_id) for d in event.draws}):
+        matrix_backtest.walk_forward(event.history, hour)
+    draw_index.get_index(event.history)
+
+@stage("evaluate")
+def evaluate_predictions(event: IngestEvent):
+    import numpy as np
+    from firestore_service import get_predictions_for_draws, save_prediction_evaluation  # Lazy import
+    from matrix_backtest import ticket_gains  # Lazy import
+    stored = get_predictions_for_draws([d.draw_id for d in event.draws])
+    evaluations = {}
+    for d in event.draws:
+        prediction = stored.get(d.draw_id)
+        if not prediction:
+            continue
+        evaluation = {}
+        for engine in ("statistical", "algorithmic"):
+            p = prediction.get(engine) or {}
+            if not p.get("numbers"):
+                continue
+            matches = len(set(d.balls_list) & set(p["numbers"]))
+            letter_hit = bool(p.get("letter")) and p.get("letter") == d.bonus_letter
+            evaluation[engine] = {
+                "matches": matches,
+                "letter_hit": letter_hit,
+                "gain": float(ticket_gains(np.array([matches]), np.array([letter_hit]))[0])
+            }
+        save_prediction_evaluation(d.draw_id, evaluation)
+        evaluations[str(d.draw_id)] = evaluation
+    return evaluations
+
+@stage("predict")
+def predict_next_slot(event: IngestEvent):
+    import next_prediction  # Lazy import
+    return next_prediction.precompute(event.history)
+
+@stage("caches")
+def refresh_caches(event: IngestEvent):
+    import fast_json  # Lazy import
+    from engine import get_comprehensive_stats  # Lazy import
+    from matrix_engine import get_matrix_visual_data, DEFAULT_LAG_WEIGHTS  # Lazy import
+    history = event.history
+    version = history.data_version
+    dropped = fast_json.invalidate()
+    # Same keys as the /matrix (default parameters) and /stats endpoints
+    fast_json.warm(("matrix", version, "full", DEFAULT_LAG_WEIGHTS),
+                   lambda: get_matrix_visual_data(history=history))
+    fast_json.warm(("stats", version), lambda: get_comprehensive_stats(history=history))
+    return {"dropped": dropped}
+
+@stage("publish")
+def publish_data_version(event: IngestEvent):
+    from firestore_service import set_data_version  # Lazy import
+    set_data_version(event.history.data_version)
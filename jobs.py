@@ -0,0 +1,315 @@
+import json
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Iterator, Optional
+
+# Background jobs for long computations (formula optimisation, heavy analytics).
+#
+# Jobs run on a small bounded thread pool so they never tie up the request workers.
+# A job function receives its Job and reports progress (and a partial best-so-far
+# result) with job.report(); report() raises JobCancelled once cancel() was called,
+# so cancellation takes effect at the next progress step.
+# Results are cached by (kind, key, data version): submitting the same work twice
+# to the same process returns the running or finished job instead of starting a new one.
+#
+# Jobs run in the process that accepted them, but their state is also written to
+# Firestore (jobs/{job_id}: on start and finish, progress at most every PUBLISH_INTERVAL),
+# so a poll, event stream or cancel routed to another worker or instance still finds
+# the job. A cancel received elsewhere sets a flag that the running process checks from
+# report() every CANCEL_POLL seconds.
+# The owning process also re-writes its unfinished jobs every HEARTBEAT_INTERVAL; a
+# stored job left queued/running with no write for HEARTBEAT_TIMEOUT (process restarted
+# or scaled down) is reported, and written back, as failed ("worker lost").
+
+MAX_WORKERS = int(os.environ.get("CRESCENDO_JOB_WORKERS", "1"))
+MAX_QUEUED = int(os.environ.get("CRESCENDO_JOB_QUEUE", "8"))
+MAX_KEPT = 100  # Finished jobs kept for polling
+PUBLISH_INTERVAL = 1.0  # Seconds between two progress writes of a job to Firestore
+CANCEL_POLL = 2.0       # Seconds between two reads of a job's remote cancel flag
+REMOTE_POLL = 1.0       # Seconds between two reads of a job run by another process (SSE)
+HEARTBEAT_INTERVAL = 10.0  # Seconds between two writes of an unfinished job by its owner
+HEARTBEAT_TIMEOUT = 60.0   # Seconds without a write after which an unfinished job is lost
+
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+CANCELLED = "cancelled"
+FINISHED_STATES = (DONE, FAILED, CANCELLED)
+
+
+class JobCancelled(Exception):
+    pass
+
+
+class QueueFull(Exception):
+    pass
+
+
+class Job:
+    def __init__(self, kind: str, cache_key: tuple):
+        self.id = uuid.uuid4().hex[:12]
+        self.kind = kind
+        self.cache_key = cache_key
+        self.status = QUEUED
+        self.progress = {"done": 0, "total": None}
+        self.partial = None
+        self.result = None
+        self.error = None
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self.revision = 0  # Bumped on every change (SSE streams wait on it)
+        self._cancel = threading.Event()
+        self._changed = threading.Condition()
+        self._published_at = 0.0
+        self._cancel_checked_at = time.time()
+
+    def report(self, done: int, total: int = None, partial: Any = None):
+        """Progress from the job function. Raises JobCancelled if the job was cancelled."""
+        if time.time() - self._cancel_checked_at >= CANCEL_POLL:
+            self._check_remote_cancel()
+        if self._cancel.is_set():
+            raise JobCancelled()
+        self.progress = {"done": done, "total": total if total is not None else self.progress["total"]}
+        if partial is not None:
+            self.partial = partial
+        self._touch(publish=False)
+
+    def cancel(self):
+        self._cancel.set()
+        if self.status == QUEUED:
+            self._finish(CANCELLED)
+
+    @property
+    def cancelled(self) -> bool:
+        return self._cancel.is_set()
+
+    def wait_change(self, revision: int, timeout: float) -> int:
+        """Blocks until the job changed after `revision` (or timeout); returns the current revision."""
+        with self._changed:
+            if self.revision == revision:
+                self._changed.wait(timeout)
+            return self.revision
+
+    def _touch(self, publish: bool = True):
+        """Marks a change; state changes are published at once, progress is throttled."""
+        with self._changed:
+            self.revision += 1
+            self._changed.notify_all()
+        if publish or time.time() - self._published_at >= PUBLISH_INTERVAL:
+            self._publish()
+
+    def _publish(self):
+        from fast_json import dumps  # Lazy import
+        from firestore_service import save_job  # Lazy import
+        self._published_at = time.time()
+        save_job(self.id, dumps(self.to_dict()).decode("utf-8"), self.status, self.revision)
+
+    def _check_remote_cancel(self):
+        from firestore_service import get_job  # Lazy import
+        self._cancel_checked_at = time.time()
+        stored = get_job(self.id)
+        if stored is not None and stored["cancel_requested"]:
+            self._cancel.set()
+
+    def _finish(self, status: str, result: Any = None, error: str = None):
+        self.status = status
+        self.result = result
+        self.error = error
+        self.finished_at = time.time()
+        self._touch()
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "job_id": self.id,
+            "kind": self.kind,
+            "status": self.status,
+            "progress": self.progress,
+            "partial": self.partial,
+            "result": self.result,
+            "error": self.error,
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+            "data_version": list(self.cache_key[2]) if self.cache_key[2] else None,
+        }
+
+
+def _check_alive(job_id: str, stored: Optional[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+    """
+    `stored` (get_job) as is, or marked failed (and written back) if it is unfinished
+    and its owner stopped writing it HEARTBEAT_TIMEOUT seconds ago.
+    """
+    if stored is None or stored["job"]["status"] in FINISHED_STATES:
+        return stored
+    if time.time() - stored["heartbeat_at"] < HEARTBEAT_TIMEOUT:
+        return stored
+    from fast_json import dumps  # Lazy import
+    from firestore_service import save_job  # Lazy import
+    job = dict(stored["job"], status=FAILED, error="worker lost", finished_at=time.time())
+    revision = stored["revision"] + 1
+    print(f"[JOBS] Job {job_id} has no heartbeat since {stored['heartbeat_at']:.0f}: marked failed.")
+    save_job(job_id, dumps(job).decode("utf-8"), FAILED, revision)
+    return dict(stored, job=job, revision=revision)
+
+
+class JobRunner:
+    def __init__(self, max_workers: int = MAX_WORKERS, max_queued: int = MAX_QUEUED):
+        self.max_queued = max_queued
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="job")
+        self._jobs: "OrderedDict[str, Job]" = OrderedDict()
+        self._by_key: Dict[tuple, Job] = {}
+        self._lock = threading.Lock()
+        threading.Thread(target=self._heartbeat, name="job-heartbeat", daemon=True).start()
+
+    def _heartbeat(self):
+        """Re-writes the unfinished jobs of this process (they are alive) every HEARTBEAT_INTERVAL."""
+        while True:
+            time.sleep(HEARTBEAT_INTERVAL)
+            with self._lock:
+                pending = [j for j in self._jobs.values() if j.status not in FINISHED_STATES]
+            for job in pending:
+                if time.time() - job._published_at >= HEARTBEAT_INTERVAL:
+                    job._publish()
+
+    def submit(self, kind: str, fn: Callable[[Job], Any], key: Any = None, data_version: tuple = None) -> Job:
+        """
+        Runs fn(job) in the background and returns the Job.
+        An identical submission (same kind, key and data version) returns the job already
+        queued, running or done instead; failed/cancelled jobs are retried.
+        """
+        cache_key = (kind, json.dumps(key, sort_keys=True, default=str), tuple(data_version) if data_version else None)
+        with self._lock:
+            existing = self._by_key.get(cache_key)
+            if existing is not None and existing.status in (QUEUED, RUNNING, DONE):
+                return existing
+            pending = sum(1 for j in self._jobs.values() if j.status in (QUEUED, RUNNING))
+            if pending >= self.max_queued:
+                raise QueueFull(f"{pending} jobs already pending")
+            job = Job(kind, cache_key)
+            self._jobs[job.id] = job
+            self._by_key[cache_key] = job
+            self._evict_locked()
+        job._publish()  # Visible to the other workers before it starts
+        self._pool.submit(self._run, job, fn)
+        return job
+
+    def get(self, job_id: str) -> Optional[Job]:
+        """The job if this process runs it (see status() for any job)."""
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def status(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """Job.to_dict() of `job_id`, from this process or from the shared store; None if unknown."""
+        job = self.get(job_id)
+        if job is not None:
+            return job.to_dict()
+        from firestore_service import get_job  # Lazy import
+        stored = _check_alive(job_id, get_job(job_id))
+        return stored["job"] if stored is not None else None
+
+    def cancel(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """
+        Cancels `job_id`: directly if this process runs it, else through the shared
+        store's cancel flag. Returns the job's state (None if unknown).
+        """
+        job = self.get(job_id)
+        if job is not None:
+            if job.status not in FINISHED_STATES:
+                job.cancel()
+            return job.to_dict()
+        from firestore_service import get_job, request_job_cancel  # Lazy import
+        stored = _check_alive(job_id, get_job(job_id))
+        if stored is None:
+            return None
+        if stored["job"]["status"] not in FINISHED_STATES:
+            request_job_cancel(job_id)
+        return stored["job"]
+
+    def watch(self, job_id: str, keep_alive: float = 15.0) -> Optional[Iterator[Optional[Dict[str, Any]]]]:
+        """
+        Iterator of the job's state on each change until it finishes (None after
+        `keep_alive` seconds without change), or None if the job is unknown.
+        Jobs run by another process are followed through the shared store.
+        """
+        job = self.get(job_id)
+        if job is not None:
+            return self._watch_local(job, keep_alive)
+        from firestore_service import get_job  # Lazy import
+        stored = _check_alive(job_id, get_job(job_id))
+        if stored is None:
+            return None
+        return self._watch_stored(job_id, stored, keep_alive)
+
+    @staticmethod
+    def _watch_local(job: Job, keep_alive: float):
+        revision = -1
+        while True:
+            current = job.wait_change(revision, timeout=keep_alive)
+            if current == revision:
+                yield None
+                continue
+            revision = current
+            yield job.to_dict()
+            if job.status in FINISHED_STATES:
+                return
+
+    @staticmethod
+    def _watch_stored(job_id: str, stored: Dict[str, Any], keep_alive: float):
+        from firestore_service import get_job  # Lazy import
+        revision = None
+        quiet_since = time.time()
+        while stored is not None:  # None: the job document is gone (or unreadable)
+            if stored["revision"] != revision:
+                revision = stored["revision"]
+                quiet_since = time.time()
+                yield stored["job"]
+                if stored["job"]["status"] in FINISHED_STATES:
+                    return
+            elif time.time() - quiet_since >= keep_alive:
+                quiet_since = time.time()
+                yield None
+            time.sleep(REMOTE_POLL)
+            stored = _check_alive(job_id, get_job(job_id))
+
+    def _run(self, job: Job, fn: Callable[[Job], Any]):
+        if job.cancelled:
+            if job.status != CANCELLED:
+                job._finish(CANCELLED)
+            return
+        job.status = RUNNING
+        job.started_at = time.time()
+        job._touch()
+        try:
+            result = fn(job)
+            job._finish(DONE, result=result)
+        except JobCancelled:
+            job._finish(CANCELLED)
+        except Exception as e:
+            print(f"[JOBS] Job {job.id} ({job.kind}) failed: {e}")
+            job._finish(FAILED, error=str(e))
+
+    def _evict_locked(self):
+        finished = [j for j in self._jobs.values() if j.status in FINISHED_STATES]
+        for job in finished[:max(0, len(self._jobs) - MAX_KEPT)]:
+            del self._jobs[job.id]
+            if self._by_key.get(job.cache_key) is job:
+                del self._by_key[job.cache_key]
+
+
+_RUNNER: Optional[JobRunner] = None
+_RUNNER_LOCK = threading.Lock()
+
+def get_runner() -> JobRunner:
+    """Process-wide job runner (created on first use)."""
+    global _RUNNER
+    if _RUNNER is None:
+        with _RUNNER_LOCK:
+            if _RUNNER is None:
+                _RUNNER = JobRunner()
+    return _RUNNER
@@ -0,0 +1,127 @@
+import os
+import socket
+import threading
+import time
+import uuid
+from typing import Dict, Tuple
+
+try:
+    import fcntl
+except ImportError:  # Windows dev machines: single process, no host lock needed
+    fcntl = None
+
+# Leader election for background jobs (scrape + ingest).
+#
+# Two levels, both must be won:
+#   1. Host: an exclusive, non-blocking file lock. Only one uvicorn worker per host
+#      can hold it; the others never even talk to the lease store.
+#   2. Cluster: a lease document (Firestore `leases/{name}`) renewed on every cycle.
+#      Only one instance holds it at a time; if the leader dies, the lease expires
+#      and another instance takes over on its next cycle.
+# LocalLeaseStore is an in-process stand-in used when Firestore is not available
+# (local runs, tests).
+
+LEASE_NAME = "scheduler"
+LEASE_TTL = float(os.environ.get("CRESCENDO_LEASE_TTL", "90"))  # > job interval (60s)
+
+
+class LocalLeaseStore:
+    """In-memory lease store with the same semantics as the Firestore one."""
+
+    def __init__(self):
+        self._leases: Dict[str, Tuple[str, float]] = {}
+        self._lock = threading.Lock()
+
+    def try_acquire(self, name: str, holder: str, ttl_seconds: float) -> bool:
+        with self._lock:
+            now = time.time()
+            current = self._leases.get(name)
+            if current and current[0] != holder and current[1] > now:
+                return False
+            self._leases[name] = (holder, now + ttl_seconds)
+            return True
+
+    def release(self, name: str, holder: str):
+        with self._lock:
+            current = self._leases.get(name)
+            if current and current[0] == holder:
+                del self._leases[name]
+
+
+class FirestoreLeaseStore:
+    """Lease documents in Firestore (see firestore_service.try_acquire_lease)."""
+
+    def try_acquire(self, name: str, holder: str, ttl_seconds: float) -> bool:
+        from firestore_service import try_acquire_lease  # Lazy import
+        return try_acquire_lease(name, holder, ttl_seconds)
+
+    def release(self, name: str, holder: str):
+        from firestore_service import release_lease  # Lazy import
+        release_lease(name, holder)
+
+
+class HostLock:
+    """Exclusive per-host file lock, held until the process exits (or release())."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._file = None
+
+    def try_acquire(self) -> bool:
+        if self._file is not None:
+            return True
+        if fcntl is None:
+            return True
+        f = open(self.path, "a+")
+        try:
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            f.close()
+            return False
+        self._file = f
+        return True
+
+    def release(self):
+        if self._file is not None:
+            if fcntl is not None:
+                fcntl.flock(self._file.fileno(), fcntl.LOCK_UN)
+            self._file.close()
+            self._file = None
+
+
+class LeaderElector:
+    """
+    is_leader() is called at the start of every scheduler cycle: it (re)acquires the
+    host lock and renews the cluster lease. Losing either makes the process a follower.
+    """
+
+    def __init__(self, host_lock: HostLock, lease_store, name: str = LEASE_NAME, ttl_seconds: float = LEASE_TTL):
+        self.host_lock = host_lock
+        self.lease_store = lease_store
+        self.name = name
+        self.ttl_seconds = ttl_seconds
+        self.holder = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self.leader = False
+
+    def is_leader(self) -> bool:
+        was_leader = self.leader
+        self.leader = self.host_lock.try_acquire() and \
+            self.lease_store.try_acquire(self.name, self.holder, self.ttl_seconds)
+        if self.leader != was_leader:
+            print(f"[LEADER] {self.holder} is now {'LEADER' if self.leader else 'follower'} for '{self.name}'.")
+        return self.leader
+
+    def resign(self):
+        if self.leader:
+            self.lease_store.release(self.name, self.holder)
+        self.host_lock.release()
+        self.leader = False
+
+
+def default_elector() -> LeaderElector:
+    """Host file lock next to the shared cache + Firestore lease (local lease if no Firestore)."""
+    from shared_cache import SHARED_DIR  # Lazy import
+    from firestore_service import get_db  # Lazy import
+    host_lock = HostLock(os.path.join(SHARED_DIR, f"crescendo_{LEASE_NAME}.lock"))
+    store = FirestoreLeaseStore() if get_db() is not None else LocalLeaseStore()
+    return LeaderElector(host_lock, store)
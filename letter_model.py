@@ -0,0 +1,100 @@
+import numpy as np
+from typing import Dict, Any, Optional
+
+from history import LETTERS
+
+# Letter (bonus) model, shared by both engines.
+#
+#   statistical: frequency over the last `letter_window` draws + gap, with the engine's
+#                weights (same shape as the number score).
+#   algorithmic: 5x5 Markov layer P(letter T+1 | letter T), counted with the matrices
+#                (ModelSnapshot.letter_transitions), blended with the all-time frequency
+#                like Time/Space for numbers.
+# Ties go to the first letter (A before E). The *_batch functions score every prefix of
+# a history at once for the backtests.
+
+MARKOV_WEIGHT = 0.7
+FREQ_WEIGHT = 0.3
+
+
+def statistical_letter_scores(counts, gaps, window: int, freq_w: float, gap_w: float, decay: float) -> np.ndarray:
+    """
+    freq_w * count / expected count + gap_w * (1 - exp(-decay * gap)).
+    The count is scaled by its expectation (window / 5) so both terms are ~[0, 1].
+    """
+    counts = np.asarray(counts, dtype=float)
+    gaps = np.asarray(gaps, dtype=float)
+    expected = max(window, 1) / len(LETTERS)
+    return freq_w * counts / expected + gap_w * (1 - np.exp(-decay * gaps))
+
+def markov_letter_scores(transitions, letter_counts, latest_letter: Optional[str]) -> np.ndarray:
+    """0.7 * P(l | latest letter) + 0.3 * all-time share, each normalized by its max."""
+    transitions = np.asarray(transitions, dtype=float)
+    row = transitions[LETTERS.index(latest_letter)] if latest_letter in LETTERS else np.zeros(len(LETTERS))
+    return MARKOV_WEIGHT * _by_max(row) + FREQ_WEIGHT * _by_max(np.asarray(letter_counts, dtype=float))
+
+def pick(scores) -> Dict[str, Any]:
+    """{"letter", "letter_details"} for a score vector over A-E (empty letter if no data)."""
+    scores = np.asarray(scores, dtype=float)
+    order = np.argsort(-np.round(scores, 12), kind="stable")
+    details = [{"letter": LETTERS[i], "score": float(scores[i])} for i in order]
+    letter = LETTERS[order[0]] if scores.max() > 0 else ""
+    return {"letter": letter, "letter_details": details}
+
+def statistical_letter(stats: Dict[str, Dict[str, int]], window: int, freq_w: float, gap_w: float, decay: float):
+    """Letter prediction from engine.calculate_letter_stats output."""
+    counts = [stats[l]["count"] for l in LETTERS]
+    gaps = [stats[l]["gap"] for l in LETTERS]
+    return pick(statistical_letter_scores(counts, gaps, window, freq_w, gap_w, decay))
+
+
+# --- Batch (backtests): prediction made before each draw i in `indices` ---
+
+def letter_last_seen(letter_incidence) -> np.ndarray:
+    """(N+1) x 5: row i = index of the last draw < i with each letter (-1 if none)."""
+    x = np.asarray(letter_incidence)
+    n = len(x)
+    last = np.full((n + 1, len(LETTERS)), -1, dtype=np.int64)
+    if n:
+        idx = np.where(x > 0, np.arange(n)[:, None], -1)
+        last[1:] = np.maximum.accumulate(idx, axis=0)
+    return last
+
+def statistical_letter_batch(letter_counts, last_seen, indices, window: int,
+                             freq_w: float, gap_w: float, decay: float) -> np.ndarray:
+    """Predicted letter index (0-4, -1 if no history) before each draw in `indices`."""
+    lo = np.maximum(indices - int(window), 0)
+    counts = letter_counts[indices] - letter_counts[lo]
+    last = last_seen[indices]
+    gaps = np.where(last >= 0, indices[:, None] - 1 - last, indices[:, None])
+    scores = statistical_letter_scores(counts, gaps, window, freq_w, gap_w, decay)
+    return _argmax(scores)
+
+def markov_letter_batch(letter_incidence, letter_counts, indices) -> np.ndarray:
+    """Predicted letter index (0-4, -1 if no history) of the algorithmic model before each draw."""
+    x = np.asarray(letter_incidence, dtype=float)
+    # Cumulative transition counts: trans[i] = sum over t < i of outer(x[t-1], x[t])
+    steps = np.einsum("tu,tv->tuv", x[:-1], x[1:]) if len(x) > 1 else np.zeros((0, 5, 5))
+    trans = np.zeros((len(x) + 1, len(LETTERS), len(LETTERS)))
+    if len(steps):
+        np.cumsum(steps, axis=0, out=trans[2:])
+    rows = np.zeros((len(indices), len(LETTERS)))
+    has_prev = indices > 0
+    prev = x[np.maximum(indices - 1, 0)]
+    rows[has_prev] = np.einsum("ru,ruv->rv", prev[has_prev], trans[indices[has_prev]])
+    scores = MARKOV_WEIGHT * _by_max(rows) + FREQ_WEIGHT * _by_max(np.asarray(letter_counts, dtype=float)[indices])
+    return _argmax(scores)
+
+def _by_max(v: np.ndarray) -> np.ndarray:
+    m = v.max(axis=-1, keepdims=True)
+    return np.divide(v, m, out=np.zeros_like(v, dtype=float), where=m > 0)
+
+def _argmax(scores: np.ndarray) -> np.ndarray:
+    best = np.argsort(-np.round(scores, 12), axis=1, kind="stable")[:, 0]
+    return np.where(scores.max(axis=1) > 0, best, -1)
+
+def letter_hits(letter_incidence, predicted: np.ndarray, indices) -> np.ndarray:
+    """1 where the predicted letter index was drawn at `indices`, else 0."""
+    x = np.asarray(letter_incidence)
+    hits = np.take_along_axis(x[indices], np.maximum(predicted, 0)[:, None], axis=1)[:, 0]
+    return np.where(predicted >= 0, hits, 0)
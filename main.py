@@ -1,17 +1,17 @@
 # Version: 1.0.1 - Auto-deploy trigger
-from fastapi import FastAPI, Depends, HTTPException
+from fastapi import FastAPI, Depends, HTTPException, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.middleware.gzip import GZipMiddleware
+from fastapi.responses import JSONResponse
 # from sqlalchemy.orm import Session -- REMOVED
 # from models import SessionLocal, Draw, init_db -- REMOVED
-from models import Draw
-from firestore_service import get_draw_by_date_time, add_draw, update_draw, get_all_draws_sorted, get_latest_draw
-from scheduler import start_scheduler
-from engine import calculate_prediction
+from firestore_service import get_recent_draw_records, get_predictions_for_draws
 from typing import List, Optional
 from pydantic import BaseModel
-import uvicorn
 import datetime
 import pytz
+# Heavy modules (engines, pandas/numpy, scheduler, scraper) are imported inside the
+# endpoints / warm-up that need them: see check_import_time.py for the budget.
 
 # --- Pydantic Schemas ---
 class DrawResponse(BaseModel):
@@ -112,171 +112,309 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+# Compresses large bodies built per request (cached bodies come pre-compressed, see fast_json)
+app.add_middleware(GZipMiddleware, minimum_size=1024)
+
+# --- Warm-up / Readiness ---
+# Startup returns immediately; the expensive work (scheduler, history load, matrix
+# build, next prediction) runs in a background thread. Requests arriving before it
+# finishes are served lazily (each engine loads/builds what it needs on demand).
+_READINESS = {"ready": False, "started_at": None, "finished_at": None, "error": None}
+
+def _warm_up():
+    try:
+        from scheduler import start_scheduler
+        start_scheduler() # Start the generic scraper loop (leader-elected)
+        
+        # Initialize Matrix Engine (shared cache first, Firestore otherwise)
+        from history import DrawHistory
+        from matrix_engine import get_snapshot
+        print("Initializing Matrix Engine...")
+        history = DrawHistory.load()
+        get_snapshot(history)
+        
+        # Make sure the upcoming slot already has its prediction
+        get_prediction()
+        _READINESS["ready"] = True
+        print("Warm-up complete.")
+    except Exception as e:
+        _READINESS["error"] = str(e)
+        print(f"Warm-up failed: {e}")
+    finally:
+        _READINESS["finished_at"] = datetime.datetime.now()
 
 @app.on_event("startup")
 def on_startup():
     # init_db() # No need for Firestore
-    start_scheduler() # Start the generic scraper loop
-    
-    # Initialize Matrix Engine
-    from matrix_engine import build_matrices
-    print("Initializing Matrix Engine...")
-    build_matrices()
+    import threading
+    _READINESS["started_at"] = datetime.datetime.now()
+    threading.Thread(target=_warm_up, name="warm-up", daemon=True).start()
 
 @app.get("/status", response_model=StatusResponse)
 def get_status():
+    """Liveness: the process is up (does not wait for warm-up)."""
     return {
         "status": "online",
         "timestamp": datetime.datetime.now()
     }
 
+@app.get("/ready")
+def get_ready():
+    """
+    Readiness: 200 once the warm-up (history, matrices, next prediction) is done,
+    503 while it is still running (or if it failed; requests are still served lazily).
+    """
+    body = {
+        "status": "ready" if _READINESS["ready"] else ("warm_up_failed" if _READINESS["error"] else "warming_up"),
+        "started_at": _READINESS["started_at"].isoformat() if _READINESS["started_at"] else None,
+        "finished_at": _READINESS["finished_at"].isoformat() if _READINESS["finished_at"] else None,
+        "error": _READINESS["error"]
+    }
+    if not _READINESS["ready"]:
+        return JSONResponse(status_code=503, content=body)
+    return body
+
 @app.get("/matrix")
-def get_matrix_data():
+def get_matrix_data(request: Request, variant: str = "full", lag_weights: Optional[str] = None):
     """
     Returns the visualization data for Matrix A (Time) and Matrix B (Space).
     Includes the Algorithmic Probability prediction.
+    `variant`: "full" (default), "decay:<half_life_draws>" or "window:<draws>".
+    `lag_weights`: comma-separated weights of the lag-1..K transition layers (full variant),
+    e.g. "1,0.5,0.25". Default: Matrix A only.
+    Encoded (and compressed) once per data version.
     """
-    from matrix_engine import get_matrix_visual_data
+    from matrix_engine import get_matrix_visual_data, parse_variant, parse_lag_weights
+    from history import DrawHistory
+    from fast_json import cached_response
     try:
-        return get_matrix_visual_data()
+        parse_variant(variant)
+        weights = parse_lag_weights(lag_weights)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    try:
+        # Key from the version alone: the history is only built on a cache miss
+        return cached_response(request, ("matrix", DrawHistory.current_version(), variant, weights), lambda:
+                               get_matrix_visual_data(history=DrawHistory.load(), variant=variant, lag_weights=weights))
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.get("/predict", response_model=PredictionResponse)
 def get_prediction():
     """
-    Returns the latest prediction. 
-    Now persists the prediction for the NEXT draw to ensure stability.
+    Returns the prediction of the next draw.
+    It is computed and persisted at ingest (see next_prediction), so this is a read
+    (memory, then Firestore); it is computed here only for gaps, and persisted to
+    ensure stability.
     """
     try:
-        # 1. Determine exactly when the next draw is
-        paris_tz = pytz.timezone('Europe/Paris')
-        now = datetime.datetime.now(paris_tz)
-        
-        current_hour = now.hour
-        # if 13:00 to 18:59 -> next is current_hour + 1
-        # if >= 19:00 -> next is tomorrow 13:00
-        # if < 13:00 -> next is today 13:00
-        
-        next_draw_date = now.date()
-        next_draw_hour = 13
-        
-        if current_hour < 13:
-            next_draw_hour = 13
-        elif current_hour >= 19:
-            next_draw_date = now.date() + datetime.timedelta(days=1)
-            next_draw_hour = 13
-        else:
-            next_draw_hour = current_hour + 1
-            
-        next_draw_time = datetime.time(next_draw_hour, 0)
-        
-        # Stringify for Firestore query (matching scraper logic)
-        s_date = next_draw_date.isoformat()
-        s_time = next_draw_time.strftime("%H:%M:%S")
-
-        # 2. Check DB for this specific future draw
-        existing_draw = get_draw_by_date_time(s_date, s_time)
-        
-        if existing_draw and existing_draw.prediction_json:
-            # We already have a stable prediction for this slot
-            pred = existing_draw.prediction_json
-
-            # CHECK FOR VALID PREDICTION DATA (not empty)
-            stat_nums = pred.get("statistical", {}).get("numbers", [])
-            algo_nums = pred.get("algorithmic", {}).get("numbers", [])
-            has_valid_data = len(stat_nums) > 0 or len(algo_nums) > 0
-            
-            if "algorithmic" in pred and has_valid_data:
-                next_draw_str = f"{next_draw_hour}h00"
-                if next_draw_date > now.date():
-                    next_draw_str = f"demain {next_draw_str}"
-                    
-                pred['next_draw_time'] = next_draw_str
-                return pred
-            # If "algorithmic" is missing OR data is empty, we fall through to regenerate
-            print("Detected stale/empty prediction. Regenerating...")
-
-        # 3. If not found or stale, GENERATE and SAVE
-        from engine import calculate_prediction as calc_stat
-        from matrix_engine import calculate_matrix_prediction as calc_algo
-        
-        stat_pred = calc_stat()
-        algo_pred = calc_algo()
-        
-        # Structure the new unified prediction object
-        prediction = {
-            "statistical": stat_pred,
-            "algorithmic": algo_pred
-        }
-        
-        # Format "next_draw_time" string for valid return
-        next_draw_str = f"{next_draw_hour}h00"
-        if next_draw_date > now.date():
-            next_draw_str = f"demain {next_draw_str}"
+        import next_prediction
+        next_draw_id, next_draw_str = next_prediction.next_slot()
+        # Copy: the cached prediction is shared between requests
+        prediction = dict(next_prediction.get(next_draw_id))
         prediction['next_draw_time'] = next_draw_str
-        
-        if existing_draw:
-            # Update existing stale draw
-            # existing_draw.id is the firestore doc ID
-            update_data = {"prediction_json": prediction}
-            update_draw(existing_draw.id, update_data)
-        else:
-            # Create 'Pending' Draw
-            # ID format: YYYYMMDDHH
-            id_str = f"{next_draw_date.strftime('%Y%m%d')}{next_draw_hour:02d}"
-            
-            new_draw_data = {
-                "draw_id": int(id_str),
-                "date": s_date, # Storing as String
-                "time": s_time, # Storing as String
-                "balls_list": [],
-                "bonus_letter": "?",
-                "prediction_json": prediction,
-                "source": 'ai_pending'
-            }
-            add_draw(new_draw_data)
-        
         return prediction
 
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.get("/stats")
-def get_stats():
+def get_stats(request: Request):
     """
-    Returns comprehensive statistics for the dashboard.
+    Returns comprehensive statistics for the dashboard (encoded once per data version).
     """
     try:
         from engine import get_comprehensive_stats
-        stats = get_comprehensive_stats()
-        return stats
+        from history import DrawHistory
+        from fast_json import cached_response
+        return cached_response(request, ("stats", DrawHistory.current_version()),
+                               lambda: get_comprehensive_stats(history=DrawHistory.load()))
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.get("/slots/{hour}/stats")
+def get_slot_stats(hour: int):
+    """Comprehensive statistics of one hour slot (13-19): frequencies and gaps over that slot's draws."""
+    from engine import get_comprehensive_stats
+    from history import DrawHistory
+    try:
+        view = DrawHistory.load().slot(hour)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {"slot": hour, "draws": len(view), **get_comprehensive_stats(history=view)}
+
+@app.get("/slots/{hour}/predict")
+def get_slot_prediction(hour: int):
+    """
+    Both engines run on the same-slot history only (e.g. the previous 19h draws).
+    Not persisted: /predict remains the served prediction.
+    """
+    from engine import calculate_prediction as calc_stat
+    from matrix_engine import calculate_matrix_prediction as calc_algo, get_slot_snapshot
+    from history import DrawHistory
+    history = DrawHistory.load()
+    try:
+        view = history.slot(hour)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {
+        "slot": hour,
+        "draws": len(view),
+        "statistical": calc_stat(history=view),
+        "algorithmic": calc_algo(snapshot=get_slot_snapshot(history, hour))
+    }
+
+def _window_args(history, window: Optional[int], start: Optional[int], end: Optional[int]):
+    """(start, end) draw positions from `window` (last N draws) or explicit bounds."""
+    if window is not None:
+        if window < 0:
+            raise HTTPException(status_code=400, detail="window must be >= 0")
+        return max(len(history) - window, 0), len(history)
+    return history.window_bounds(start, end)
+
+@app.get("/stats/counts")
+def get_window_counts(window: Optional[int] = None, start: Optional[int] = None, end: Optional[int] = None):
+    """
+    Ball and letter counts over any window of the history: the last `window` draws, or
+    draws [start, end) by position (Python slice semantics, negative indexes allowed).
+    Served from the cumulative count tables (two lookups per window).
+    """
+    from history import DrawHistory, LETTERS
+    history = DrawHistory.load()
+    start, end = _window_args(history, window, start, end)
+    numbers = history.window_counts(start, end)
+    letters = history.letter_window_counts(start, end)
+    return {
+        "start": start,
+        "end": end,
+        "draws": end - start,
+        "from_draw_id": history.draw_ids[start] if end > start else None,
+        "to_draw_id": history.draw_ids[end - 1] if end > start else None,
+        "numbers": [{"number": n + 1, "count": int(c)} for n, c in enumerate(numbers)],
+        "letters": [{"letter": l, "count": int(c)} for l, c in zip(LETTERS, letters)]
+    }
+
+@app.get("/combinations/count")
+def get_combination_count(numbers: str, window: Optional[int] = None, start: Optional[int] = None, end: Optional[int] = None):
+    """
+    How many draws of the window contain all of `numbers` (comma-separated, e.g. "3,7,19"),
+    with the count expected by chance and the latest such draw.
+    """
+    import math
+    from history import DrawHistory
+    from combination_index import CombinationIndex
+    try:
+        balls = sorted({int(n) for n in numbers.split(",") if n.strip()})
+        if not 1 <= len(balls) <= 10:
+            raise ValueError("Give 1 to 10 numbers")
+        history = DrawHistory.load()
+        start, end = _window_args(history, window, start, end)
+        positions = CombinationIndex(history).positions(balls, start, end)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    k = len(balls)
+    expected = (end - start) * math.comb(25 - k, 10 - k) / math.comb(25, 10)
+    return {
+        "numbers": balls,
+        "start": start,
+        "end": end,
+        "draws": end - start,
+        "count": len(positions),
+        "expected_count": expected,
+        "last_draw_id": history.draw_ids[positions[-1]] if len(positions) else None
+    }
+
+@app.get("/combinations/frequent")
+def get_frequent_combinations(max_k: int = 3, min_k: int = 1, window: Optional[int] = None, start: Optional[int] = None,
+                              end: Optional[int] = None, min_support: Optional[int] = None, top: int = 20):
+    """Most frequent k-subsets (k = min_k..max_k, at most 5) of the window, `top` per size."""
+    from history import DrawHistory
+    from combination_index import CombinationIndex
+    history = DrawHistory.load()
+    try:
+        start, end = _window_args(history, window, start, end)
+        return CombinationIndex(history).frequent(max_k, start, end, min_support=min_support, top=top, min_k=min_k)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@app.get("/draws/query")
+def query_draws(numbers: Optional[str] = None, letters: Optional[str] = None, hours: Optional[str] = None,
+                start_date: Optional[str] = None, end_date: Optional[str] = None,
+                offset: int = 0, limit: int = 50, order: str = "desc"):
+    """
+    Draws matching every given predicate, paginated (newest first by default):
+    all of `numbers` (e.g. 7,12), any of `letters` (e.g. D), any of `hours` (e.g. 19),
+    dated start_date..end_date (YYYY-MM-DD, inclusive). Served from in-memory posting bitmaps.
+    """
+    from draw_index import get_index, parse_date, MAX_LIMIT
+    if not 1 <= limit <= MAX_LIMIT or offset < 0:
+        raise HTTPException(status_code=400, detail=f"limit must be in 1..{MAX_LIMIT} and offset >= 0")
+    try:
+        balls = sorted({int(n) for n in numbers.split(",") if n.strip()}) if numbers else []
+        letter_list = [l.strip().upper() for l in letters.split(",") if l.strip()] if letters else []
+        hour_list = [int(h.strip().rstrip("h")) for h in hours.split(",") if h.strip()] if hours else []
+        return get_index().query(balls, letter_list, hour_list, parse_date(start_date), parse_date(end_date),
+                                 offset=offset, limit=limit, newest_first=order != "asc")
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@app.get("/ingest/last")
+def get_last_ingest():
+    """Report of the latest ingest pass of this process: per-stage status, attempts and timing."""
+    from ingest import last_run
+    return last_run() or {"status": "No ingest yet"}
+
+@app.get("/tickets/optimize")
+def optimize_tickets(source: str = "algorithmic", pair_weight: float = 0.2, top: int = 10, budget_ms: int = 5000):
+    """
+    Best 10-number tickets for the next draw: per-number scores of `source`
+    (algorithmic|statistical) + pair_weight x Matrix B affinity, exhaustive over C(25,10).
+    Cached per draw.
+    """
+    from ticket_optimizer import best_tickets
+    if not 1 <= top <= 100:
+        raise HTTPException(status_code=400, detail="top must be in 1..100")
+    try:
+        return best_tickets(source=source, pair_weight=pair_weight, top=top, budget_ms=budget_ms)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
 @app.get("/history", response_model=List[DrawResponse])
-def get_history(limit: int = 50):
+def get_history(request: Request, limit: int = 50):
     """
     Returns the latest historical draws with gains.
+    Only the returned page is read, and its predictions are joined in one batch lookup.
+    The records are trusted (projected straight from Firestore), so the page is encoded
+    directly instead of being re-validated through DrawResponse, and reused until a new
+    draw arrives.
     """
-    # firestore_service returns ALL sorted ASC (oldest first).
-    all_draws = get_all_draws_sorted()
-    # Filter pending in python
-    valid_draws = [d for d in all_draws if d.source != 'ai_pending']
-    # Reverse to get newest first and slice
-    latest = valid_draws[::-1][:limit]
+    from fast_json import cached_response
+    # Newest first, pending draws skipped, projected (no predictions on draw documents)
+    latest = get_recent_draw_records(limit)
+    key = ("history", limit, latest[0].draw_id if latest else None, len(latest))
+    return cached_response(request, key, lambda: _history_page(latest),
+                           # A page with missing predictions may be backfilled later: not cached
+                           keep=lambda page: all(d["prediction"] for d in page))
+
+def _history_page(latest):
+    predictions = get_predictions_for_draws([d.draw_id for d in latest])
     
     response_data = []
     for d in latest:
-        # d is Pydantic Model Draw
-        pred = d.prediction_json or {}
+        # d is a DrawRecord
+        pred = predictions.get(d.draw_id) or {}
         pred_numbers = pred.get("numbers", [])
+        pred_letter = pred.get("letter", "")
         # Also check new unified format
         if not pred_numbers and pred.get("statistical"):
             pred_numbers = pred.get("statistical", {}).get("numbers", [])
-        pred_letter = pred.get("letter", "")
+            pred_letter = pred.get("statistical", {}).get("letter", "")
         
-        d_dict = d.dict() # Pydantic v1, match earlier usage or just .dict()
+        d_dict = d._asdict()
+        d_dict['id'] = str(d.draw_id) # Draw documents are keyed by draw_id
+        # Same wire format as DrawResponse (date / time only)
+        if isinstance(d_dict['date'], datetime.datetime):
+            d_dict['date'] = d_dict['date'].date()
         
         # Calculate calculated fields
         gain = calculate_gain(d.balls_list, d.bonus_letter, pred_numbers, pred_letter)
@@ -284,8 +422,8 @@ def get_history(limit: int = 50):
         
         d_dict['gain'] = gain
         d_dict['matches_count'] = matches_count
-        # Add 'prediction' field for frontend compatibility (maps from prediction_json)
-        d_dict['prediction'] = d.prediction_json
+        # Add 'prediction' field for frontend compatibility (joined from the predictions collection)
+        d_dict['prediction'] = predictions.get(d.draw_id)
         response_data.append(d_dict)
         
     return response_data
@@ -294,55 +432,43 @@ class RefreshResponse(BaseModel):
     status: str
     message: str
     updated: bool
+    scraped_at: Optional[datetime.datetime] = None
+    scrape_age_seconds: Optional[float] = None
+    coalesced: bool = False
 
 @app.post("/refresh", response_model=RefreshResponse)
 def refresh_data():
     """
-    Manually triggers a scraper run.
+    Manually triggers a scraper run, coalesced with the others (see scheduler.scrape):
+    a refresh joins the scrape in flight or reuses one finished within the cooldown,
+    so clicks never multiply the load on the results page. On a follower process the
+    leader scrapes every minute: the refresh only picks up its latest data.
     """
-    from scraper import fetch_and_store_latest
+    import scheduler
+    import next_prediction
     
     try:
-        updated = fetch_and_store_latest()
-        
-        # Calculate message
-        # Drawings are hourly from 13h to 19h (approx)
-        paris_tz = pytz.timezone('Europe/Paris')
-        now = datetime.datetime.now(paris_tz)
-        
-        # Logic to determine "next draw" time for the message
-        # If updated=True, we have a new prediction for the NEXT draw.
-        # If updated=False, we already have the latest.
-        
-        # Simple heuristic for "next draw":
-        # If now is < 13:00, next is 13:00
-        # If now is >= 19:00, next is tomorrow 13:00? (Or just say "Demain")
-        # Else next is next hour.
-        
-        # Note: server time might be different from user time (UTC vs Paris), 
-        # but user prompt says "13h à 19h". Let's assume server is roughly local or we just use relative logic.
+        if scheduler.is_follower():
+            updated = scheduler.pick_up_new_data()
+            scrape = None
+        else:
+            scrape = scheduler.scrape()
+            updated = scrape["updated"]
         
         msg = ""
         if updated:
              msg = "Nouvelle prédiction générée avec succès !"
         else:
-            # Determine next draw hour
-            current_hour = now.hour
-            next_hour = current_hour + 1
-            
-            if current_hour < 13:
-                next_draw_time_str = "13h00"
-            elif current_hour >= 19:
-                 next_draw_time_str = "demain 13h00"
-            else:
-                 next_draw_time_str = f"{next_hour}h00"
-            
+            _, next_draw_time_str = next_prediction.next_slot()
             msg = f"Il s'agit de la bonne prédiction pour le prochain tirage de {next_draw_time_str}."
 
         return {
             "status": "updated" if updated else "current",
             "message": msg,
-            "updated": updated
+            "updated": updated,
+            "scraped_at": datetime.datetime.fromtimestamp(scrape["finished_at"]) if scrape else None,
+            "scrape_age_seconds": round(scrape["age"], 1) if scrape else None,
+            "coalesced": scrape["coalesced"] if scrape else False
         }
 
     except Exception as e:
@@ -353,38 +479,143 @@ def refresh_data():
 class AgentAnalysisResponse(BaseModel):
     current_params: dict
     accuracy_last_50: float
+    letter_accuracy_last_50: Optional[float] = None
+    significance: Optional[dict] = None
     message: str
 
-class EvolutionResponse(BaseModel):
-    found_better: bool
-    current_accuracy: Optional[float] = None
-    best_accuracy: Optional[float] = None
-    improvement: Optional[str] = None
-    proposed_params: Optional[dict] = None
-    message: str
+class JobResponse(BaseModel):
+    job_id: str
+    kind: str
+    status: str # queued / running / done / failed / cancelled
+    progress: dict
+    partial: Optional[dict] = None # Best-so-far while running
+    result: Optional[dict] = None
+    error: Optional[str] = None
+    created_at: float
+    started_at: Optional[float] = None
+    finished_at: Optional[float] = None
+    data_version: Optional[list] = None
 
 class ConfigRequest(BaseModel):
     freq_weight: float
     gap_weight: float
     decay_rate: float
+    freq_window: Optional[int] = None
+    letter_window: Optional[int] = None
+    top_k: Optional[int] = None
 
 @app.get("/expert/analysis", response_model=AgentAnalysisResponse)
-def get_expert_analysis():
+def get_expert_analysis(hour: Optional[int] = None):
     """
-    Get the Expert Agent's analysis of the current configuration.
+    Get the Expert Agent's analysis of the current configuration
+    (on the draws of one hour slot, 13-19, if `hour` is given).
     """
     from expert_agent import ExpertMathAgent
     agent = ExpertMathAgent()
-    return agent.analyze_current_performance()
+    try:
+        return agent.analyze_current_performance(hour=hour)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@app.get("/expert/matrix-analysis")
+def get_expert_matrix_analysis(window: Optional[int] = None, since_draw_id: Optional[int] = None,
+                               hour: Optional[int] = None):
+    """
+    Walk-forward backtest of the algorithmic (matrix) model: hit rates, match
+    distribution and gain over the last `window` draws and/or from `since_draw_id` on.
+    With `hour` (13-19), the per-slot model is backtested on that slot's draws.
+    """
+    if window is not None and window <= 0:
+        raise HTTPException(status_code=400, detail="window must be positive")
+    from expert_agent import ExpertMathAgent
+    from history import DrawHistory
+    agent = ExpertMathAgent()
+    try:
+        return agent.analyze_matrix_performance(history=DrawHistory.load(), window=window,
+                                                since_draw_id=since_draw_id, hour=hour)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@app.get("/expert/baseline")
+def get_expert_baseline(tickets: int = 1000000, ticket_size: int = 10):
+    """
+    Monte Carlo baseline: match and gain distributions of `tickets` random tickets
+    (`ticket_size` numbers + a random letter) against random draws.
+    """
+    if not 1 <= tickets <= 5000000 or not 1 <= ticket_size <= 10:
+        raise HTTPException(status_code=400, detail="tickets must be in 1..5000000 and ticket_size in 1..10")
+    from simulation import simulate_random_tickets
+    return simulate_random_tickets(tickets, ticket_size)
 
-@app.post("/expert/optimize", response_model=EvolutionResponse)
-def run_optimization():
+@app.post("/expert/optimize", response_model=JobResponse, status_code=202)
+def run_optimization(strategy: str = "adaptive"):
     """
     Ask the Expert Agent to study successive draws and propose an evolution of the formula.
+    `strategy`: "adaptive" (successive halving over continuous ranges and windows, default)
+    or "grid" (the historical 36-point grid).
+    Runs as a background job: poll GET /jobs/{job_id} (or stream /jobs/{job_id}/events).
+    The same search on the same data returns the existing job and its cached result.
     """
+    if strategy not in ("adaptive", "grid"):
+        raise HTTPException(status_code=400, detail="strategy must be 'adaptive' or 'grid'")
     from expert_agent import ExpertMathAgent
+    from history import DrawHistory
+    from jobs import get_runner, QueueFull
     agent = ExpertMathAgent()
-    return agent.evolve_formula()
+    history = DrawHistory.load()
+    space = agent.ADAPTIVE_SPACE if strategy == "adaptive" else agent.SEARCH_SPACE
+    key = {"strategy": strategy, "space": space, "config": agent.get_current_config()}
+    
+    def optimize(job):
+        if strategy == "adaptive":
+            return agent.evolve_formula_adaptive(history=history, progress=job.report)
+        return agent.evolve_formula(history=history, progress=job.report)
+    
+    try:
+        job = get_runner().submit("optimize", optimize, key=key, data_version=history.data_version)
+    except QueueFull as e:
+        raise HTTPException(status_code=429, detail=str(e))
+    return job.to_dict()
+
+@app.get("/jobs/{job_id}", response_model=JobResponse)
+def get_job(job_id: str):
+    """
+    Status, progress, partial best-so-far and result of a background job
+    (from any worker: job state is shared through Firestore, see jobs.py).
+    """
+    from jobs import get_runner
+    job = get_runner().status(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Unknown job")
+    return job
+
+@app.get("/jobs/{job_id}/events")
+def stream_job(job_id: str):
+    """Server-sent events: one `data:` message (the job as JSON) per change, until it finishes."""
+    import json
+    from fastapi.responses import StreamingResponse
+    from jobs import get_runner
+    changes = get_runner().watch(job_id)
+    if changes is None:
+        raise HTTPException(status_code=404, detail="Unknown job")
+    
+    def events():
+        for job in changes:
+            if job is None:
+                yield ": keep-alive\n\n"
+            else:
+                yield f"data: {json.dumps(job)}\n\n"
+    
+    return StreamingResponse(events(), media_type="text/event-stream", headers={"Cache-Control": "no-cache"})
+
+@app.delete("/jobs/{job_id}", response_model=JobResponse)
+def cancel_job(job_id: str):
+    """Cancels a queued or running job (takes effect at its next progress step)."""
+    from jobs import get_runner
+    job = get_runner().cancel(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Unknown job")
+    return job
 
 @app.post("/expert/apply")
 def apply_config(config: ConfigRequest):
@@ -393,8 +624,9 @@ def apply_config(config: ConfigRequest):
     """
     from expert_agent import ExpertMathAgent
     agent = ExpertMathAgent()
-    result = agent.apply_new_parameters(config.dict())
+    result = agent.apply_new_parameters(config.dict(exclude_none=True))
     return result
 
 if __name__ == "__main__":
+    import uvicorn
     uvicorn.run("main:app", host="0.0.0.0", port=8000, reload=True)
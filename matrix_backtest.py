@@ -0,0 +1,146 @@
+import threading
+import numpy as np
+from typing import Dict, Any, Optional
+
+import matrix_engine
+
+# Walk-forward backtest of the algorithmic (matrix) model.
+#
+# Draw i is scored with the model built from draws[:i] only (what was known before it was
+# drawn), conditioned on draw i-1 - exactly what /predict served at the time.
+# The transition and co-occurrence counts grow one draw at a time (cumulative sums, see
+# matrix_engine.prefix_model_stacks) and CHUNK prefix models are scored per batch, so the
+# whole history is one O(N) pass instead of one build_matrices per prefix.
+# Per-draw match counts are kept per process and extended with only the new draws.
+
+CHUNK = 500
+TOP_K = 10
+
+# Payout by number of matches for a 10-number ticket (same table as main.calculate_gain).
+GAIN_BY_MATCHES = np.array([0, 0, 0, 0, 0, 0, 1.0, 7.0, 50.0, 500.0, 100000.0])
+# Expected matches of a random 10-number ticket: 10 * 10 / 25
+RANDOM_EXPECTED_MATCHES = 4.0
+
+
+class WalkForwardState:
+    """Per-draw results of the walk-forward over one history (extended in place on append)."""
+
+    def __init__(self):
+        self.n = 0
+        self.last_draw_id = None
+        self.matches = np.zeros(0, dtype=np.int8)      # top-10 matches, -1 = not scored (draw 0)
+        self.matches_top5 = np.zeros(0, dtype=np.int8)
+        self.letter_hits = np.zeros(0, dtype=np.int8)   # 1 if the predicted letter was drawn
+
+    def extend(self, history):
+        x = history.incidence
+        n = len(history)
+        matches = [self.matches]
+        matches_top5 = [self.matches_top5]
+        for start in range(self.n, n, CHUNK):
+            stop = min(start + CHUNK, n)
+            mat_a, mat_b, rows = matrix_engine.prefix_model_stacks(x, start, stop)
+            ranking = matrix_engine.score_batch(mat_a, mat_b, rows)["ranking"]
+            actual = x[start:stop]
+            hits = np.take_along_axis(actual, ranking[:, :TOP_K], axis=1)
+            m10 = hits.sum(axis=1).astype(np.int8)
+            m5 = hits[:, :5].sum(axis=1).astype(np.int8)
+            if start == 0:
+                m10[0] = m5[0] = -1 # Nothing to condition on
+            matches.append(m10)
+            matches_top5.append(m5)
+        import letter_model  # Lazy import
+        indices = np.arange(self.n, n)
+        predicted = letter_model.markov_letter_batch(history.letter_incidence, history.letter_counts, indices)
+        letter_hits = letter_model.letter_hits(history.letter_incidence, predicted, indices).astype(np.int8)
+        self.matches = np.concatenate(matches)
+        self.matches_top5 = np.concatenate(matches_top5)
+        self.letter_hits = np.concatenate([self.letter_hits, letter_hits])
+        self.n = n
+        self.last_draw_id = history.draw_ids[-1] if n else None
+
+
+_STATES: Dict[Optional[int], WalkForwardState] = {}  # Hour slot (None = all draws) -> state
+_STATE_LOCK = threading.Lock()
+
+def walk_forward(history=None, hour: int = None) -> WalkForwardState:
+    """
+    Walk-forward results for `history` (or its `hour` slot, see DrawHistory.slot), caught
+    up with only the draws added since the last call.
+    """
+    history = matrix_engine._load_history(history)
+    if hour is not None:
+        history = history.slot(hour)
+    n = len(history)
+    with _STATE_LOCK:
+        state = _STATES.get(hour)
+        extends = state is not None and state.n <= n and (
+            state.n == 0 or history.draw_ids[state.n - 1] == state.last_draw_id)
+        if not extends:
+            state = WalkForwardState()
+        if state.n < n:
+            state.extend(history)
+        _STATES[hour] = state
+        return state
+
+def summarize(history, state: WalkForwardState, window: int = None, since_draw_id: int = None) -> Dict[str, Any]:
+    """
+    Hit rates, match distribution and gain over the scored draws of a window:
+    the last `window` draws and/or the draws from `since_draw_id` on (default: all).
+    """
+    n = state.n
+    start = 1
+    if since_draw_id is not None:
+        import bisect
+        start = max(start, bisect.bisect_left(history.draw_ids, since_draw_id))
+    if window is not None:
+        start = max(start, n - window)
+    matches = state.matches[start:n].astype(np.int64)
+    matches_top5 = state.matches_top5[start:n].astype(np.int64)
+    evaluated = len(matches)
+    if evaluated == 0:
+        return {"status": "No data", "evaluated_draws": 0}
+
+    from simulation import significance  # Lazy import
+    letter_hits = state.letter_hits[start:n].astype(bool)
+    gains = ticket_gains(matches, letter_hits)
+    distribution = np.bincount(matches, minlength=TOP_K + 1)
+    mean_matches = float(matches.mean())
+    return {
+        "evaluated_draws": evaluated,
+        "from_draw_id": history.draw_ids[start],
+        "to_draw_id": history.draw_ids[n - 1],
+        "hit_rate_top10": mean_matches / TOP_K,
+        "hit_rate_top5": float(matches_top5.mean()) / 5,
+        "mean_matches": mean_matches,
+        "random_expected_matches": RANDOM_EXPECTED_MATCHES,
+        "lift_vs_random": mean_matches / RANDOM_EXPECTED_MATCHES,
+        "match_distribution": {str(k): int(c) for k, c in enumerate(distribution)},
+        "letter_hit_rate": float(letter_hits.mean()),
+        "total_gain": float(gains.sum()),
+        "mean_gain": float(gains.mean()),
+        "winning_draws": int((gains > 0).sum()),
+        # Top-10 matches vs random 10-number tickets (bootstrap CI + Monte Carlo p-value)
+        "significance": significance(matches, ticket_size=TOP_K),
+        "message": f"Matrix model: {mean_matches:.2f} matches / 10 on {evaluated} draws "
+                   f"(random: {RANDOM_EXPECTED_MATCHES:.1f})."
+    }
+
+def ticket_gains(matches: np.ndarray, letter_hits: np.ndarray) -> np.ndarray:
+    """Vectorized main.calculate_gain: letter refund up to 5 matches, doubled gain for 6-9."""
+    gains = GAIN_BY_MATCHES[matches]
+    gains = np.where(letter_hits & (matches <= 5), 1.0, gains)
+    return np.where(letter_hits & (matches >= 6) & (matches < 10), gains * 2, gains)
+
+def backtest_matrix_model(history=None, window: int = None, since_draw_id: int = None,
+                          hour: int = None) -> Dict[str, Any]:
+    """
+    Walk-forward backtest of the matrix model, summarized over a window (see summarize).
+    With `hour`, the per-slot model is evaluated on that slot's draws (window in slot draws).
+    """
+    history = matrix_engine._load_history(history)
+    state = walk_forward(history, hour)
+    result = summarize(history if hour is None else history.slot(hour), state,
+                       window=window, since_draw_id=since_draw_id)
+    result["slot"] = hour
+    return result
@@ -1,32 +1,74 @@
+import collections
+import itertools
+import os
+import threading
 import numpy as np
+from typing import NamedTuple, Sequence
 # from sqlalchemy.orm import Session -- REMOVED
 # from models import Draw, SessionLocal -- REMOVED
 # Lazy imports - moved inside functions to avoid initialization issues
 # from firestore_service import get_all_draws_sorted as fs_get_all_draws_sorted, get_draw_count as fs_get_draw_count
 
-# Global cache for matrices to avoid rebuilding constantly if not needed
-# In a production app with multiple workers, this might need a better store (Redis),
-# but for this standalone app, memory is fine.
-_MATRIX_A = None
-_MATRIX_B = None
-_LAST_DRAW_COUNT = 0
+# Global cache: ONE immutable ModelSnapshot, replaced by a single reference assignment.
+# Readers take `_SNAPSHOT` once and use only that object, so they never see Matrix A
+# from one rebuild and Matrix B from another. Rebuilds are serialized by `_BUILD_LOCK`
+# (single-flight): concurrent requests for the same new data wait for / reuse one build,
+# and readers that already have a snapshot keep serving it while a rebuild runs.
+# Offline jobs (backfills, backtests) use build_snapshot() and never publish.
+# Published snapshots are also shared with the other workers of the host (shared_cache):
+# a worker that needs a data version another worker already built attaches it instead
+# of rebuilding.
+_SNAPSHOT = None
+_BUILD_LOCK = threading.Lock()
+_PUBLISH_COUNTER = itertools.count(1)
+
+# Higher-order transitions: layer k-1 of the lag tensor counts (u in draw T-k+1 -> v in draw T+1),
+# i.e. layer 0 is Matrix A. K = 24 covers a bit more than three days of hourly draws.
+MAX_LAG = int(os.environ.get("CRESCENDO_MAX_LAG", "24"))
+# Per-lag weights used when scoring (index 0 = lag 1). (1.0,) == classic Matrix A model.
+DEFAULT_LAG_WEIGHTS = (1.0,)
+
+
+class ModelSnapshot(NamedTuple):
+    """Immutable bundle of everything the matrix model serves for one data version."""
+    version: int              # Publish sequence number (0 = private, never published)
+    data_version: tuple       # DrawHistory.data_version the matrices were built from
+    draw_count: int
+    matrix_a: np.ndarray      # 25x25, read-only, rows normalized
+    matrix_b: np.ndarray      # 25x25, read-only, co-occurrence counts
+    latest_balls: tuple       # Balls of the latest draw (conditioning draw for T+1)
+    lag_counts: np.ndarray    # MAX_LAG x 25 x 25 raw transition counts (layer 0 = Matrix A counts)
+    recent_rows: np.ndarray   # Last MAX_LAG incidence rows, oldest first (conditioning draws)
+    letter_transitions: np.ndarray  # 5x5 letter transition counts (letter T -> letter T+1), A-E
+    letter_counts: np.ndarray       # All-time count of each letter A-E
+    latest_letter: str              # Letter of the latest draw
 
 def get_db_draw_count():
     # Use firestore count (or len of all draws if count API too expensive/complex)
     from firestore_service import get_draw_count as fs_get_draw_count  # Lazy import
     return fs_get_draw_count()
 
+def _load_history(history=None):
+    """
+    Returns the DrawHistory to work on: the caller's one if given, otherwise a fresh load.
+    Pending draws are already excluded by DrawHistory.
+    """
+    if history is not None:
+        return history
+    from history import DrawHistory  # Lazy import
+    return DrawHistory.load()
+
 def get_all_draws_sorted():
     """
     Helper to fetch all draws sorted by date/time ascending (oldest to newest).
-    Excludes pending draws.
+    Excludes pending draws. Uses the projected read path (DrawRecord, no prediction_json).
     """
-    from firestore_service import get_all_draws_sorted as fs_get_all_draws_sorted  # Lazy import
-    draws = fs_get_all_draws_sorted()
+    from firestore_service import get_draw_records  # Lazy import
+    draws = get_draw_records()
     # Filter in python for source != 'ai_pending'
     return [d for d in draws if d.source != 'ai_pending']
 
-def build_matrices(draws=None):
+def build_snapshot(draws=None, base: ModelSnapshot = None) -> ModelSnapshot:
     """
     Constructs Matrix A (Markov/Time) and Matrix B (Co-occurrence/Space).
     
@@ -37,92 +79,377 @@ def build_matrices(draws=None):
     Matrix B (25x25):
         Row x -> Col y means: Count/Strength of x and y appearing TOGETHER in the SAME draw.
         Symmetric.
+
+    Also accumulates the lag tensor (MAX_LAG x 25 x 25 transition counts, see lag_matrices)
+    and the 5x5 letter transitions of the letter model (see letter_model).
+
+    `draws` may be a DrawHistory or a list of Draw objects (oldest first).
+    `base`: a snapshot built from a prefix of `draws`; only the new draws are then added
+    to its counts (incremental update on ingest) instead of recounting the whole history.
+    Pure function: returns a private snapshot, the live cache is NOT touched.
     """
-    global _MATRIX_A, _MATRIX_B, _LAST_DRAW_COUNT
-    
     if draws is None:
-        draws = get_all_draws_sorted()
-        
-    # Update the cache version
-    _LAST_DRAW_COUNT = len(draws)
+        draws = _load_history()
+    if isinstance(draws, list):
+        from history import DrawHistory  # Lazy import
+        draws = DrawHistory(draws)
+    history = draws
     
-    # Initialize entries 1-25. 
-    # Array index 0-24 will map to Ball 1-25.
-    # So index = number - 1.
+    # Array index 0-24 maps to Ball 1-25 (index = number - 1).
+    # Everything is computed from the incidence array (row t = draw t, 0/1 per ball):
+    #   Matrix B = sum over draws of outer(x_t, x_t), diagonal removed (pairs only)
+    #   Lag k    = sum over t of outer(x_t, x_t+k); lag 1 is Matrix A (every u in T -> every v in T+1)
+    x = history.incidence.astype(float)
+    letters = history.letter_incidence.astype(float)
+    n = len(x)
+    if base is not None and _extends(base, history):
+        start = base.draw_count
+        lag_counts = base.lag_counts.copy()
+        counts_b = base.matrix_b.copy()
+        letter_transitions = base.letter_transitions.copy()
+    else:
+        start = 0
+        lag_counts = np.zeros((MAX_LAG, 25, 25))
+        counts_b = np.zeros((25, 25))
+        letter_transitions = np.zeros((5, 5))
     
-    mat_a = np.zeros((25, 25), dtype=float)
-    mat_b = np.zeros((25, 25), dtype=float)
+    if n > start:
+        new = x[start:]
+        pairs = new.T @ new
+        np.fill_diagonal(pairs, 0)
+        counts_b += pairs
+        for k in range(1, MAX_LAG + 1):
+            # Transitions (t-k -> t) for the new draws t >= max(start, k)
+            first = max(start, k)
+            if first < n:
+                lag_counts[k - 1] += x[first - k:n - k].T @ x[first:n]
+        first = max(start, 1)
+        if first < n:
+            letter_transitions += letters[first - 1:n - 1].T @ letters[first:n]
     
-    if not draws:
-        _MATRIX_A = mat_a
-        _MATRIX_B = mat_b
-        return
-        
-    # --- Build Matrix B (Co-occurrence) ---
-    # Scania each draw individually
-    for d in draws:
-        balls = d.balls_list
-        # balls is a list of ints. e.g. [1, 5, 12, ...]
-        # We need all pairs.
-        for i in range(len(balls)):
-            for j in range(i + 1, len(balls)):
-                u, v = balls[i], balls[j]
-                if 1 <= u <= 25 and 1 <= v <= 25:
-                    # Adjust to 0-indexed
-                    mat_b[u-1][v-1] += 1
-                    mat_b[v-1][u-1] += 1
-                    
-    # --- Build Matrix A (Markov / Transition) ---
-    # Iterate pairwise: Draw T and Draw T+1
-    for t in range(len(draws) - 1):
-        draw_curr = draws[t].balls_list
-        draw_next = draws[t+1].balls_list
+    mat_a = normalize_rows(lag_counts[0])
+    mat_b = counts_b
+    recent_rows = x[-MAX_LAG:].copy() if n else np.zeros((0, 25))
+    letter_counts = letters.sum(axis=0)
+    
+    # Freeze: snapshots are shared between threads
+    for arr in (mat_a, mat_b, lag_counts, recent_rows, letter_transitions, letter_counts):
+        arr.flags.writeable = False
+    
+    return ModelSnapshot(
+        version=0,
+        data_version=history.data_version,
+        draw_count=n,
+        matrix_a=mat_a,
+        matrix_b=mat_b,
+        latest_balls=tuple(history.latest_balls()),
+        lag_counts=lag_counts,
+        recent_rows=recent_rows,
+        letter_transitions=letter_transitions,
+        letter_counts=letter_counts,
+        latest_letter=history.letters[-1] if n else ""
+    )
+
+def _extends(snapshot: ModelSnapshot, history) -> bool:
+    """True if `history` is `snapshot`'s history plus newer draws (same prefix)."""
+    n = snapshot.draw_count
+    if n > len(history) or snapshot.lag_counts.shape[0] != MAX_LAG:
+        return False
+    return n == 0 or history.draw_ids[n - 1] == snapshot.data_version[1]
+
+def lag_matrices(snapshot: ModelSnapshot, max_lag: int = None) -> np.ndarray:
+    """Row-normalized lag layers (max_lag x 25 x 25): layer k-1 = P(v in T+1 | u in T-k+1)."""
+    counts = snapshot.lag_counts[:max_lag or MAX_LAG]
+    sums = counts.sum(axis=2, keepdims=True)
+    return np.divide(counts, sums, out=np.zeros_like(counts), where=sums != 0)
+
+def lag_time_scores(snapshot: ModelSnapshot, lag_weights: Sequence[float] = DEFAULT_LAG_WEIGHTS) -> np.ndarray:
+    """
+    Time score of the 25 candidates for the draw after the snapshot's latest one:
+        sum over k of w_k * (x_{T-k+1} @ P_k)
+    One batched matrix product over the K layers (einsum), whatever K.
+    """
+    weights = np.asarray(lag_weights, dtype=float)[:MAX_LAG]
+    k = min(len(weights), len(snapshot.recent_rows))
+    if k == 0:
+        return np.zeros(25)
+    layers = lag_matrices(snapshot, k)
+    # recent_rows is oldest first: the draw at lag j (1-based) is recent_rows[-j]
+    rows = snapshot.recent_rows[::-1][:k]
+    return np.einsum("k,ku,kuv->v", weights[:k], rows, layers)
+
+def parse_lag_weights(spec: str = None):
+    """'1,0.5,0.25' -> (1.0, 0.5, 0.25). Empty -> DEFAULT_LAG_WEIGHTS."""
+    if not spec:
+        return DEFAULT_LAG_WEIGHTS
+    weights = tuple(float(w) for w in spec.split(","))
+    if len(weights) > MAX_LAG:
+        raise ValueError(f"At most {MAX_LAG} lag weights are supported")
+    if any(w < 0 for w in weights) or not any(weights):
+        raise ValueError("Lag weights must be >= 0 and not all zero")
+    return weights
+
+def normalize_rows(counts: np.ndarray) -> np.ndarray:
+    """Matrix A normalization: rows sum to 1, all-zero rows stay 0 (no NaN)."""
+    row_sums = counts.sum(axis=1, keepdims=True)
+    return np.divide(counts, row_sums, out=np.zeros_like(counts, dtype=float), where=row_sums!=0)
+
+def _full_counts(x: np.ndarray):
+    """Raw (unnormalized) Matrix A and Matrix B counts over the whole incidence array."""
+    x = x.astype(float)
+    if len(x) == 0:
+        return np.zeros((25, 25)), np.zeros((25, 25))
+    counts_b = x.T @ x
+    np.fill_diagonal(counts_b, 0)
+    counts_a = x[:-1].T @ x[1:]
+    return counts_a, counts_b
+
+def publish_snapshot(snapshot: ModelSnapshot) -> ModelSnapshot:
+    """
+    Makes `snapshot` the live one (single reference swap).
+    A snapshot built from fewer draws than the live one is ignored, so a slow
+    rebuild can never replace a newer model.
+    """
+    with _BUILD_LOCK:
+        return _publish_locked(snapshot)
+
+def _publish_locked(snapshot: ModelSnapshot) -> ModelSnapshot:
+    global _SNAPSHOT
+    current = _SNAPSHOT
+    if current is not None and snapshot.draw_count < current.draw_count:
+        return current
+    snapshot = snapshot._replace(version=next(_PUBLISH_COUNTER))
+    _SNAPSHOT = snapshot
+    return snapshot
+
+def build_matrices(draws=None) -> ModelSnapshot:
+    """
+    Rebuilds the matrices from `draws` (full history if None) and publishes them.
+    Used at startup and after ingestion. Offline jobs must use build_snapshot() instead.
+    """
+    import shared_cache  # Lazy import
+    with _BUILD_LOCK:
+        snapshot = _publish_locked(build_snapshot(draws, base=_SNAPSHOT))
+    shared_cache.publish_snapshot(snapshot)
+    print(f"Matrices Re-calculated using {snapshot.draw_count} draws (snapshot v{snapshot.version}).")
+    return snapshot
+
+def current_snapshot():
+    """The live snapshot as is (None before the first build). Never blocks, never rebuilds."""
+    return _SNAPSHOT
+
+def get_snapshot(history=None) -> ModelSnapshot:
+    """
+    Returns the live snapshot, rebuilding it if it does not match `history`.
+    
+    - Up to date snapshot: returned without any locking.
+    - `history` older than the live snapshot (loaded before an ingest published a newer
+      one): the newer live snapshot is returned as is, nothing is rebuilt. Callers that
+      need the model of exactly `history` (backtests, backfills) use build_snapshot().
+    - Stale snapshot while another thread rebuilds: the stale (but consistent) one is served.
+    - Otherwise one thread rebuilds; threads waiting on the same data reuse its result.
+    """
+    history = _load_history(history)
+    snapshot = _SNAPSHOT
+    if snapshot is not None and (snapshot.data_version == history.data_version
+                                 or snapshot.draw_count > len(history)):
+        return snapshot
+    
+    # Someone is already rebuilding: do not block if we have something to serve
+    if snapshot is not None and not _BUILD_LOCK.acquire(blocking=False):
+        return snapshot
+    if snapshot is None:
+        _BUILD_LOCK.acquire()
+    try:
+        snapshot = _SNAPSHOT
+        if snapshot is not None and (snapshot.data_version == history.data_version
+                                     or snapshot.draw_count > len(history)):
+            return snapshot  # Built by the thread we waited for (or newer than `history`)
         
-        for u in draw_curr:
-            for v in draw_next:
-                if 1 <= u <= 25 and 1 <= v <= 25:
-                    mat_a[u-1][v-1] += 1
-                    
-    # Normalize Matrix A (Rows sum to 1)
-    # If a row sums to 0 (number never appeared?), leave as 0 to avoid NaN
-    row_sums = mat_a.sum(axis=1, keepdims=True)
-    # Avoid division by zero
-    # np.divide where row_sums != 0
-    mat_a = np.divide(mat_a, row_sums, out=np.zeros_like(mat_a), where=row_sums!=0)
-    
-    _MATRIX_A = mat_a
-    _MATRIX_B = mat_b
-    print(f"Matrices Re-calculated using {_LAST_DRAW_COUNT} draws.")
-
-def get_matrix_a():
-    global _LAST_DRAW_COUNT
-    
-    # Check if we need to rebuild
-    current_count = get_db_draw_count()
-    if _MATRIX_A is None or current_count != _LAST_DRAW_COUNT:
-        print(f"Updates detected (DB={current_count}, Cache={_LAST_DRAW_COUNT}). Rebuilding...")
-        build_matrices()
+        # Another worker of this host may already have built this data version
+        import shared_cache  # Lazy import
+        shared = shared_cache.load_snapshot_arrays(history.data_version)
+        if shared is not None:
+            return _publish_locked(ModelSnapshot(version=0, **shared))
         
-    return _MATRIX_A
+        print(f"Updates detected (History={len(history)}, Cache={snapshot.draw_count if snapshot else 0}). Rebuilding...")
+        snapshot = _publish_locked(build_snapshot(history, base=snapshot))
+        shared_cache.publish_snapshot(snapshot)
+        print(f"Matrices Re-calculated using {snapshot.draw_count} draws (snapshot v{snapshot.version}).")
+        return snapshot
+    finally:
+        _BUILD_LOCK.release()
+
+# --- Per-slot models ---
+# One private snapshot per hour slot, built from history.slot(hour) (Matrix A = transitions
+# between consecutive draws of the slot, e.g. yesterday 19h -> today 19h) and extended
+# with only the slot's new draws (build_snapshot base). Not published nor shared.
+_SLOT_SNAPSHOTS = {}
+_SLOT_LOCK = threading.Lock()
+
+def get_slot_snapshot(history=None, hour: int = None) -> ModelSnapshot:
+    """Snapshot of the `hour` slot of `history`, rebuilt incrementally when the slot grows."""
+    view = _load_history(history).slot(hour)
+    with _SLOT_LOCK:
+        snapshot = _SLOT_SNAPSHOTS.get(int(hour))
+        if snapshot is None or snapshot.data_version != view.data_version:
+            snapshot = build_snapshot(view, base=snapshot)
+            _SLOT_SNAPSHOTS[int(hour)] = snapshot
+        return snapshot
 
-def get_matrix_b():
-    global _LAST_DRAW_COUNT
+# --- Time-aware variants (decay / sliding window) ---
+# Variant spec strings: "full" (the live snapshot), "decay:<half_life_draws>",
+# "window:<draws>". Each variant keeps raw counts that are updated in O(1) per new
+# draw (one 25x25 multiply-add, or add/subtract for the window), so trying a new
+# configuration costs one pass the first time and a few microseconds per draw after.
+
+DEFAULT_VARIANT = "full"
+
+def parse_variant(spec: str = None):
+    """'decay:168' -> ('decay', 168.0); 'window:500' -> ('window', 500); None/'full' -> ('full', None)."""
+    if not spec or spec == "full":
+        return ("full", None)
+    mode, _, value = spec.partition(":")
+    if mode == "decay":
+        half_life = float(value)
+        if half_life <= 0:
+            raise ValueError("decay half-life must be > 0 draws")
+        return ("decay", half_life)
+    if mode == "window":
+        window = int(value)
+        if window < 1:
+            raise ValueError("window must be >= 1 draw")
+        return ("window", window)
+    raise ValueError(f"Unknown matrix variant '{spec}' (use full, decay:<half_life>, window:<draws>)")
+
+
+class IncrementalMatrices:
+    """
+    Raw Matrix A / Matrix B counts for one variant, maintained draw by draw.
     
-    # Check if we need to rebuild
-    current_count = get_db_draw_count()
-    if _MATRIX_B is None or current_count != _LAST_DRAW_COUNT:
-        print(f"Updates detected (DB={current_count}, Cache={_LAST_DRAW_COUNT}). Rebuilding...")
-        build_matrices()
-        
-    return _MATRIX_B
+    decay:  on each draw, counts *= 0.5 ** (1 / half_life), then the new draw is added.
+            A draw k steps old weighs 0.5 ** (k / half_life).
+    window: B counts the last W draws, A the transitions into the last W draws;
+            the draw leaving the window is subtracted.
+    full:   plain accumulation (same counts as build_snapshot).
+    """
+
+    def __init__(self, mode: str = "full", param=None):
+        self.mode = mode
+        self.param = param
+        self.factor = 0.5 ** (1.0 / param) if mode == "decay" else 1.0
+        self.counts_a = np.zeros((25, 25))
+        self.counts_b = np.zeros((25, 25))
+        self.n = 0
+        self.last_draw_id = None
+        self.recent = collections.deque(maxlen=(param + 1) if mode == "window" else 1)
+
+    @classmethod
+    def from_incidence(cls, x: np.ndarray, mode: str = "full", param=None, last_draw_id=None):
+        """Batch (vectorized) initialization from an incidence array; same result as update() per row."""
+        state = cls(mode, param)
+        n = len(x)
+        xf = x.astype(float)
+        if n:
+            if mode == "decay":
+                w = state.factor ** np.arange(n - 1, -1, -1)
+                state.counts_b = (xf * w[:, None]).T @ xf
+                state.counts_a = (xf[:-1] * w[1:, None]).T @ xf[1:]
+            elif mode == "window":
+                start = max(0, n - param)
+                state.counts_b = xf[start:].T @ xf[start:]
+                start_a = max(1, start)
+                state.counts_a = xf[start_a - 1:n - 1].T @ xf[start_a:n]
+            else:
+                state.counts_a, state.counts_b = _full_counts(x)
+            np.fill_diagonal(state.counts_b, 0)
+            state.recent.extend(xf[-state.recent.maxlen:])
+        state.n = n
+        state.last_draw_id = last_draw_id
+        return state
+
+    def update(self, row: np.ndarray, draw_id=None):
+        """Adds one draw (incidence row). O(1) w.r.t. history length."""
+        row = row.astype(float)
+        pair = np.outer(row, row)
+        np.fill_diagonal(pair, 0)
+        prev = self.recent[-1] if self.recent else None
+        if self.mode == "decay":
+            self.counts_a *= self.factor
+            self.counts_b *= self.factor
+        elif self.mode == "window" and len(self.recent) == self.recent.maxlen:
+            # recent = [x_{t-W-1}, x_{t-W}, ..., x_{t-1}]: x_{t-W} leaves the window
+            leaving_prev, leaving = self.recent[0], self.recent[1]
+            out_pair = np.outer(leaving, leaving)
+            np.fill_diagonal(out_pair, 0)
+            self.counts_b -= out_pair
+            self.counts_a -= np.outer(leaving_prev, leaving)
+        elif self.mode == "window" and len(self.recent) == self.param:
+            # Window just filled: the oldest draw leaves, it had no incoming transition
+            leaving = self.recent[0]
+            out_pair = np.outer(leaving, leaving)
+            np.fill_diagonal(out_pair, 0)
+            self.counts_b -= out_pair
+        self.counts_b += pair
+        if prev is not None:
+            self.counts_a += np.outer(prev, row)
+        self.recent.append(row)
+        self.n += 1
+        self.last_draw_id = draw_id
+
+    def matrices(self):
+        """(Matrix A normalized, Matrix B) copies, safe to use outside the lock."""
+        return normalize_rows(self.counts_a), self.counts_b.copy()
 
-def get_latest_draw_numbers():
-    draws = get_all_draws_sorted()
-    if draws:
-        return draws[-1].balls_list
-    return []
 
-def calculate_matrix_prediction():
+# Variant states, least recently used first: specs come from requests, so at most
+# VARIANTS_SIZE of them are kept (an evicted variant is rebuilt in one pass if asked again)
+VARIANTS_SIZE = 16
+_VARIANTS: "collections.OrderedDict[tuple, IncrementalMatrices]" = collections.OrderedDict()
+_VARIANTS_LOCK = threading.Lock()
+
+def get_variant_matrices(history=None, variant: str = DEFAULT_VARIANT):
+    """
+    (Matrix A, Matrix B) for `variant` over `history`.
+    The per-variant state is caught up with only the draws added since its last use;
+    it is rebuilt (one vectorized pass) only if the history no longer extends it.
+    """
+    mode, param = parse_variant(variant)
+    history = _load_history(history)
+    if mode == "full":
+        snapshot = get_snapshot(history)
+        return snapshot.matrix_a, snapshot.matrix_b
+    
+    key = (mode, param)
+    n = len(history)
+    with _VARIANTS_LOCK:
+        state = _VARIANTS.get(key)
+        extends = state is not None and state.n <= n and (
+            state.n == 0 or history.draw_ids[state.n - 1] == state.last_draw_id)
+        if extends:
+            x = history.incidence
+            for t in range(state.n, n):
+                state.update(x[t], history.draw_ids[t])
+        else:
+            state = IncrementalMatrices.from_incidence(
+                history.incidence, mode, param, history.draw_ids[-1] if n else None)
+            _VARIANTS[key] = state
+        _VARIANTS.move_to_end(key)
+        while len(_VARIANTS) > VARIANTS_SIZE:
+            _VARIANTS.popitem(last=False)
+        return state.matrices()
+
+def get_matrix_a(history=None):
+    return get_snapshot(history).matrix_a
+
+def get_matrix_b(history=None):
+    return get_snapshot(history).matrix_b
+
+def get_latest_draw_numbers(history=None):
+    return list(get_snapshot(history).latest_balls)
+
+def calculate_matrix_prediction(history=None, snapshot: ModelSnapshot = None, variant: str = DEFAULT_VARIANT,
+                                lag_weights: Sequence[float] = None):
     """
     The "Decoder" Function.
     
@@ -153,87 +480,202 @@ def calculate_matrix_prediction():
        5. Combine.
        
     Weights: 0.7 Time + 0.3 Space.
+
+    `history` (DrawHistory) is loaded once here if not provided.
+    `snapshot` lets offline jobs score with a private model (see build_snapshot);
+    matrices and latest draw always come from the same snapshot.
+    `variant` selects time-aware matrices ("decay:<half_life>", "window:<draws>").
+    `lag_weights` (full variant only) weights the lag-1..K transition layers in the
+    time score (see lag_time_scores); default (1.0,) = Matrix A alone.
+    The bonus letter comes from the snapshot's letter layer (all variants).
+    """
+    lag_weights = tuple(lag_weights) if lag_weights else DEFAULT_LAG_WEIGHTS
+    if parse_variant(variant)[0] != "full" and snapshot is None:
+        history = _load_history(history)
+        mat_a, mat_b = get_variant_matrices(history, variant)
+        prediction = score_matrices(mat_a, mat_b, history.latest_balls())
+        snapshot = get_snapshot(history) # Letter layer
+    else:
+        if snapshot is None:
+            snapshot = get_snapshot(history)
+        time_scores = None
+        if lag_weights != DEFAULT_LAG_WEIGHTS:
+            time_scores = lag_time_scores(snapshot, lag_weights)
+        prediction = score_matrices(snapshot.matrix_a, snapshot.matrix_b, list(snapshot.latest_balls), time_scores)
+        if prediction["numbers"] and lag_weights != DEFAULT_LAG_WEIGHTS:
+            prediction["lag_weights"] = list(lag_weights)
+    if prediction["numbers"]:
+        prediction["variant"] = variant or DEFAULT_VARIANT
+        prediction.update(predict_letter(snapshot))
+    return prediction
+
+def predict_letter(snapshot: ModelSnapshot):
+    """{"letter", "letter_details"}: Markov letter layer of the snapshot (see letter_model)."""
+    import letter_model  # Lazy import
+    return letter_model.pick(letter_model.markov_letter_scores(
+        snapshot.letter_transitions, snapshot.letter_counts, snapshot.latest_letter))
+
+def score_matrices(mat_a, mat_b, latest_balls, time_scores=None):
+    """
+    Scores the 25 candidates given the matrices and the conditioning draw (see calculate_matrix_prediction).
+    `time_scores` overrides step 1 (e.g. lag-weighted scores from lag_time_scores).
+    Single-draw wrapper around score_batch.
     """
-    mat_a = get_matrix_a()
-    mat_b = get_matrix_b()
-    latest_balls = get_latest_draw_numbers()
-    
     if not latest_balls:
         return {"numbers": [], "details": []}
-        
-    final_scores = {}
     
-    # 1. Score Time
-    # Sum of transition probabilities from Draw T_now
-    time_scores = np.zeros(25)
+    row = np.zeros((1, 25))
     for x in latest_balls:
         if 1 <= x <= 25:
-             # Add row x's contribution to all cols
-             time_scores += mat_a[x-1]
-             
-    # Normalize Time Scores for sanity (0-1 range roughly)?
-    # Or just use raw vals. Matrix A is probabilities. Sum might be > 1.
-    # Let's normalize to 0-1 range for mixing.
-    if time_scores.max() > 0:
-        time_scores = time_scores / time_scores.max()
-        
-    # 2. Score Space (Affinity with Top Candidates)
-    # We need a preliminary "Top" set to measure affinity against.
-    # Let's use Top 15 from Time Score to define the "Cluster" we are forming.
-    top_indices_time = time_scores.argsort()[::-1][:15] # Top 15 indices (0-24)
-    
-    space_scores = np.zeros(25)
-    
-    # For each candidate 'c' (0-24), calculate average B value with the top_indices_time (excluding self)
-    for c in range(25):
-        affinities = []
-        for other in top_indices_time:
-            if c == other:
-                continue
-            # Matrix B is counts. We might want to normalize B ideally, but raw counts work if scaled.
-            # Let's use raw counts for now, then normalize the final vector.
-            affinities.append(mat_b[c][other])
-        
-        if affinities:
-            space_scores[c] = np.mean(affinities)
-            
-    # Normalize Space Scores
-    if space_scores.max() > 0:
-        space_scores = space_scores / space_scores.max()
-        
-    # 3. Final Score
-    # 0.7 * Time + 0.3 * Space
-    total_scores = (0.7 * time_scores) + (0.3 * space_scores)
-    
-    # Pack results
+            row[0, x - 1] = 1
+    batch = score_batch(mat_a, mat_b, row, None if time_scores is None else np.asarray(time_scores, dtype=float)[None, :])
+    return prediction_from_batch(batch, 0)
+
+def prediction_from_batch(batch, r: int):
+    """Packs row `r` of a score_batch result in the calculate_matrix_prediction format."""
+    # Pack results (top 10, sorted by score desc)
     results = []
-    for c in range(25):
+    for c in batch["ranking"][r, :10]:
         results.append({
-            "number": c + 1,
-            "score": float(total_scores[c]),
-            "score_time": float(time_scores[c]),
-            "score_space": float(space_scores[c])
+            "number": int(c) + 1,
+            "score": float(batch["score"][r, c]),
+            "score_time": float(batch["score_time"][r, c]),
+            "score_space": float(batch["score_space"][r, c])
         })
-        
-    # Sort by Score Desc
-    results.sort(key=lambda x: x["score"], reverse=True)
-    
-    top_10 = [r["number"] for r in results[:10]]
     
     return {
-        "numbers": top_10,
-        "details": results[:10], # Send top 10 details
+        "numbers": [r["number"] for r in results],
+        "details": results, # Send top 10 details
         "matrix_a_summary": "Active", # Placeholder to confirm usage
         "matrix_b_summary": "Active"
     }
+
+SPACE_CLUSTER_SIZE = 15
+TIME_WEIGHT = 0.7
+SPACE_WEIGHT = 0.3
+
+def score_batch(mat_a, mat_b, rows, time_scores=None):
+    """
+    Vectorized scorer for R conditioning draws at once.
+    
+    rows:   R x 25 incidence rows (0/1) of the conditioning draws (draw T for T+1).
+    mat_a / mat_b: 25x25 (shared by all rows) or R x 25 x 25 (one model per row,
+            e.g. prefix models in backfills).
+    time_scores: optional R x 25 override of step 1.
+    
+    Same algorithm as the scalar version, without Python loops:
+      1. Time  = rows @ A, normalized by its row max.
+      2. Space = mean of B[c, o] over the top-15 time candidates o != c
+         (masked matrix product), normalized by its row max.
+      3. Score = 0.7 * Time + 0.3 * Space.
+    Returns a dict of R x 25 arrays: score, score_time, score_space, and
+    ranking (candidate indices 0-24 by descending score, ties by number).
+    Use ranking[:, :10] + 1 for the top-10 numbers.
+    """
+    rows = np.asarray(rows, dtype=float)
+    if rows.ndim == 1:
+        rows = rows[None, :]
+    per_row = np.ndim(mat_a) == 3
+    
+    # 1. Score Time
+    if time_scores is None:
+        time_scores = np.einsum("ru,ruv->rv", rows, mat_a) if per_row else rows @ mat_a
+    time_scores = np.array(time_scores, dtype=float)
+    t_max = time_scores.max(axis=1, keepdims=True)
+    np.divide(time_scores, t_max, out=time_scores, where=t_max > 0)
+    
+    # 2. Score Space: mask of the top-15 time candidates per row.
+    # Ranked on rounded scores so summation-order noise cannot reorder ties; ties go to the lower number.
+    top = np.argsort(-np.round(time_scores, 12), axis=1, kind="stable")[:, :SPACE_CLUSTER_SIZE]
+    mask = np.zeros_like(time_scores)
+    np.put_along_axis(mask, top, 1.0, axis=1)
+    if per_row:
+        sums = np.einsum("ro,rco->rc", mask, mat_b)
+        diag = np.diagonal(mat_b, axis1=1, axis2=2)
+    else:
+        sums = mask @ np.asarray(mat_b).T
+        diag = np.diagonal(mat_b)[None, :]
+    # Exclude self: candidate c inside the cluster does not count its own B[c, c]
+    sums = sums - mask * diag
+    counts = SPACE_CLUSTER_SIZE - mask
+    space_scores = sums / counts
+    s_max = space_scores.max(axis=1, keepdims=True)
+    np.divide(space_scores, s_max, out=space_scores, where=s_max > 0)
+    
+    # 3. Final Score
+    total_scores = (TIME_WEIGHT * time_scores) + (SPACE_WEIGHT * space_scores)
+    ranking = np.argsort(-np.round(total_scores, 12), axis=1, kind="stable")
     
-def get_matrix_visual_data():
+    return {
+        "score": total_scores,
+        "score_time": time_scores,
+        "score_space": space_scores,
+        "ranking": ranking
+    }
+
+def calculate_matrix_predictions_batch(rows, history=None, snapshot: ModelSnapshot = None, top_k: int = 10):
+    """
+    Batch API: scores many conditioning draws (R x 25 incidence rows) with one model
+    (the live snapshot unless `snapshot` is given). Returns {"numbers": R x top_k, "scores": R x 25}.
+    """
+    if snapshot is None:
+        snapshot = get_snapshot(history)
+    batch = score_batch(snapshot.matrix_a, snapshot.matrix_b, rows)
+    return {
+        "numbers": batch["ranking"][:, :top_k] + 1,
+        "scores": batch["score"]
+    }
+
+def prefix_model_stacks(x: np.ndarray, start: int, stop: int):
+    """
+    Matrix A / Matrix B of every prefix model for draws start..stop-1, as stacks:
+    layer i is the model built from draws[:start + i] (what was known before draw start + i).
+    Returns (A R x 25 x 25 normalized, B R x 25 x 25 counts, conditioning rows R x 25).
+    Memory is R x 2 x 5 KB: callers process long histories in chunks.
+    """
+    x = np.asarray(x, dtype=float)
+    base_a, base_b = _full_counts(x[:start]) if start > 0 else (np.zeros((25, 25)), np.zeros((25, 25)))
+    r = stop - start
+    # Increments between consecutive prefixes: draw t (t = start..stop-2) adds B pairs and A(t-1 -> t)
+    inc_b = np.einsum("tu,tv->tuv", x[start:stop - 1], x[start:stop - 1])
+    idx = np.arange(25)
+    inc_b[:, idx, idx] = 0
+    inc_a = np.zeros_like(inc_b)
+    lo = max(start, 1)
+    if lo < stop - 1:
+        inc_a[lo - start:] = np.einsum("tu,tv->tuv", x[lo - 1:stop - 2], x[lo:stop - 1])
+    stack_b = np.empty((r, 25, 25))
+    stack_a = np.empty((r, 25, 25))
+    stack_b[0] = base_b
+    stack_a[0] = base_a
+    if r > 1:
+        stack_b[1:] = base_b + np.cumsum(inc_b, axis=0)
+        stack_a[1:] = base_a + np.cumsum(inc_a, axis=0)
+    sums = stack_a.sum(axis=2, keepdims=True)
+    stack_a = np.divide(stack_a, sums, out=np.zeros_like(stack_a), where=sums != 0)
+    cond = np.zeros((r, 25))
+    if start > 0:
+        cond[0] = x[start - 1]
+    cond[1:] = x[start:stop - 1]
+    return stack_a, stack_b, cond
+
+def get_matrix_visual_data(history=None, variant: str = DEFAULT_VARIANT, lag_weights: Sequence[float] = None):
     """
     Returns data formatted for the Frontend Heatmap.
     Arrays need to be nested lists.
     """
+    if parse_variant(variant)[0] != "full":
+        history = _load_history(history)
+        mat_a, mat_b = get_variant_matrices(history, variant)
+        return {
+            "matrix_a": mat_a.tolist(),
+            "matrix_b": mat_b.tolist(),
+            "prediction": calculate_matrix_prediction(history=history, variant=variant),
+            "variant": variant
+        }
+    snapshot = get_snapshot(history)
     return {
-        "matrix_a": get_matrix_a().tolist(),
-        "matrix_b": get_matrix_b().tolist(),
-        "prediction": calculate_matrix_prediction()
+        "matrix_a": snapshot.matrix_a.tolist(),
+        "matrix_b": snapshot.matrix_b.tolist(),
+        "prediction": calculate_matrix_prediction(snapshot=snapshot, lag_weights=lag_weights)
     }
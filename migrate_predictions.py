@@ -0,0 +1,62 @@
+# One-off migration: move the inline `prediction_json` of every draw document
+# into the `predictions` collection (predictions/{draw_id}_{model_version}).
+#
+# - Draw documents keep only the draw itself (prediction_json is deleted).
+# - 'ai_pending' placeholder draws only existed to carry a prediction: they are deleted
+#   once their prediction has been moved (the scraper creates the real draw).
+#
+# Safe to re-run: already migrated documents have no prediction_json anymore.
+# Usage: python migrate_predictions.py [--dry-run]
+import sys
+from firebase_admin import firestore
+from firestore_service import get_db, save_prediction, COLLECTION_DRAWS, PREDICTION_MODEL_VERSION
+
+def migrate(dry_run: bool = False):
+    db = get_db()
+    if not db:
+        print("Error: Firestore is not available.")
+        return
+
+    docs = db.collection(COLLECTION_DRAWS).stream()
+    moved = 0
+    deleted = 0
+    batch = db.batch()
+    pending_ops = 0
+
+    for doc in docs:
+        d = doc.to_dict()
+        if "prediction_json" not in d:
+            continue
+
+        prediction = d.get("prediction_json")
+        draw_id = d.get("draw_id") or doc.id
+
+        if prediction and not dry_run:
+            save_prediction(draw_id, prediction, PREDICTION_MODEL_VERSION)
+        if prediction:
+            moved += 1
+
+        if d.get("source") == 'ai_pending':
+            if not dry_run:
+                batch.delete(doc.reference)
+            deleted += 1
+        elif not dry_run:
+            batch.update(doc.reference, {"prediction_json": firestore.DELETE_FIELD})
+        pending_ops += 1
+
+        # Firestore batches are limited to 500 writes
+        if pending_ops >= 400:
+            if not dry_run:
+                batch.commit()
+                batch = db.batch()
+            pending_ops = 0
+            print(f"Migrated {moved} predictions...")
+
+    if pending_ops and not dry_run:
+        batch.commit()
+
+    prefix = "[DRY RUN] " if dry_run else ""
+    print(f"{prefix}Moved {moved} predictions to '{PREDICTION_MODEL_VERSION}', deleted {deleted} pending placeholders.")
+
+if __name__ == "__main__":
+    migrate(dry_run="--dry-run" in sys.argv)
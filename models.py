@@ -1,5 +1,5 @@
 from pydantic import BaseModel
-from typing import List, Optional, Any
+from typing import List, Optional, Any, NamedTuple
 from datetime import date, time, datetime
 
 # Remove SQLAlchemy dependencies
@@ -22,6 +22,18 @@ class Draw(BaseModel):
     class Config:
         orm_mode = True
 
+class DrawRecord(NamedTuple):
+    """
+    Compact, validation-free draw used by analytics reads (see firestore_service.get_draw_records).
+    Same attribute names as Draw, without the id and the heavy prediction_json.
+    """
+    draw_id: Optional[int]
+    date: Any
+    time: Any
+    balls_list: List[int]
+    bonus_letter: Optional[str]
+    source: Optional[str]
+
 class AlgorithmConfiguration(BaseModel):
     id: Optional[str] = None
     active: int = 1
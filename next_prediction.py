@@ -0,0 +1,141 @@
+import datetime
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+# Prediction of the upcoming draw slot, computed ahead of time.
+#
+# The ingest pipeline computes and persists it as soon as the previous draw is ingested
+# (see ingest.predict_next_slot) and keeps it in memory, so /predict is a pure read:
+#   memory -> Firestore (one document read, then kept in memory) -> compute (gaps only:
+#   no ingest since the slot opened, fresh process before the warm-up, ...).
+# The fallback computation is single-flight: concurrent requests for the same slot wait
+# for one computation instead of each running both engines.
+# Each prediction carries the data_version of the history it was computed from. One
+# computed before the previous draw was ingested (e.g. a /predict between the top of
+# the hour and the scrape) is replaced at ingest; from then on it is never changed.
+
+CACHE_SIZE = 8
+
+_CACHE: "OrderedDict[int, Dict[str, Any]]" = OrderedDict()
+_CACHE_LOCK = threading.Lock()
+_COMPUTE_LOCK = threading.Lock()
+
+
+def next_slot(now: datetime.datetime = None) -> Tuple[int, str]:
+    """
+    (draw_id, label) of the next draw after `now` (Paris time):
+    before 13h -> today 13h, 13h-18h59 -> the next hour, from 19h -> tomorrow 13h.
+    """
+    if now is None:
+        import pytz  # Lazy import
+        now = datetime.datetime.now(pytz.timezone('Europe/Paris'))
+    next_draw_date = now.date()
+    if now.hour < 13:
+        next_draw_hour = 13
+    elif now.hour >= 19:
+        next_draw_date = now.date() + datetime.timedelta(days=1)
+        next_draw_hour = 13
+    else:
+        next_draw_hour = now.hour + 1
+    # ID format: YYYYMMDDHH (same as the draw document the scraper will create)
+    draw_id = int(f"{next_draw_date.strftime('%Y%m%d')}{next_draw_hour:02d}")
+    label = f"{next_draw_hour}h00"
+    if next_draw_date > now.date():
+        label = f"demain {label}"
+    return draw_id, label
+
+def is_valid(prediction: Optional[Dict[str, Any]]) -> bool:
+    """A stored prediction is served only if it has the unified format and some numbers."""
+    if not prediction or "algorithmic" not in prediction:
+        return False
+    stat_nums = prediction.get("statistical", {}).get("numbers", [])
+    algo_nums = prediction.get("algorithmic", {}).get("numbers", [])
+    return len(stat_nums) > 0 or len(algo_nums) > 0
+
+def _outdated(prediction: Dict[str, Any], version) -> bool:
+    """True if `prediction` was computed from a history older than `version` (None: no check)."""
+    if version is None:
+        return False
+    computed_from = prediction.get("data_version")
+    return not computed_from or computed_from[0] < version[0]
+
+def _remember(draw_id: int, prediction: Dict[str, Any]):
+    with _CACHE_LOCK:
+        _CACHE[draw_id] = prediction
+        _CACHE.move_to_end(draw_id)
+        while len(_CACHE) > CACHE_SIZE:
+            _CACHE.popitem(last=False)
+
+def cached(draw_id: int) -> Optional[Dict[str, Any]]:
+    """The in-memory prediction of `draw_id` (None if this process has none)."""
+    with _CACHE_LOCK:
+        return _CACHE.get(draw_id)
+
+def compute(draw_id: int, history=None) -> Dict[str, Any]:
+    """Runs both engines on `history` (loaded if None), persists and caches the prediction of `draw_id`."""
+    from engine import calculate_prediction as calc_stat  # Lazy import
+    from matrix_engine import calculate_matrix_prediction as calc_algo  # Lazy import
+    from firestore_service import save_prediction  # Lazy import
+    from history import DrawHistory  # Lazy import
+    if history is None:
+        history = DrawHistory.load()
+    # Load the history ONCE and share it between both engines
+    prediction = {
+        "statistical": calc_stat(history=history),
+        "algorithmic": calc_algo(history=history),
+        "data_version": list(history.data_version)
+    }
+    # Stored on its own document; the draw document is created by the scraper once drawn
+    save_prediction(draw_id, prediction)
+    _remember(draw_id, prediction)
+    return prediction
+
+def load(draw_id: int, version=None) -> Optional[Dict[str, Any]]:
+    """
+    Memory, then the stored prediction (kept in memory); None if neither is valid or
+    both were computed from a history older than `version`.
+    """
+    prediction = cached(draw_id)
+    if prediction is not None and not _outdated(prediction, version):
+        return prediction
+    from firestore_service import get_prediction  # Lazy import
+    prediction = get_prediction(draw_id)
+    if not is_valid(prediction):
+        if prediction:
+            print("Detected stale/empty prediction. Regenerating...")
+        return None
+    if _outdated(prediction, version):
+        return None
+    _remember(draw_id, prediction)
+    return prediction
+
+def get(draw_id: int) -> Dict[str, Any]:
+    """
+    The prediction of `draw_id`: a read in steady state, computed once if missing or
+    older than the history published on this host (the ingest replaced it).
+    """
+    import shared_cache  # Lazy import
+    version = shared_cache.history_version()  # Header read only
+    prediction = load(draw_id, version)
+    if prediction is not None:
+        return prediction
+    with _COMPUTE_LOCK:
+        prediction = cached(draw_id)  # Computed by the request we waited for
+        if prediction is not None and not _outdated(prediction, version):
+            return prediction
+        print(f"[PREDICT] No up-to-date prediction for {draw_id}: computing it now.")
+        return compute(draw_id)
+
+def precompute(history, now: datetime.datetime = None) -> Dict[str, Any]:
+    """
+    Ingest: prediction of the next calendar slot from the just-updated `history`.
+    A stored prediction computed from this history is kept (never changed once served);
+    one computed from an older history (before this ingest) is recomputed and replaced.
+    """
+    draw_id, _ = next_slot(now)
+    with _COMPUTE_LOCK:
+        if load(draw_id, history.data_version) is not None:
+            return {"draw_id": draw_id, "computed": False}
+        compute(draw_id, history)
+    return {"draw_id": draw_id, "computed": True}
@@ -1,17 +1,107 @@
-from apscheduler.schedulers.background import BackgroundScheduler
-from scraper import fetch_and_store_latest
+import os
+import threading
 import time
 import atexit
+import datetime
+# APScheduler and the scraper (requests, BeautifulSoup) are imported when the scheduler
+# actually starts, i.e. in the warm-up thread, not when the app module is imported.
+
+# Every worker of every instance runs this scheduler, but only the elected leader
+# (see leader.py) scrapes and ingests. Followers only pick up the new data version.
+_ELECTOR = None
+
+# Scrapes are coalesced per process: a caller joins the scrape in flight, or gets the
+# result of one finished less than REFRESH_COOLDOWN seconds ago, instead of starting
+# another one. Manual /refresh clicks and the minute cycle thus share the same scrapes.
+REFRESH_COOLDOWN = float(os.environ.get("CRESCENDO_REFRESH_COOLDOWN", "30"))
+_SCRAPE_LOCK = threading.Lock()
+_IN_FLIGHT = None     # threading.Event of the running scrape (set when it finishes)
+_LAST_SCRAPE = None   # {"updated": bool, "finished_at": epoch seconds}
+
+def pick_up_new_data() -> bool:
+    """
+    Follower cycle: one document read to learn the current data version; the history
+    and matrices are reloaded (shared cache first) only when it changed.
+    Returns True if a new data version was picked up.
+    """
+    from firestore_service import get_data_version
+    import matrix_engine
+    
+    version = get_data_version()
+    snapshot = matrix_engine.current_snapshot()
+    if version is None or (snapshot is not None and snapshot.data_version == version):
+        return False
+    
+    from history import DrawHistory
+    history = DrawHistory.load()
+    if history.data_version != version:
+        history = DrawHistory.load(use_shared=False)
+    matrix_engine.get_snapshot(history)
+    # The leader stored the next slot's prediction at ingest: keep it in memory for /predict
+    import next_prediction
+    next_prediction.load(next_prediction.next_slot()[0], version)
+    print(f"Picked up data version {version}.")
+    return True
+
+def is_follower() -> bool:
+    """True if the scheduler runs and another process holds the leadership (last cycle's view)."""
+    return _ELECTOR is not None and not _ELECTOR.leader
+
+def scrape(max_age: float = REFRESH_COOLDOWN) -> dict:
+    """
+    Coalesced scraper run (see REFRESH_COOLDOWN).
+    Returns {"updated", "finished_at", "age", "coalesced"}: whether the scrape added
+    draws, when it finished, its age in seconds and whether it was shared.
+    """
+    global _IN_FLIGHT, _LAST_SCRAPE
+    with _SCRAPE_LOCK:
+        last = _LAST_SCRAPE
+        if last is not None and time.time() - last["finished_at"] <= max_age:
+            return _scrape_result(last, coalesced=True)
+        running = _IN_FLIGHT
+        if running is None:
+            _IN_FLIGHT = done = threading.Event()
+    if running is not None:
+        running.wait()
+        return _scrape_result(_LAST_SCRAPE, coalesced=True)
+    
+    updated = False
+    try:
+        from scraper import fetch_and_store_latest
+        updated = fetch_and_store_latest()
+    finally:
+        with _SCRAPE_LOCK:
+            _LAST_SCRAPE = {"updated": bool(updated), "finished_at": time.time()}
+            _IN_FLIGHT = None
+        done.set()
+    return _scrape_result(_LAST_SCRAPE, coalesced=False)
+
+def _scrape_result(last: dict, coalesced: bool) -> dict:
+    return {**last, "age": time.time() - last["finished_at"], "coalesced": coalesced}
+
+def run_cycle():
+    if _ELECTOR.is_leader():
+        scrape() # Skipped if a manual refresh just scraped
+    else:
+        pick_up_new_data()
 
 def start_scheduler():
+    global _ELECTOR
+    from apscheduler.schedulers.background import BackgroundScheduler
+    from leader import default_elector
+    _ELECTOR = default_elector()
+    
     scheduler = BackgroundScheduler()
-    # Run scraper every 1 minute
-    scheduler.add_job(lambda: fetch_and_store_latest(), 'interval', minutes=1)
+    # Run every 1 minute (scrape if leader, sync otherwise), the first cycle right away:
+    # until a cycle ran, _ELECTOR.leader is False and every worker would count as a follower
+    scheduler.add_job(run_cycle, 'interval', minutes=1, max_instances=1, coalesce=True,
+                      next_run_time=datetime.datetime.now())
     scheduler.start()
     
-    # Shut down the scheduler when exiting the app
+    # Shut down the scheduler and hand over leadership when exiting the app
     atexit.register(lambda: scheduler.shutdown())
-    print("Scheduler started. Scraper will run every 1 minute.")
+    atexit.register(lambda: _ELECTOR.resign())
+    print("Scheduler started. Leader scrapes every 1 minute, followers sync data version.")
 
 if __name__ == "__main__":
     # Test run
@@ -1,8 +1,6 @@
-import requests
-from bs4 import BeautifulSoup
 from datetime import datetime
-from models import SessionLocal, Draw
-from sqlalchemy.exc import IntegrityError
+from models import DrawRecord
+# requests / BeautifulSoup are imported inside fetch_and_store_latest (only the scraping process needs them)
 
 # Placeholder URL - User might need to update selector/URL if FDJ changes layout.
 # Using a generic structure common in scraping examples or the official visible URL.
@@ -20,6 +18,9 @@ def fetch_and_store_latest() -> bool:
     """
     print(f"Scraping {URL}...")
     try:
+        import requests
+        from bs4 import BeautifulSoup
+        
         response = requests.get(URL, headers=HEADERS, timeout=10)
         if response.status_code != 200:
             print(f"Failed to fetch page: {response.status_code}")
@@ -72,6 +73,7 @@ def fetch_and_store_latest() -> bool:
         import re
         
         latest_added = False
+        added = []  # DrawRecords of the draws added (or completed) by this scrape
         
         # Find all elements that might be the time
         all_tags = soup.find_all(string=re.compile(r"^\d{1,2}h$"))
@@ -138,14 +140,6 @@ def fetch_and_store_latest() -> bool:
                     exists = get_draw_by_date_time(s_date, s_time)
                     
                     if not exists:
-                         from engine import calculate_prediction as calc_stat
-                         from matrix_engine import calculate_matrix_prediction as calc_algo
-                         
-                         prediction = {
-                             "statistical": calc_stat(),
-                             "algorithmic": calc_algo()
-                         }
-
                          id_str = f"{scraped_date.strftime('%Y%m%d')}{hour:02d}"
                          
                          new_draw_data = {
@@ -154,13 +148,13 @@ def fetch_and_store_latest() -> bool:
                              "time": s_time, # Storing as String
                              "balls_list": balls,
                              "bonus_letter": bonus,
-                             "prediction_json": prediction,
                              "source": 'scrape'
                          }
                          
                          add_draw(new_draw_data)
+                         added.append(DrawRecord(**new_draw_data))
                          latest_added = True
-                         print(f"New draw added: {s_date} {s_time} with prediction")
+                         print(f"New draw added: {s_date} {s_time}")
                     
                     elif exists.source == 'ai_pending':
                          # Update pending
@@ -170,6 +164,7 @@ def fetch_and_store_latest() -> bool:
                              "source": 'scrape'
                          }
                          update_draw(exists.id, update_data) # exists.id is the document ID
+                         added.append(DrawRecord(exists.draw_id, exists.date, exists.time, balls, bonus, 'scrape'))
                          
                          latest_added = True
                          print(f"Updated pending draw: {s_date} {s_time}")
@@ -179,9 +174,10 @@ def fetch_and_store_latest() -> bool:
                     continue
 
         if latest_added:
-            from matrix_engine import build_matrices
-            print("Triggering Matrix Engine Recalculation...")
-            build_matrices()
+            # One ordered pass of the ingest stages (history, matrices, stats, evaluation,
+            # next prediction, caches, data version): see ingest.py
+            import ingest
+            ingest.run(sorted(added, key=lambda d: d.draw_id))
         
         return latest_added
 
@@ -0,0 +1,238 @@
+import json
+import mmap
+import os
+import struct
+import tempfile
+import time
+import numpy as np
+from typing import Optional, Dict, Any, Tuple
+
+# Host-wide cache shared by all uvicorn workers.
+#
+# The history arrays and the model matrices are published ONCE per data version into
+# memory-mapped files (in /dev/shm when available). Every worker attaches them read-only:
+# numpy arrays are zero-copy views on the mapping, so N workers cost one copy in memory,
+# one Firestore scan and one matrix build instead of N.
+#
+# File layout:
+#   MAGIC (4 bytes) | FORMAT (uint32) | header length (uint32) | JSON header | arrays
+# The JSON header carries the data version, the publish time, scalar metadata and the
+# (dtype, shape, offset) of each array. Arrays are 64-byte aligned.
+# Publishing writes a temp file and os.replace()s it, so readers either see the old
+# file or the new one, never a partial write; a reader keeps its old mapping alive
+# until it re-attaches.
+
+MAGIC = b"CRSC"
+FORMAT = 1
+_PREFIX = struct.Struct("<4sII")
+_ALIGN = 64
+
+SHARED_DIR = os.environ.get(
+    "CRESCENDO_SHARED_DIR",
+    "/dev/shm" if os.path.isdir("/dev/shm") else tempfile.gettempdir()
+)
+# How long a published history is trusted before a worker reloads it from Firestore.
+# The ingesting process re-publishes immediately after each new draw.
+SHARED_MAX_AGE = float(os.environ.get("CRESCENDO_SHARED_MAX_AGE", "60"))
+ENABLED = os.environ.get("CRESCENDO_SHARED_CACHE", "1") != "0"
+
+HISTORY_NAME = "crescendo_history"
+MODEL_NAME = "crescendo_model"
+
+# Per-process memo of attached files: name -> ((inode, mtime), payload)
+_ATTACHED: Dict[str, Tuple[tuple, Any]] = {}
+# Per-process memo of the DrawHistory built from the attached history file:
+# ((inode, mtime), history). The same object (with its incidence / count tables)
+# is returned until the file is replaced, so requests never rebuild it.
+_HISTORY: Optional[Tuple[tuple, Any]] = None
+
+
+def _path(name: str) -> str:
+    return os.path.join(SHARED_DIR, f"{name}.bin")
+
+def publish(name: str, arrays: Dict[str, np.ndarray], meta: Dict[str, Any]) -> bool:
+    """Atomically writes `arrays` and `meta` (JSON-serializable) under `name`."""
+    if not ENABLED:
+        return False
+    try:
+        specs = {}
+        offset = 0
+        for key, arr in arrays.items():
+            arr = np.ascontiguousarray(arr)
+            arrays[key] = arr
+            offset = (offset + _ALIGN - 1) // _ALIGN * _ALIGN
+            specs[key] = [arr.dtype.str, list(arr.shape), offset]
+            offset += arr.nbytes
+        header = dict(meta)
+        header["published_at"] = time.time()
+        header["arrays"] = specs
+        header_bytes = json.dumps(header).encode("utf-8")
+        data_start = (_PREFIX.size + len(header_bytes) + _ALIGN - 1) // _ALIGN * _ALIGN
+
+        fd, tmp_path = tempfile.mkstemp(prefix=f".{name}.", dir=SHARED_DIR)
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(_PREFIX.pack(MAGIC, FORMAT, len(header_bytes)))
+                f.write(header_bytes)
+                for key, arr in arrays.items():
+                    f.seek(data_start + specs[key][2])
+                    f.write(arr.tobytes())
+                f.truncate(max(f.tell(), data_start + offset, 1))
+            os.replace(tmp_path, _path(name))
+        except Exception:
+            if os.path.exists(tmp_path):
+                os.unlink(tmp_path)
+            raise
+        return True
+    except Exception as e:
+        print(f"[SHARED CACHE] Publish of {name} failed: {e}")
+        return False
+
+def _file_key(name: str) -> Optional[tuple]:
+    try:
+        st = os.stat(_path(name))
+    except OSError:
+        return None
+    return (st.st_ino, st.st_mtime_ns)
+
+def attach(name: str) -> Optional[Tuple[Dict[str, Any], Dict[str, np.ndarray]]]:
+    """
+    Returns (meta, arrays) for `name` with read-only zero-copy arrays, or None.
+    The mapping is reused until the file is replaced by a new publish.
+    """
+    if not ENABLED:
+        return None
+    path = _path(name)
+    key = _file_key(name)
+    if key is None:
+        return None
+    cached = _ATTACHED.get(name)
+    if cached and cached[0] == key:
+        return cached[1]
+    try:
+        with open(path, "rb") as f:
+            mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, fmt, header_len = _PREFIX.unpack_from(mm, 0)
+        if magic != MAGIC or fmt != FORMAT:
+            return None
+        header = json.loads(bytes(mm[_PREFIX.size:_PREFIX.size + header_len]).decode("utf-8"))
+        data_start = (_PREFIX.size + header_len + _ALIGN - 1) // _ALIGN * _ALIGN
+        arrays = {}
+        for k, (dtype, shape, offset) in header.pop("arrays").items():
+            dt = np.dtype(dtype)
+            count = int(np.prod(shape)) if shape else 1
+            arrays[k] = np.frombuffer(mm, dtype=dt, count=count, offset=data_start + offset).reshape(shape)
+        payload = (header, arrays)
+        _ATTACHED[name] = (key, payload)
+        return payload
+    except Exception as e:
+        print(f"[SHARED CACHE] Attach of {name} failed: {e}")
+        return None
+
+def age(meta: Dict[str, Any]) -> float:
+    return time.time() - meta.get("published_at", 0)
+
+
+# --- History ---
+
+def publish_history(history) -> bool:
+    """Publishes a DrawHistory for the other workers of this host."""
+    global _HISTORY
+    n = len(history)
+    width = max([len(b) for b in history.balls] + [1])
+    balls = np.zeros((n, width), dtype=np.int8)
+    for i, b in enumerate(history.balls):
+        balls[i, :len(b)] = b
+    arrays = {
+        "draw_ids": np.array([d or 0 for d in history.draw_ids], dtype=np.int64),
+        "dates": np.array([str(d or "") for d in history.dates], dtype="S10"),
+        "times": np.array([str(t or "") for t in history.times], dtype="S8"),
+        "balls": balls,
+        "letters": np.array([l or "" for l in history.letters], dtype="S1"),
+        "sources": np.array([s or "" for s in history.sources], dtype="S16"),
+    }
+    published = publish(HISTORY_NAME, arrays, {"data_version": list(history.data_version)})
+    key = _file_key(HISTORY_NAME) if published else None
+    if key is not None:
+        _HISTORY = (key, history)  # The publisher keeps serving its own object
+    return published
+
+def history_version(max_age: float = None) -> Optional[tuple]:
+    """Data version of the shared history (header only), None if missing or too old."""
+    max_age = SHARED_MAX_AGE if max_age is None else max_age
+    attached = attach(HISTORY_NAME)
+    if attached is None or age(attached[0]) > max_age:
+        return None
+    return tuple(attached[0]["data_version"])
+
+def load_history(max_age: float = None):
+    """
+    Returns the shared DrawHistory if one was published less than `max_age` seconds ago.
+    Built once per published file (see _HISTORY), then returned as is.
+    """
+    global _HISTORY
+    max_age = SHARED_MAX_AGE if max_age is None else max_age
+    attached = attach(HISTORY_NAME)
+    if attached is None:
+        return None
+    meta, arrays = attached
+    if age(meta) > max_age:
+        return None
+    key = _ATTACHED[HISTORY_NAME][0]
+    memo = _HISTORY
+    if memo is not None and memo[0] == key:
+        return memo[1]
+    from history import DrawHistory  # Lazy import
+    history = DrawHistory.from_arrays(
+        draw_ids=arrays["draw_ids"].tolist(),
+        dates=[d.decode() for d in arrays["dates"].tolist()],
+        times=[t.decode() for t in arrays["times"].tolist()],
+        balls=[[b for b in row if b] for row in arrays["balls"].tolist()],
+        letters=[l.decode() for l in arrays["letters"].tolist()],
+        sources=[s.decode() for s in arrays["sources"].tolist()],
+    )
+    _HISTORY = (key, history)
+    return history
+
+
+# --- Model snapshot ---
+
+def publish_snapshot(snapshot) -> bool:
+    """Publishes a matrix_engine.ModelSnapshot (matrices + latest draw) for this host."""
+    return publish(MODEL_NAME, {
+        "matrix_a": snapshot.matrix_a,
+        "matrix_b": snapshot.matrix_b,
+        "lag_counts": snapshot.lag_counts,
+        "recent_rows": snapshot.recent_rows,
+        "letter_transitions": snapshot.letter_transitions,
+        "letter_counts": snapshot.letter_counts,
+    }, {
+        "data_version": list(snapshot.data_version),
+        "draw_count": snapshot.draw_count,
+        "latest_balls": list(snapshot.latest_balls),
+        "latest_letter": snapshot.latest_letter,
+    })
+
+def load_snapshot_arrays(data_version) -> Optional[Dict[str, Any]]:
+    """
+    Returns the shared model for `data_version` as a dict (matrices are read-only
+    views on the shared mapping), or None if no matching model was published.
+    """
+    attached = attach(MODEL_NAME)
+    if attached is None:
+        return None
+    meta, arrays = attached
+    if tuple(meta.get("data_version", ())) != tuple(data_version) or "letter_transitions" not in arrays:
+        return None
+    return {
+        "data_version": tuple(meta["data_version"]),
+        "draw_count": meta["draw_count"],
+        "latest_balls": tuple(meta["latest_balls"]),
+        "matrix_a": arrays["matrix_a"],
+        "matrix_b": arrays["matrix_b"],
+        "lag_counts": arrays["lag_counts"],
+        "recent_rows": arrays["recent_rows"],
+        "letter_transitions": arrays["letter_transitions"],
+        "letter_counts": arrays["letter_counts"],
+        "latest_letter": meta.get("latest_letter", ""),
+    }
@@ -0,0 +1,173 @@
+import math
+import threading
+import time
+import numpy as np
+from typing import Dict, Any, Optional
+
+# Monte Carlo baseline: what would random tickets have scored?
+#
+# Tickets and draws are 25-bit masks (bit n-1 = ball n). Uniform random k-of-25 subsets
+# are drawn from the pool of ALL masks with k bits set (C(25,10) = 3.27M masks, 13 MB,
+# built once per process), so a million tickets is one integer draw + one gather, and
+# matches are popcount(ticket & draw). The exact hypergeometric law is reported next to
+# the simulation as a sanity check.
+# Bootstrap confidence intervals and a Monte Carlo p-value tell whether a model's
+# historical hit sequence beats chance.
+
+N_BALLS = 25
+BALLS_PER_DRAW = 10
+N_LETTERS = 5
+DEFAULT_TICKETS = 1_000_000
+MAX_NULL_SAMPLES = 2_000_000  # Random tickets used for a p-value
+SIGNIFICANCE_LEVEL = 0.05
+MAX_BOOT_DISTINCT = 64    # Above this many distinct values, bootstrap by resampling rows...
+BOOT_BLOCK = 1_000_000    # ...at most this many resampled values at a time
+
+_POOLS: Dict[int, np.ndarray] = {}
+_POOLS_LOCK = threading.Lock()
+_POPCOUNT16 = None  # Lookup table for numpy < 2.0
+
+
+def popcount(masks: np.ndarray) -> np.ndarray:
+    """Number of set bits of each uint32 mask."""
+    masks = np.asarray(masks, dtype=np.uint32)
+    if hasattr(np, "bitwise_count"):  # numpy >= 2.0
+        return np.bitwise_count(masks).astype(np.int64)
+    global _POPCOUNT16
+    if _POPCOUNT16 is None:
+        _POPCOUNT16 = np.array([bin(i).count("1") for i in range(1 << 16)], dtype=np.int64)
+    return _POPCOUNT16[masks & 0xFFFF] + _POPCOUNT16[masks >> 16]
+
+def combination_pool(k: int) -> np.ndarray:
+    """All 25-bit masks with exactly k bits set, ascending (cached)."""
+    pool = _POOLS.get(k)
+    if pool is None:
+        with _POOLS_LOCK:
+            pool = _POOLS.get(k)
+            if pool is None:
+                chunks = []
+                step = 1 << 21
+                for start in range(0, 1 << N_BALLS, step):
+                    block = np.arange(start, start + step, dtype=np.uint32)
+                    chunks.append(block[popcount(block) == k])
+                pool = np.concatenate(chunks)
+                pool.flags.writeable = False
+                _POOLS[k] = pool
+    return pool
+
+def random_masks(n: int, k: int, rng: np.random.Generator) -> np.ndarray:
+    """`n` uniform random k-of-25 subsets as masks."""
+    pool = combination_pool(k)
+    return pool[rng.integers(0, len(pool), n)]
+
+def exact_match_distribution(ticket_size: int = BALLS_PER_DRAW) -> np.ndarray:
+    """P(m matches) of a random ticket against a 10-of-25 draw (hypergeometric), m = 0..ticket_size."""
+    total = math.comb(N_BALLS, BALLS_PER_DRAW)
+    return np.array([
+        math.comb(ticket_size, m) * math.comb(N_BALLS - ticket_size, BALLS_PER_DRAW - m) / total
+        for m in range(ticket_size + 1)
+    ])
+
+def simulate_random_tickets(n_tickets: int = DEFAULT_TICKETS, ticket_size: int = BALLS_PER_DRAW,
+                            seed: Optional[int] = None) -> Dict[str, Any]:
+    """
+    Plays `n_tickets` random tickets (+ a random letter) against as many random draws.
+    Returns the match distribution (simulated and exact) and, for 10-number tickets,
+    the gain distribution with the game's payout table.
+    """
+    started = time.time()
+    rng = np.random.default_rng(seed)
+    tickets = random_masks(n_tickets, ticket_size, rng)
+    draws = random_masks(n_tickets, BALLS_PER_DRAW, rng)
+    matches = popcount(tickets & draws)
+    distribution = np.bincount(matches, minlength=ticket_size + 1)[:ticket_size + 1]
+    exact = exact_match_distribution(ticket_size)
+    result = {
+        "tickets": n_tickets,
+        "ticket_size": ticket_size,
+        "mean_matches": float(matches.mean()),
+        "expected_matches": ticket_size * BALLS_PER_DRAW / N_BALLS,
+        "match_distribution": {str(m): float(c / n_tickets) for m, c in enumerate(distribution)},
+        "exact_distribution": {str(m): float(p) for m, p in enumerate(exact)},
+    }
+    if ticket_size == BALLS_PER_DRAW:
+        from matrix_backtest import ticket_gains  # Lazy import
+        letter_hits = rng.integers(0, N_LETTERS, n_tickets) == 0
+        gains = ticket_gains(matches, letter_hits)
+        values, counts = np.unique(gains, return_counts=True)
+        result.update({
+            "mean_gain": float(gains.mean()),
+            "winning_rate": float((gains > 0).mean()),
+            "gain_distribution": {f"{v:g}": float(c / n_tickets) for v, c in zip(values, counts)},
+        })
+    result["seconds"] = round(time.time() - started, 3)
+    return result
+
+def bootstrap_ci(values, n_boot: int = 2000, level: float = 0.95, seed: Optional[int] = None) -> Dict[str, float]:
+    """
+    Percentile bootstrap CI of the mean of `values`.
+    Hit / gain sequences take few distinct values, so a resample is drawn as the counts
+    of each value (one multinomial per resample): O(n_boot x distinct values) memory,
+    whatever the history length. Otherwise resamples are drawn in blocks of rows.
+    """
+    values = np.asarray(values, dtype=float)
+    if len(values) == 0:
+        return {"mean": 0.0, "low": 0.0, "high": 0.0}
+    rng = np.random.default_rng(seed)
+    n = len(values)
+    distinct, counts = np.unique(values, return_counts=True)
+    if len(distinct) <= MAX_BOOT_DISTINCT:
+        means = rng.multinomial(n, counts / n, size=n_boot) @ distinct / n
+    else:
+        rows = max(1, BOOT_BLOCK // n)
+        means = np.concatenate([
+            values[rng.integers(0, n, (min(rows, n_boot - lo), n))].mean(axis=1)
+            for lo in range(0, n_boot, rows)
+        ])
+    alpha = (1 - level) / 2
+    return {
+        "mean": float(values.mean()),
+        "low": float(np.quantile(means, alpha)),
+        "high": float(np.quantile(means, 1 - alpha)),
+    }
+
+def null_p_value(observed_mean: float, n_draws: int, ticket_size: int,
+                 seed: Optional[int] = None) -> Dict[str, float]:
+    """
+    One-sided Monte Carlo p-value: share of random-ticket sequences of `n_draws` draws
+    whose mean matches is >= the observed mean.
+    """
+    if n_draws == 0:
+        return {"p_value": 1.0, "simulations": 0}
+    rng = np.random.default_rng(seed)
+    sims = max(1, min(20000, MAX_NULL_SAMPLES // n_draws))
+    hits = popcount(random_masks(sims * n_draws, ticket_size, rng) &
+                    random_masks(sims * n_draws, BALLS_PER_DRAW, rng)).reshape(sims, n_draws)
+    null_means = hits.mean(axis=1)
+    # +1 smoothing: a finite simulation never proves p = 0
+    p = (np.count_nonzero(null_means >= observed_mean - 1e-12) + 1) / (sims + 1)
+    return {"p_value": float(p), "simulations": sims}
+
+def significance(hits, ticket_size: int, seed: Optional[int] = None,
+                 alpha: float = SIGNIFICANCE_LEVEL) -> Dict[str, Any]:
+    """
+    Is a model's per-draw hit sequence (matches among its `ticket_size` numbers) better
+    than random tickets? `beats_chance` is the Monte Carlo null test (p_value < alpha);
+    the bootstrap CI of the mean is reported as an effect-size range, not as a test.
+    """
+    started = time.time()
+    hits = np.asarray(hits, dtype=float)
+    expected = ticket_size * BALLS_PER_DRAW / N_BALLS
+    ci = bootstrap_ci(hits, seed=seed)
+    p = null_p_value(float(hits.mean()) if len(hits) else 0.0, len(hits), ticket_size, seed=seed)
+    return {
+        "draws": int(len(hits)),
+        "ticket_size": ticket_size,
+        "mean_hits": ci["mean"],
+        "ci95": [ci["low"], ci["high"]],
+        "random_expected_hits": expected,
+        "p_value": p["p_value"],
+        "alpha": alpha,
+        "beats_chance": bool(p["p_value"] < alpha),
+        "seconds": round(time.time() - started, 3),
+    }
@@ -0,0 +1,96 @@
+import numpy as np
+from typing import Dict, Sequence
+
+# Vectorized backtest of the statistical engine (engine.calculate_prediction).
+#
+# The per-draw features the engine recomputes from scratch for every prefix are derived
+# for ALL prefixes at once from the incidence matrix:
+#   - frequency over the last w draws = difference of two rows of the cumulative counts,
+#   - gap = draws since the last appearance, from a running "last seen" index.
+# Scoring a parameter set over a window of test draws is then a handful of array ops,
+# with the same scores and tie order (lower number first) as the engine.
+
+MIN_HISTORY = 20  # Draws needed before the first backtested prediction
+
+
+class StatFeatures:
+    """Prefix features of one history; build once, score many parameter sets."""
+
+    def __init__(self, incidence: np.ndarray, counts: np.ndarray = None):
+        x = np.asarray(incidence, dtype=np.int32)
+        self.n = len(x)
+        self.x = x
+        # counts[i] = occurrences in draws[:i]
+        if counts is None:
+            counts = np.zeros((self.n + 1, 25), dtype=np.int32)
+            np.cumsum(x, axis=0, out=counts[1:])
+        self.counts = counts
+        # last_seen[i] = index of the last draw < i containing the number (-1 if none)
+        idx = np.where(x > 0, np.arange(self.n)[:, None], -1)
+        last = np.maximum.accumulate(idx, axis=0) if self.n else idx
+        self.last_seen = np.full_like(self.counts, -1)
+        self.last_seen[1:] = last
+
+        self.letter_x = None
+
+    @classmethod
+    def from_history(cls, history) -> "StatFeatures":
+        # Reuses the history's cumulative count tables (see DrawHistory.number_counts)
+        features = cls(history.incidence, history.number_counts)
+        features.with_letters(history.letter_incidence, history.letter_counts)
+        return features
+
+    def with_letters(self, letter_incidence: np.ndarray, letter_counts: np.ndarray):
+        """Adds the letter features (letter_hit_rate)."""
+        from letter_model import letter_last_seen  # Lazy import
+        self.letter_x = np.asarray(letter_incidence)
+        self.letter_counts = letter_counts
+        self.letter_last = letter_last_seen(letter_incidence)
+        return self
+
+    def scores(self, indices: np.ndarray, freq_weight: float, gap_weight: float, decay_rate: float,
+               freq_window: int = 20) -> np.ndarray:
+        """Engine scores (len(indices) x 25) of the predictions made before draws `indices`."""
+        lo = np.maximum(indices - int(freq_window), 0)
+        freq = self.counts[indices] - self.counts[lo]
+        last = self.last_seen[indices]
+        gap = np.where(last >= 0, indices[:, None] - 1 - last, indices[:, None])
+        return freq_weight * freq + gap_weight * (1 - np.exp(-decay_rate * gap))
+
+    def hit_rate(self, params: Dict[str, float], window: int, eval_top: int = 5) -> float:
+        """
+        Share of the top `eval_top` predicted numbers drawn, over the last `window` draws
+        (each predicted from the draws before it, as engine.calculate_prediction would).
+        """
+        hits = self.hits(params, window, eval_top)
+        if len(hits) == 0:
+            return 0.0
+        return float(hits.sum()) / (len(hits) * eval_top)
+
+    def hits(self, params: Dict[str, float], window: int, eval_top: int = 5) -> np.ndarray:
+        """Per-draw number of the top `eval_top` predicted numbers drawn, over the last `window` draws."""
+        indices = np.arange(max(self.n - window, MIN_HISTORY), self.n)
+        if len(indices) == 0:
+            return np.zeros(0, dtype=np.int64)
+        scores = self.scores(
+            indices,
+            params.get("freq_weight", 0.4), params.get("gap_weight", 0.5), params.get("decay_rate", 0.15),
+            params.get("freq_window", 20)
+        )
+        top = np.argsort(-np.round(scores, 12), axis=1, kind="stable")[:, :eval_top]
+        return np.take_along_axis(self.x[indices], top, axis=1).sum(axis=1)
+
+    def letter_hit_rate(self, params: Dict[str, float], window: int) -> float:
+        """Share of the last `window` draws whose letter the engine predicted."""
+        import letter_model  # Lazy import
+        indices = np.arange(max(self.n - window, MIN_HISTORY), self.n)
+        if len(indices) == 0 or self.letter_x is None:
+            return 0.0
+        predicted = letter_model.statistical_letter_batch(
+            self.letter_counts, self.letter_last, indices, params.get("letter_window", 50),
+            params.get("freq_weight", 0.4), params.get("gap_weight", 0.5), params.get("decay_rate", 0.15)
+        )
+        return float(letter_model.letter_hits(self.letter_x, predicted, indices).mean())
+
+    def hit_rates(self, param_sets: Sequence[Dict[str, float]], window: int, eval_top: int = 5):
+        return [self.hit_rate(p, window, eval_top) for p in param_sets]
@@ -0,0 +1,159 @@
+import threading
+import time
+import numpy as np
+from collections import OrderedDict
+from typing import Dict, Any
+
+# Ticket optimiser: best 10-number tickets under a joint objective
+#
+#   objective(T) = sum of s_i over i in T  +  pair_weight * sum of B~_ij over pairs i < j in T
+#
+# s = per-number model scores (normalized by their max), B~ = Matrix B co-occurrence
+# counts normalized by their max off-diagonal value.
+# The search is exhaustive over all C(25,10) = 3.27M tickets (25-bit masks from
+# simulation.combination_pool), scored in chunks without materializing 0/1 rows:
+# the 25 bits are split into 5 blocks of 5, every block (and block pair) gets a lookup
+# table of its partial objective, and a ticket's objective is the sum of 15 table
+# lookups. A time budget stops the scan between chunks (the result then says so).
+# Results are cached per (data version, parameters), i.e. computed once per draw slot.
+
+TICKET_SIZE = 10
+BLOCK_BITS = 5
+N_BLOCKS = 5
+CHUNK = 500_000
+DEFAULT_PAIR_WEIGHT = 0.2
+DEFAULT_BUDGET_MS = 5000
+CACHE_SIZE = 16
+
+_CACHE: "OrderedDict[tuple, Dict[str, Any]]" = OrderedDict()
+_CACHE_LOCK = threading.Lock()
+
+
+def _tables(scores: np.ndarray, pairs: np.ndarray):
+    """
+    Lookup tables of the objective:
+      single[b][v]          = sum of scores + pair terms inside block b for block bits v
+      cross[(a, b)][va, vb] = pair terms between blocks a and b
+    """
+    values = np.arange(1 << BLOCK_BITS)
+    member = ((values[:, None] >> np.arange(BLOCK_BITS)) & 1).astype(float)  # 32 x 5
+    single = []
+    for b in range(N_BLOCKS):
+        idx = slice(b * BLOCK_BITS, (b + 1) * BLOCK_BITS)
+        within = np.triu(pairs[idx, idx], 1)
+        single.append(member @ scores[idx] + np.einsum("vi,ij,vj->v", member, within, member))
+    cross = {}
+    for a in range(N_BLOCKS):
+        for b in range(a + 1, N_BLOCKS):
+            block = pairs[a * BLOCK_BITS:(a + 1) * BLOCK_BITS, b * BLOCK_BITS:(b + 1) * BLOCK_BITS]
+            cross[(a, b)] = (member @ block @ member.T).ravel()  # index va * 32 + vb
+    return single, cross
+
+def objective(masks: np.ndarray, scores: np.ndarray, pairs: np.ndarray, tables=None) -> np.ndarray:
+    """Objective of each ticket mask (pairs = pair_weight * B~, symmetric, any diagonal)."""
+    single, cross = tables or _tables(scores, pairs)
+    masks = np.asarray(masks, dtype=np.uint32)
+    parts = [(masks >> np.uint32(b * BLOCK_BITS)) & np.uint32((1 << BLOCK_BITS) - 1) for b in range(N_BLOCKS)]
+    total = np.zeros(len(masks))
+    for b in range(N_BLOCKS):
+        total += single[b][parts[b]]
+    for (a, b), table in cross.items():
+        total += table[(parts[a] << np.uint32(BLOCK_BITS)) | parts[b]]
+    return total
+
+def optimize_tickets(scores, matrix_b, pair_weight: float = DEFAULT_PAIR_WEIGHT, top: int = 10,
+                     budget_ms: float = DEFAULT_BUDGET_MS) -> Dict[str, Any]:
+    """Top `top` tickets for per-number `scores` (25) and Matrix B, within `budget_ms`."""
+    from simulation import combination_pool  # Lazy import
+    started = time.time()
+    scores = np.asarray(scores, dtype=float)
+    if scores.max() > 0:
+        scores = scores / scores.max()
+    b = np.array(matrix_b, dtype=float)
+    np.fill_diagonal(b, 0)
+    if b.max() > 0:
+        b = b / b.max()
+    pairs = pair_weight * b
+    tables = _tables(scores, pairs)
+
+    pool = combination_pool(TICKET_SIZE)
+    best_masks = np.zeros(0, dtype=np.uint32)
+    best_values = np.zeros(0)
+    scanned = 0
+    for lo in range(0, len(pool), CHUNK):
+        chunk = pool[lo:lo + CHUNK]
+        values = objective(chunk, scores, pairs, tables)
+        keep = np.argpartition(-values, min(top, len(values) - 1))[:top]
+        best_masks = np.concatenate([best_masks, chunk[keep]])
+        best_values = np.concatenate([best_values, values[keep]])
+        order = np.argsort(-best_values, kind="stable")[:top]
+        best_masks, best_values = best_masks[order], best_values[order]
+        scanned += len(chunk)
+        if (time.time() - started) * 1000 > budget_ms:
+            break
+
+    # Reference: the top-10 individually scored numbers
+    baseline = np.argsort(-np.round(scores, 12), kind="stable")[:TICKET_SIZE]
+    baseline_mask = np.uint32(sum(1 << int(i) for i in baseline))
+    tickets = []
+    for mask, value in zip(best_masks, best_values):
+        numbers = [i + 1 for i in range(25) if (int(mask) >> i) & 1]
+        tickets.append({
+            "numbers": numbers,
+            "objective": float(value),
+            "score_sum": float(scores[[n - 1 for n in numbers]].sum()),
+        })
+    return {
+        "tickets": tickets,
+        "baseline": {
+            "numbers": sorted(int(i) + 1 for i in baseline),
+            "objective": float(objective(np.array([baseline_mask]), scores, pairs, tables)[0])
+        },
+        "pair_weight": pair_weight,
+        "scanned": scanned,
+        "total": len(pool),
+        "complete": scanned == len(pool),
+        "seconds": round(time.time() - started, 3)
+    }
+
+def number_scores(history, source: str = "algorithmic") -> np.ndarray:
+    """Per-number scores (25) of one engine for the draw after `history`."""
+    if source == "algorithmic":
+        import matrix_engine  # Lazy import
+        snapshot = matrix_engine.get_snapshot(history)
+        row = np.zeros((1, 25))
+        for x in snapshot.latest_balls:
+            row[0, x - 1] = 1
+        return matrix_engine.score_batch(snapshot.matrix_a, snapshot.matrix_b, row)["score"][0]
+    if source == "statistical":
+        import engine  # Lazy import
+        from firestore_service import get_active_config  # Lazy import
+        config = get_active_config()
+        stats = engine.calculate_stats(history, freq_window=int(config.get("freq_window", 20)))
+        return np.array([
+            engine.calculate_score_for_number(n, stats[n], config.get("freq_weight", 0.4),
+                                              config.get("gap_weight", 0.5), config.get("decay_rate", 0.15))["score"]
+            for n in range(1, 26)
+        ])
+    raise ValueError("source must be 'algorithmic' or 'statistical'")
+
+def best_tickets(history=None, source: str = "algorithmic", pair_weight: float = DEFAULT_PAIR_WEIGHT,
+                 top: int = 10, budget_ms: float = DEFAULT_BUDGET_MS) -> Dict[str, Any]:
+    """optimize_tickets for the next draw, cached per (data version, parameters)."""
+    import matrix_engine  # Lazy import
+    history = matrix_engine._load_history(history)
+    key = (history.data_version, source, round(pair_weight, 6), top)
+    with _CACHE_LOCK:
+        cached = _CACHE.get(key)
+        if cached is not None:
+            _CACHE.move_to_end(key)
+            return cached
+    scores = number_scores(history, source)
+    result = optimize_tickets(scores, matrix_engine.get_snapshot(history).matrix_b, pair_weight, top, budget_ms)
+    result.update({"source": source, "data_version": list(history.data_version)})
+    if result["complete"]:  # Partial scans are not cached: a later call may finish
+        with _CACHE_LOCK:
+            _CACHE[key] = result
+            while len(_CACHE) > CACHE_SIZE:
+                _CACHE.popitem(last=False)
+    return result